@@ -0,0 +1,170 @@
+"""
+Adaptive sampling of emitters. A coarse set of rays evenly spread over the sample parameter u of a
+sources.Emitter is traced with a BatchTracer, then every pair of neighbouring rays whose paths differ gets
+a ray halfway between them, level by level, until no pair differs or the gap is below min_gap.
+Paths differ if they hit other surfaces, have another number of segments, differ in total internal reflection,
+truncation or the detectors they cross, if corresponding hit or detector crossing points are more than
+tolerance apart or if the leaving directions differ by more than angle_tolerance (radians).
+So rays are spent at lens rims, caustics and the edge of total internal reflection, not in smooth regions.
+
+Detectors are filled with ray tubes: the power between two neighbouring rays with the same path is spread
+evenly between their crossings, instead of going to single bins with the rays. The power between rays whose
+paths differ goes half to each of them. Rays in the result carry the power of the range of u closest to them.
+Lambertian sources with a width sample offsets by ray index and do not refine well.
+"""
+from math import pi
+import numpy as np
+from sources import Emitter
+from batch import BatchResult, ray_caster_batch, record, segment_crossings
+
+
+def leaving_angles(result):
+    """
+    Direction angle of the last segment of every ray
+    """
+    last = np.maximum(result.n_segments - 1, 0)[:, None, None]
+    start = np.take_along_axis(result.points, np.broadcast_to(last, (len(result), 1, 2)), axis=1)[:, 0]
+    end = np.take_along_axis(result.points, np.broadcast_to(last + 1, (len(result), 1, 2)), axis=1)[:, 0]
+    return np.arctan2(end[:, 1] - start[:, 1], end[:, 0] - start[:, 0])
+
+
+def crossing_table(detector, result):
+    """
+    (N, B) u and angle of every segment crossing the detector, NaN for the others
+    """
+    valid = np.arange(result.obj_id.shape[1])[None, :] < result.n_segments[:, None]
+    starts, ends, _ = result.segment_arrays()
+    hit, u, angle = segment_crossings(detector, starts, ends)
+    rows, columns = np.nonzero(valid)
+    u_table = np.full(valid.shape, np.nan)
+    angle_table = np.full(valid.shape, np.nan)
+    u_table[rows[hit], columns[hit]] = u
+    angle_table[rows[hit], columns[hit]] = angle
+    return u_table, angle_table
+
+
+def spread(n_bins, x0, x1, w, chunk_size=4096):
+    """
+    Histogram of weights w spread evenly over [x0, x1], positions in bins
+    """
+    lo, hi = np.minimum(x0, x1), np.maximum(x0, x1)
+    point = hi - lo < 1e-9
+    histogram = np.bincount(np.clip(lo[point].astype(np.int64), 0, n_bins - 1), w[point], n_bins).astype(float)
+    lo, hi, w = lo[~point], hi[~point], w[~point]
+    edges = np.arange(n_bins + 1, dtype=float)
+    for start in range(0, len(lo), chunk_size):
+        s = slice(start, start + chunk_size)
+        share = np.diff(np.clip(edges[None, :], lo[s, None], hi[s, None]), axis=1) / (hi[s] - lo[s])[:, None]
+        histogram += share.T @ w[s]
+    return histogram
+
+
+class AdaptiveSampler:
+    """
+    coarse rays per emitter and wavelength to start with, at most max_rays per emitter and wavelength.
+    min_gap is the smallest distance in u between neighbouring rays, 2**12 times finer than the start by default.
+    detectors are the scene's detectors by default
+    """
+    def __init__(self, tracer, tolerance=1.0, angle_tolerance=0.01, coarse=32, min_gap=None, max_rays=1 << 20,
+                 detectors=None):
+        self.tracer = tracer
+        self.tolerance = tolerance
+        self.angle_tolerance = angle_tolerance
+        self.coarse = coarse
+        self.min_gap = min_gap if min_gap is not None else 1 / (coarse * 2**12)
+        self.max_rays = max_rays
+        self.detectors = tracer.scene.detectors() if detectors is None else detectors
+
+    def differ(self, result, tables):
+        """
+        (N-1,) whether the paths of rays i and i+1 differ, tables are the crossing_table of each detector
+        """
+        a, b = result.take(np.s_[:-1]), result.take(np.s_[1:])
+        differ = (a.n_segments != b.n_segments) | (a.truncated != b.truncated)
+        differ |= ((a.obj_id != b.obj_id) | (a.surface_id != b.surface_id) | (a.tir != b.tir)).any(axis=1)
+        distance = np.linalg.norm(a.points[:, 1:] - b.points[:, 1:], axis=2)
+        differ |= (np.where(a.obj_id >= 0, distance, 0) > self.tolerance).any(axis=1)
+        turn = np.abs(leaving_angles(a) - leaving_angles(b))
+        differ |= np.minimum(turn, 2*pi - turn) > self.angle_tolerance
+        for detector, (u, _) in zip(self.detectors, tables):
+            crossed = ~np.isnan(u)
+            differ |= (crossed[:-1] != crossed[1:]).any(axis=1)
+            with np.errstate(invalid='ignore'):
+                differ |= (np.abs(u[:-1] - u[1:]) * detector.length() > self.tolerance).any(axis=1)
+        return differ
+
+    def trace_at(self, emitter, u, wavelength):
+        origins, directions = emitter.rays_at(u * self.coarse - 0.5, u)
+        return self.tracer.trace(origins, directions, wavelengths=np.full(len(u), wavelength))
+
+    def sample(self, emitter, wavelength=np.nan):
+        """
+        Sorted u, the BatchResult of the rays at u, the crossing tables of the detectors
+        and whether neighbouring paths differ
+        """
+        u = (np.arange(self.coarse) + 0.5) / self.coarse
+        result = self.trace_at(emitter, u, wavelength)
+        while True:
+            tables = [crossing_table(detector, result) for detector in self.detectors]
+            differ = self.differ(result, tables)
+            refine = differ & (np.diff(u) > self.min_gap)
+            if not refine.any() or len(u) >= self.max_rays:
+                break
+            new_u = ((u[:-1] + u[1:]) / 2)[refine][:self.max_rays - len(u)]
+            u = np.concatenate([u, new_u])
+            result = BatchResult.concatenate([result, self.trace_at(emitter, new_u, wavelength)])
+            order = np.argsort(u, kind='stable')
+            u, result = u[order], result.take(order)
+        bounds = np.concatenate([[0.0], (u[:-1] + u[1:]) / 2, [1.0]])
+        result.weight = emitter.power * np.diff(bounds)
+        return u, result, tables, differ
+
+    def record(self, u, power, tables, differ):
+        """
+        Adds the ray tubes of a sample() to the detectors
+        """
+        gap = power * np.diff(u)
+        # power every ray deposits at its own crossings: the ends of u and halves of gaps between differing paths
+        own = np.concatenate([[power * u[0]], np.zeros(len(gap))])
+        own[-1] += power * (1 - u[-1])
+        own[:-1] += np.where(differ, gap / 2, 0)
+        own[1:] += np.where(differ, gap / 2, 0)
+        for detector, (u_table, angle_table) in zip(self.detectors, tables):
+            position = np.frombuffer(detector.position, dtype=float)
+            angle = np.frombuffer(detector.angle, dtype=float)
+            before = position.sum()
+            crossed = ~np.isnan(u_table)
+            rows = np.nonzero(crossed)[0]
+            position += np.bincount(np.minimum((u_table[crossed]*detector.bins).astype(np.int64), detector.bins - 1),
+                                    own[rows], detector.bins)
+            angle += np.bincount(np.clip(((angle_table[crossed] + pi/2) / pi * detector.angle_bins).astype(np.int64),
+                                         0, detector.angle_bins - 1), own[rows], detector.angle_bins)
+
+            tube = ~differ[:, None] & crossed[:-1] & crossed[1:]
+            rows = np.nonzero(tube)[0]
+            position += spread(detector.bins, u_table[:-1][tube]*detector.bins, u_table[1:][tube]*detector.bins,
+                               gap[rows])
+            angle += spread(detector.angle_bins, (angle_table[:-1][tube] + pi/2) / pi * detector.angle_bins,
+                            (angle_table[1:][tube] + pi/2) / pi * detector.angle_bins, gap[rows])
+            detector.hits += int(crossed.sum())
+            detector.power += float(position.sum() - before)
+
+    def trace_sources(self):
+        """
+        Same as BatchTracer.trace_sources with emitters sampled adaptively, the rays are also added to the detectors
+        """
+        results = []
+        for source in self.tracer.scene.sources():
+            if isinstance(source, Emitter):
+                for wavelength in (source.wavelengths if source.wavelengths is not None else [np.nan]):
+                    u, result, tables, differ = self.sample(source, wavelength)
+                    self.record(u, source.power, tables, differ)
+                    results.append(result)
+            else:
+                origins, directions, weights, wavelengths = ray_caster_batch(source)
+                result = self.tracer.trace(origins, directions, wavelengths=wavelengths, weights=weights)
+                record(self.detectors, result)
+                results.append(result)
+        if not results:
+            return self.tracer.trace(np.empty((0, 2)), np.empty((0, 2)))
+        return BatchResult.concatenate(results)
@@ -0,0 +1,476 @@
+from math import pi
+import numpy as np
+from surfaces import SurfaceTable
+from sources import Emitter
+
+
+class SurfaceArrays:
+    """
+    numpy views of a SurfaceTable.
+    Segments: p0 + u*e, 0 <= u <= 1
+    Arcs: |p - center| = r, y_min <= p.y <= y_max, side*(p.x - center.x) >= 0
+    """
+    def __init__(self, obj_list):
+        table = SurfaceTable(obj_list)
+        self.table = table
+
+        def column(values, dtype=float):
+            return np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+
+        self.seg_p0 = np.stack([column(table.seg_x0), column(table.seg_y0)], axis=1)
+        self.seg_e = np.stack([column(table.seg_ex), column(table.seg_ey)], axis=1)
+        self.seg_normal = np.stack([column(table.seg_nx), column(table.seg_ny)], axis=1)
+        self.arc_c = np.stack([column(table.arc_cx), column(table.arc_cy)], axis=1)
+        self.arc_r = column(table.arc_r).copy()
+        self.arc_y = np.stack([column(table.arc_y_min), column(table.arc_y_max)], axis=1)
+        self.arc_side = column(table.arc_side).copy()
+
+        # arcs appear twice in the combined table, once per root of the quadratic
+        refr_indx = np.array([obj.abs_refr_indx for obj in obj_list], dtype=float)
+        seg_obj, arc_obj = column(table.seg_obj, np.int32), column(table.arc_obj, np.int32)
+        self.obj_id = np.concatenate([seg_obj, arc_obj, arc_obj]).astype(np.int64)
+        self.surface_id = np.concatenate([column(table.seg_surface, np.int32), column(table.arc_surface, np.int32),
+                                          column(table.arc_surface, np.int32)]).astype(np.int64)
+        self.refr_indx = refr_indx[self.obj_id]
+
+    def update(self, obj_id, obj):
+        """
+        Rewrites the rows of a changed object in place, it must have as many segments and arcs as before
+        """
+        table = self.table
+        segments, arcs = table.rows(obj)
+        seg = slice(table.seg_first[obj_id], table.seg_first[obj_id+1])
+        arc = slice(table.arc_first[obj_id], table.arc_first[obj_id+1])
+        if len(segments) != seg.stop - seg.start or len(arcs) != arc.stop - arc.start:
+            raise ValueError(f'{obj.name} has other surfaces than the object it replaces')
+        table.update(obj_id, obj)
+        self.seg_p0[seg] = np.column_stack([table.seg_x0[seg], table.seg_y0[seg]])
+        self.seg_e[seg] = np.column_stack([table.seg_ex[seg], table.seg_ey[seg]])
+        self.seg_normal[seg] = np.column_stack([table.seg_nx[seg], table.seg_ny[seg]])
+        self.arc_c[arc] = np.column_stack([table.arc_cx[arc], table.arc_cy[arc]])
+        self.arc_r[arc] = table.arc_r[arc]
+        self.arc_y[arc] = np.column_stack([table.arc_y_min[arc], table.arc_y_max[arc]])
+        self.arc_side[arc] = table.arc_side[arc]
+        self.refr_indx[self.obj_id == obj_id] = obj.abs_refr_indx
+
+    @property
+    def n_segments(self):
+        return len(self.seg_p0)
+
+    @property
+    def n_arcs(self):
+        return len(self.arc_r)
+
+
+class BatchResult:
+    """
+    Paths of N rays after B bounces.
+    points:     (N, B+1, 2) path vertices, NaN after the path has ended
+    obj_id:     (N, B) object hit at the end of each segment, -1 if the ray escaped or ended earlier
+    surface_id: (N, B) surface of that object, -1 as above
+    refr_indx:  (N, B) index of the medium each segment travels through, NaN after the path has ended
+    normal:     (N, B, 2) unit surface normal at each hit, facing the incoming ray like Segment.normal
+    tir:        (N, B) total internal reflection at the hit
+    n_segments: (N,) number of valid segments of each path
+    truncated:  (N,) max recursion depth has been reached
+    wavelength: (N,) wavelength of each ray in nm, NaN for monochromatic rays
+    weight:     (N,) share of the source energy carried by each ray
+    """
+    def __init__(self, points, obj_id, surface_id, refr_indx, normal, tir, n_segments, truncated, wavelength=None,
+                 weight=None):
+        self.points = points
+        self.obj_id = obj_id
+        self.surface_id = surface_id
+        self.refr_indx = refr_indx
+        self.normal = normal
+        self.tir = tir
+        self.n_segments = n_segments
+        self.truncated = truncated
+        self.wavelength = wavelength if wavelength is not None else np.full(len(n_segments), np.nan)
+        self.weight = weight if weight is not None else np.ones(len(n_segments))
+
+    def __len__(self):
+        return len(self.n_segments)
+
+    @staticmethod
+    def concatenate(results):
+        """
+        Joins results of consecutive ray batches, padding them to the same number of bounces
+        """
+        n_bounces = max(result.obj_id.shape[1] for result in results)
+
+        def pad(array, size, value):
+            width = [(0, 0)] * array.ndim
+            width[1] = (0, size - array.shape[1])
+            return np.pad(array, width, constant_values=value)
+
+        return BatchResult(np.concatenate([pad(r.points, n_bounces+1, np.nan) for r in results]),
+                           np.concatenate([pad(r.obj_id, n_bounces, -1) for r in results]),
+                           np.concatenate([pad(r.surface_id, n_bounces, -1) for r in results]),
+                           np.concatenate([pad(r.refr_indx, n_bounces, np.nan) for r in results]),
+                           np.concatenate([pad(r.normal, n_bounces, np.nan) for r in results]),
+                           np.concatenate([pad(r.tir, n_bounces, False) for r in results]),
+                           np.concatenate([r.n_segments for r in results]),
+                           np.concatenate([r.truncated for r in results]),
+                           np.concatenate([r.wavelength for r in results]),
+                           np.concatenate([r.weight for r in results]))
+
+    def take(self, index):
+        """
+        Rays index of the result, in that order
+        """
+        return BatchResult(self.points[index], self.obj_id[index], self.surface_id[index], self.refr_indx[index],
+                           self.normal[index], self.tir[index], self.n_segments[index], self.truncated[index],
+                           self.wavelength[index], self.weight[index])
+
+    def segment_arrays(self):
+        """
+        Flat (starts, ends, ray_index) of all valid segments
+        """
+        n_bounces = self.obj_id.shape[1]
+        valid = np.arange(n_bounces)[None, :] < self.n_segments[:, None]
+        ray_index = np.nonzero(valid)[0]
+        return self.points[:, :-1][valid], self.points[:, 1:][valid], ray_index
+
+
+def crossings(detector, result, segments=None):
+    """
+    u along v1 -> v2, angle of incidence and weight of every segment of a BatchResult crossing a scene.Detector,
+    same tests as Detector.record. segments are result.segment_arrays() if already at hand
+    """
+    starts, ends, ray_index = result.segment_arrays() if segments is None else segments
+    hit, u, angle = segment_crossings(detector, starts, ends)
+    return u, angle, result.weight[ray_index[hit]]
+
+
+def segment_crossings(detector, starts, ends):
+    """
+    Mask of the segments starts -> ends crossing a scene.Detector, u and angle of those that do
+    """
+    s = ends - starts
+    ex, ey = detector.v2.x - detector.v1.x, detector.v2.y - detector.v1.y
+    wx, wy = detector.v1.x - starts[:, 0], detector.v1.y - starts[:, 1]
+    denom = s[:, 0]*ey - s[:, 1]*ex
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (wx*ey - wy*ex) / denom
+        u = (wx*s[:, 1] - wy*s[:, 0]) / denom
+    hit = (denom != 0) & (t > 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    denom = denom[hit]
+    return hit, u[hit], np.arctan2(np.copysign(s[hit, 0]*ex + s[hit, 1]*ey, denom), np.abs(denom))
+
+
+def record(detectors, result):
+    """
+    Adds the segments of a BatchResult crossing each scene.Detector to its histograms weighted by result.weight
+    """
+    segments = result.segment_arrays()
+    for detector in detectors:
+        u, angle, w = crossings(detector, result, segments)
+        if not len(u):
+            continue
+        position_bin = np.minimum((u*detector.bins).astype(np.int64), detector.bins - 1)
+        angle_bin = np.clip(((angle + pi/2) / pi * detector.angle_bins).astype(np.int64), 0, detector.angle_bins - 1)
+        # views of the detector arrays, updated in place
+        np.frombuffer(detector.position, dtype=float)[:] += np.bincount(position_bin, w, detector.bins)
+        np.frombuffer(detector.angle, dtype=float)[:] += np.bincount(angle_bin, w, detector.angle_bins)
+        detector.hits += len(u)
+        detector.power += float(w.sum())
+
+
+def ray_caster_batch(source):
+    """
+    (origins, directions, weights, wavelengths) of a RayCaster, one ray per wavelength
+    """
+    wavelengths = np.array(source.wavelengths if source.wavelengths is not None else [np.nan], dtype=float)
+    return (np.tile([source.v2.x, source.v2.y], (len(wavelengths), 1)),
+            np.tile([source.v2.x - source.v1.x, source.v2.y - source.v1.y], (len(wavelengths), 1)),
+            np.ones(len(wavelengths)), wavelengths)
+
+
+class BatchTracer:
+    """
+    Vectorized tracer: every bounce intersects all active rays with all surfaces at once.
+    Rays are processed in chunks of chunk_size to bound the size of the (rays x surfaces) temporaries.
+    """
+    def __init__(self, scene, extent=100000, eps=0.001, chunk_size=65536):
+        self.scene = scene
+        self.extent = extent
+        self.eps = eps
+        self.chunk_size = chunk_size
+        self.surfaces = None
+        self.build()
+
+    def build(self):
+        """
+        Has to be called again after objects of the scene have been changed
+        """
+        self.surfaces = SurfaceArrays(self.scene.obj_list)
+
+    def update(self, obj_id, obj):
+        """
+        Replaces object obj_id of the scene with obj, patching its surface rows instead of building all of them
+        """
+        self.scene.obj_list[obj_id] = obj
+        try:
+            self.surfaces.update(obj_id, obj)
+        except ValueError:
+            self.build()
+
+    def source_batches(self, batch_size=None):
+        """
+        (origins, directions, weights, wavelengths) batches of all sources for stream().
+        A RayCaster gives one ray per wavelength, a sources.Emitter gives its rays in batches of batch_size
+        """
+        batch_size = self.chunk_size if batch_size is None else batch_size
+        for source in self.scene.sources():
+            if isinstance(source, Emitter):
+                yield from source.batches(batch_size)
+            else:
+                yield ray_caster_batch(source)
+
+    def source_rays(self):
+        """
+        origins, directions, weights and wavelengths (NaN for monochromatic sources) of all rays of all sources,
+        one ray per wavelength
+        """
+        batches = list(self.source_batches())
+        if not batches:
+            return np.empty((0, 2)), np.empty((0, 2)), np.empty(0), np.empty(0)
+        return tuple(np.concatenate(column) for column in zip(*batches))
+
+    def trace_sources(self):
+        origins, directions, weights, wavelengths = self.source_rays()
+        return self.trace(origins, directions, wavelengths=wavelengths, weights=weights)
+
+    def trace_spectrum(self, origins, directions, wavelengths):
+        """
+        Traces every ray at every wavelength in one batch. Ray i at wavelength j is row i*len(wavelengths) + j.
+        The wavelengths of a ray are traced as one ray until it hits a material whose index differs between them,
+        so segments in front of the first dispersive surface are intersected once for all wavelengths
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+        directions = np.asarray(directions, dtype=float).reshape(-1, 2)
+        wavelengths = np.asarray(wavelengths, dtype=float).reshape(-1)
+        return self.trace(np.repeat(origins, len(wavelengths), axis=0), np.repeat(directions, len(wavelengths), axis=0),
+                          wavelengths=np.tile(wavelengths, len(origins)), bundle=len(wavelengths))
+
+    def stream(self, batches, detectors=None):
+        """
+        Traces batches of rays into detectors (the scene's detectors by default) and drops the paths,
+        so memory does not grow with the number of rays.
+        A batch is (origins, directions) or (origins, directions, weights) or (origins, directions, weights, wavelengths),
+        e.g. from source_batches() or sources.Emitter.batches().
+        Yields the number of rays traced so far after every batch, histograms can be read in between
+        """
+        detectors = self.scene.detectors() if detectors is None else detectors
+        n_rays = 0
+        for batch in batches:
+            origins, directions, weights, wavelengths = (tuple(batch) + (None, None))[:4]
+            result = self.trace(origins, directions, wavelengths=wavelengths, weights=weights)
+            record(detectors, result)
+            n_rays += len(result)
+            yield n_rays
+
+    def index_table(self, wavelengths):
+        """
+        (objects, wavelengths) refractive indices, abs_refr_indx for NaN wavelengths and objects without material
+        """
+        table = np.empty((len(self.scene.obj_list), len(wavelengths)))
+        spectral = ~np.isnan(wavelengths)
+        for obj_id, obj in enumerate(self.scene.obj_list):
+            table[obj_id] = obj.abs_refr_indx
+            if obj.material is not None and spectral.any():
+                table[obj_id, spectral] = obj.material.index(wavelengths[spectral])
+        return table
+
+    def nearest(self, o, d):
+        """
+        Index in the combined surface table and distance of the nearest hit ahead of each ray.
+        Index is -1 if nothing is hit
+        """
+        srf = self.surfaces
+        eps = self.eps
+        t_parts = []
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if srf.n_segments:
+                # o + t*d = p0 + u*e
+                e = srf.seg_e[None, :, :]
+                w = srf.seg_p0[None, :, :] - o[:, None, :]
+                denom = d[:, None, 0]*e[..., 1] - d[:, None, 1]*e[..., 0]
+                t = (w[..., 0]*e[..., 1] - w[..., 1]*e[..., 0]) / denom
+                u = (w[..., 0]*d[:, None, 1] - w[..., 1]*d[:, None, 0]) / denom
+                valid = (denom != 0) & (t > eps) & (u >= 0) & (u <= 1)
+                t_parts.append(np.where(valid, t, np.inf))
+            if srf.n_arcs:
+                # |o + t*d - c|^2 = r^2, |d| = 1  =>  t^2 + 2*b*t + cc = 0
+                oc = o[:, None, :] - srf.arc_c[None, :, :]
+                b = d[:, None, 0]*oc[..., 0] + d[:, None, 1]*oc[..., 1]
+                cc = oc[..., 0]**2 + oc[..., 1]**2 - srf.arc_r[None, :]**2
+                disc = b**2 - cc
+                sq = np.sqrt(np.maximum(disc, 0))
+                for t in (-b - sq, -b + sq):
+                    x = o[:, None, 0] + t*d[:, None, 0]
+                    y = o[:, None, 1] + t*d[:, None, 1]
+                    valid = ((disc >= 0) & (t > eps) &
+                             (srf.arc_y[None, :, 0] <= y) & (y <= srf.arc_y[None, :, 1]) &
+                             (srf.arc_side[None, :]*(x - srf.arc_c[None, :, 0]) >= 0))
+                    t_parts.append(np.where(valid, t, np.inf))
+        if not t_parts:
+            return np.full(len(o), -1, dtype=np.int64), np.full(len(o), np.inf)
+        t_all = np.concatenate(t_parts, axis=1)
+        index = np.argmin(t_all, axis=1)
+        t_min = t_all[np.arange(len(o)), index]
+        index[~np.isfinite(t_min)] = -1
+        return index, t_min
+
+    def normals(self, index, points):
+        srf = self.surfaces
+        normal = np.empty_like(points)
+        is_seg = index < srf.n_segments
+        normal[is_seg] = srf.seg_normal[index[is_seg]]
+        if srf.n_arcs:
+            arc = (index[~is_seg] - srf.n_segments) % srf.n_arcs
+            normal[~is_seg] = (points[~is_seg] - srf.arc_c[arc]) / srf.arc_r[arc, None]
+        return normal
+
+    def escape_points(self, o, d):
+        ext = self.extent
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (np.where(d >= 0, ext, -ext) - o) / d
+        t = np.where(np.isfinite(t) & (t >= 0), t, np.inf).min(axis=1)
+        return o + t[:, None]*d
+
+    def trace(self, origins, directions, refr_indx=None, wavelengths=None, weights=None, bundle=1):
+        """
+        wavelengths (nm) per ray select the indices of object materials, they are looked up
+        in a (objects, distinct wavelengths) table, so rays of all wavelengths go through the same vectorized
+        bounces with one table lookup per hit.
+        bundle > 1 says that every bundle consecutive rows are the same ray at different wavelengths:
+        only the first row of a bundle is intersected until it hits an object whose index differs between
+        the wavelengths of the bundle, then the rows go on on their own. The other rows copy its segments.
+        weights per ray only go into the result, rays are not split
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+        directions = np.asarray(directions, dtype=float).reshape(-1, 2)
+        n_rays = len(origins)
+        medium = self.scene.abs_refr_indx
+        srf = self.surfaces
+        weight = None if weights is None else np.broadcast_to(np.asarray(weights, dtype=float), (n_rays,)).copy()
+        if wavelengths is not None:
+            wavelengths = np.broadcast_to(np.asarray(wavelengths, dtype=float), (n_rays,))
+            distinct, wl_index = np.unique(wavelengths, return_inverse=True)
+            wl_table = self.index_table(distinct)
+
+        o = origins.copy()
+        d = directions / np.linalg.norm(directions, axis=1, keepdims=True)
+        n = np.full(n_rays, medium) if refr_indx is None else np.array(refr_indx, dtype=float).reshape(n_rays)
+        n_segments = np.zeros(n_rays, dtype=np.int64)
+        bundled = np.zeros(n_rays, dtype=bool)      # first rows of bundles traced for the whole bundle
+        if bundle > 1 and wavelengths is not None:
+            active = np.arange(0, n_rays, bundle)
+            bundled[active] = True
+            others = np.arange(1, bundle)
+        else:
+            active = np.arange(n_rays)
+
+        points = [o.copy()]
+        obj_ids, surface_ids, refr_indxs, normals, tirs = [], [], [], [], []
+        for _ in range(self.scene.max_recursion_depth + 1):
+            if not len(active):
+                break
+            col_point = np.full((n_rays, 2), np.nan)
+            col_obj = np.full(n_rays, -1, dtype=np.int64)
+            col_surface = np.full(n_rays, -1, dtype=np.int64)
+            col_n = np.full(n_rays, np.nan)
+            col_normal = np.full((n_rays, 2), np.nan)
+            col_tir = np.zeros(n_rays, dtype=bool)
+
+            index = np.empty(len(active), dtype=np.int64)
+            t = np.empty(len(active))
+            for start in range(0, len(active), self.chunk_size):
+                chunk = active[start:start+self.chunk_size]
+                index[start:start+self.chunk_size], t[start:start+self.chunk_size] = self.nearest(o[chunk], d[chunk])
+
+            # bundles hitting a dispersive object go on as separate rays from here
+            first = bundled[active] & (index >= 0)
+            if first.any():
+                rows = active[first][:, None] + np.arange(bundle)
+                obj_n = wl_table[srf.obj_id[index[first]][:, None], wl_index[rows]]
+                split = (obj_n != obj_n[:, :1]).any(axis=1)
+                if split.any():
+                    bundled[rows[split, 0]] = False
+                    rows = rows[split]
+                    o[rows], d[rows], n[rows] = o[rows[:, :1]], d[rows[:, :1]], n[rows[:, :1]]
+                    rows = rows[:, 1:]
+                    active = np.concatenate([active, rows.ravel()])
+                    index = np.concatenate([index, np.repeat(index[first][split], bundle - 1)])
+                    t = np.concatenate([t, np.repeat(t[first][split], bundle - 1)])
+
+            col_n[active] = n[active]
+            n_segments[active] += 1
+
+            # escaped rays
+            miss = active[index < 0]
+            col_point[miss] = self.escape_points(o[miss], d[miss])
+
+            # hits
+            hit_mask = index >= 0
+            hit = active[hit_mask]
+            index = index[hit_mask]
+            p = o[hit] + t[hit_mask, None]*d[hit]
+            nrm = self.normals(index, p)
+            col_point[hit] = p
+            col_obj[hit] = srf.obj_id[index]
+            col_surface[hit] = srf.surface_id[index]
+
+            n1 = n[hit]
+            if wavelengths is None:
+                obj_n = srf.refr_indx[index]
+            else:
+                obj_n = wl_table[srf.obj_id[index], wl_index[hit]]
+            n2 = np.where(obj_n == n1, medium, obj_n)
+
+            # vector form of Snell's law
+            dh = d[hit]
+            cos_i = -(dh[:, 0]*nrm[:, 0] + dh[:, 1]*nrm[:, 1])
+            flip = cos_i < 0
+            nrm[flip] = -nrm[flip]
+            col_normal[hit] = nrm
+            cos_i = np.abs(cos_i)
+            eta = n1 / n2
+            k = 1 - eta**2 * (1 - cos_i**2)
+            tir = k < 0
+            refl = dh + 2*cos_i[:, None]*nrm
+            refr = eta[:, None]*dh + (eta*cos_i - np.sqrt(np.maximum(k, 0)))[:, None]*nrm
+            d[hit] = np.where(tir[:, None], refl, refr)
+            n[hit] = np.where(tir, n1, n2)
+            o[hit] = p
+            col_tir[hit] = tir
+
+            # rows of bundles still traced together take the segment of their first row
+            first = active[bundled[active]]
+            if len(first):
+                rows = (first[:, None] + others).ravel()
+                for column in (col_point, col_obj, col_surface, col_n, col_normal, col_tir):
+                    column[rows] = np.repeat(column[first], bundle - 1, axis=0)
+                n_segments[rows] += 1
+            points.append(col_point)
+            obj_ids.append(col_obj)
+            surface_ids.append(col_surface)
+            refr_indxs.append(col_n)
+            normals.append(col_normal)
+            tirs.append(col_tir)
+            active = hit
+
+        truncated = np.zeros(n_rays, dtype=bool)
+        truncated[active] = True
+        first = active[bundled[active]]
+        truncated[(first[:, None] + np.arange(bundle)).ravel()] = True
+        if not obj_ids:
+            empty = np.empty((n_rays, 0))
+            return BatchResult(np.stack(points, axis=1), empty.astype(np.int64), empty.astype(np.int64), empty,
+                               np.empty((n_rays, 0, 2)), empty.astype(bool), n_segments, truncated,
+                               None if wavelengths is None else wavelengths.copy(), weight)
+        return BatchResult(np.stack(points, axis=1), np.stack(obj_ids, axis=1), np.stack(surface_ids, axis=1),
+                           np.stack(refr_indxs, axis=1), np.stack(normals, axis=1), np.stack(tirs, axis=1),
+                           n_segments, truncated, None if wavelengths is None else wavelengths.copy(), weight)
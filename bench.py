@@ -0,0 +1,186 @@
+"""
+Headless benchmarks of the tracers on the canonical scenes.
+
+    python bench.py                         run everything, print a table
+    python bench.py -o results.json         also save results
+    python bench.py --compare old.json      compare with saved results, exit code 1 on regressions
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from geometry import Vector2
+from scene import Scene, RayCaster, demo_scene, large_lens_scene
+from tracer import Tracer
+try:
+    from batch import BatchTracer
+except ImportError:     # numpy is not installed
+    BatchTracer = None
+
+
+def sources_column(n, x=-500, y_min=-200, y_max=200):
+    step = (y_max - y_min) / max(n - 1, 1)
+    return [RayCaster(Vector2(x, y_min + i*step), Vector2(x + 25, y_min + i*step), f'RayCaster{i+1}')
+            for i in range(n)]
+
+
+def trapezoid_scene():
+    demo = demo_scene()
+    return Scene(demo.obj_list[:1], demo.tools_list, demo.abs_refr_indx, demo.max_recursion_depth)
+
+
+def lens_stack_scene():
+    demo = demo_scene()
+    return Scene(demo.obj_list[1:], demo.tools_list, demo.abs_refr_indx, demo.max_recursion_depth)
+
+
+def many_sources_scene(n=256):
+    demo = demo_scene()
+    return Scene(demo.obj_list, sources_column(n), demo.abs_refr_indx, demo.max_recursion_depth)
+
+
+def many_objects_scene(nx=6, ny=6, step_x=700, step_y=450, n_sources=64):
+    """
+    Demo objects tiled on a nx*ny grid
+    """
+    obj_list = []
+    for i in range(nx):
+        for j in range(ny):
+            for obj in demo_scene().obj_list:
+                obj.name = f'{obj.name}_{i}_{j}'
+                obj.move(Vector2(i*step_x, (j - (ny-1)/2)*step_y))
+                obj_list.append(obj)
+    half = ny*step_y/2
+    return Scene(obj_list, sources_column(n_sources, y_min=-half, y_max=half))
+
+
+SCENES = {
+    'trapezoid': trapezoid_scene,
+    'lens_stack': lens_stack_scene,
+    'demo': demo_scene,
+    'large_lenses': large_lens_scene,
+    'many_sources': many_sources_scene,
+    'many_objects': many_objects_scene,
+}
+
+
+def run_tracer(scene, **options):
+    """
+    (primary rays, hits), a primary ray is one ray of a source at one wavelength
+    """
+    paths = Tracer(scene, **options).trace()
+    return (sum(segment.depth == 0 for path in paths for segment in path.segments),
+            sum(len(path.hits()) for path in paths))
+
+
+def run_batch(scene):
+    result = BatchTracer(scene).trace_sources()
+    return len(result), int((result.obj_id >= 0).sum())
+
+
+BACKENDS = {
+    'tracer': lambda scene: run_tracer(scene, split=False),
+    'tracer_linear': lambda scene: run_tracer(scene, split=False, use_bvh=False),
+    'tracer_split': lambda scene: run_tracer(scene, split=True),
+}
+if BatchTracer is not None:
+    BACKENDS['batch'] = run_batch
+
+
+def measure(backend, scene, repeat):
+    if repeat < 1:
+        raise ValueError(f'repeat has to be at least 1, not {repeat}')
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        rays, bounces = backend(scene)
+        t = time.perf_counter() - t
+        best = t if best is None else min(best, t)
+
+    tracemalloc.start()
+    backend(scene)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'rays': rays,
+        'bounces': bounces,
+        'seconds': best,
+        'rays_per_s': rays / best,
+        'bounces_per_s': bounces / best,
+        'peak_kib': peak / 1024,
+    }
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenes, backends, repeat):
+    results = []
+    for scene_name in scenes:
+        scene = SCENES[scene_name]()
+        for backend_name in backends:
+            result = measure(BACKENDS[backend_name], scene, repeat)
+            result.update(scene=scene_name, backend=backend_name)
+            results.append(result)
+            print(f'{scene_name:<14}{backend_name:<15}{result["rays_per_s"]:>12.0f} rays/s'
+                  f'{result["bounces_per_s"]:>12.0f} bounces/s{result["peak_kib"]:>10.0f} KiB')
+    return {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Prints rays/s relative to the baseline, returns the number of regressions beyond tolerance
+    """
+    old = {(r['scene'], r['backend']): r for r in baseline['results']}
+    regressions = 0
+    print(f'\nCompared to {baseline.get("commit")}:')
+    for result in report['results']:
+        prev = old.get((result['scene'], result['backend']))
+        if prev is None:
+            continue
+        ratio = result['rays_per_s'] / prev['rays_per_s']
+        flag = ''
+        if ratio < 1 - tolerance:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f'{result["scene"]:<14}{result["backend"]:<15}{ratio:>8.2f}x{flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenes', nargs='+', default=list(SCENES), choices=list(SCENES))
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-o', '--output', help='save results as JSON')
+    parser.add_argument('--compare', help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative drop of rays/s')
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error('--repeat has to be at least 1')
+
+    report = run(args.scenes, args.backends, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
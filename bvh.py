@@ -0,0 +1,157 @@
+import heapq
+from math import inf
+
+
+def union(box1, box2):
+    return min(box1[0], box2[0]), min(box1[1], box2[1]), max(box1[2], box2[2]), max(box1[3], box2[3])
+
+
+def area(box):
+    return (box[2] - box[0]) * (box[3] - box[1])
+
+
+def ray_box_entry(origin, direction, box):
+    """
+    Slab test. Distance along the ray to the point where it enters the box, 0 if it starts inside,
+    None if it misses the box
+    """
+    t_min, t_max = 0.0, inf
+    for o, d, lo, hi in ((origin.x, direction[0], box[0], box[2]), (origin.y, direction[1], box[1], box[3])):
+        if d == 0:
+            if o < lo or o > hi:
+                return None
+        else:
+            t1 = (lo - o) / d
+            t2 = (hi - o) / d
+            if t1 > t2:
+                t1, t2 = t2, t1
+            t_min = max(t_min, t1)
+            t_max = min(t_max, t2)
+            if t_min > t_max:
+                return None
+    return t_min
+
+
+def segment_box_intersect(p1, p2, box):
+    """
+    Liang-Barsky clipping of the segment p1-p2 against the box
+    """
+    t_min, t_max = 0.0, 1.0
+    for o, d, lo, hi in ((p1.x, p2.x - p1.x, box[0], box[2]), (p1.y, p2.y - p1.y, box[1], box[3])):
+        if d == 0:
+            if o < lo or o > hi:
+                return False
+        else:
+            t1 = (lo - o) / d
+            t2 = (hi - o) / d
+            if t1 > t2:
+                t1, t2 = t2, t1
+            t_min = max(t_min, t1)
+            t_max = min(t_max, t2)
+            if t_min > t_max:
+                return False
+    return True
+
+
+class BVHNode:
+    def __init__(self, box, left=None, right=None, obj_ids=None):
+        self.box = box
+        self.left = left
+        self.right = right
+        self.obj_ids = obj_ids      # leaf only
+
+    def is_leaf(self):
+        return self.obj_ids is not None
+
+
+class BVH:
+    """
+    Bounding volume hierarchy over objects with bbox() -> (x_min, y_min, x_max, y_max).
+    Built by median split along the longest axis of the object centers.
+    refit() updates boxes after objects have moved, the tree is rebuilt once refitting
+    has made the root box rebuild_ratio times larger than right after the build.
+    """
+    def __init__(self, obj_list, leaf_size=2, rebuild_ratio=2.0):
+        self.obj_list = obj_list
+        self.leaf_size = leaf_size
+        self.rebuild_ratio = rebuild_ratio
+        self.root = None
+        self.nodes = []         # parents always go before their children
+        self.boxes = []
+        self.built_area = 0.0
+        self.build()
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def build(self):
+        self.nodes = []
+        self.boxes = [obj.bbox() for obj in self.obj_list]
+        if self.boxes:
+            self.root = self.build_node(list(range(len(self.boxes))), self.boxes)
+            self.built_area = area(self.root.box)
+        else:
+            self.root = None
+            self.built_area = 0.0
+
+    def build_node(self, obj_ids, boxes):
+        box = boxes[obj_ids[0]]
+        for obj_id in obj_ids[1:]:
+            box = union(box, boxes[obj_id])
+        node = BVHNode(box)
+        self.nodes.append(node)
+        if len(obj_ids) <= self.leaf_size:
+            node.obj_ids = obj_ids
+            return node
+
+        axis = 0 if box[2] - box[0] >= box[3] - box[1] else 1
+        obj_ids = sorted(obj_ids, key=lambda i: boxes[i][axis] + boxes[i][axis+2])
+        mid = len(obj_ids) // 2
+        node.left = self.build_node(obj_ids[:mid], boxes)
+        node.right = self.build_node(obj_ids[mid:], boxes)
+        return node
+
+    def refit(self):
+        if len(self.obj_list) != len(self.boxes):
+            self.build()
+            return
+        self.boxes = [obj.bbox() for obj in self.obj_list]
+        for node in reversed(self.nodes):
+            if node.is_leaf():
+                box = self.boxes[node.obj_ids[0]]
+                for obj_id in node.obj_ids[1:]:
+                    box = union(box, self.boxes[obj_id])
+                node.box = box
+            else:
+                node.box = union(node.left.box, node.right.box)
+        if self.root is not None and area(self.root.box) > self.rebuild_ratio * self.built_area:
+            self.build()
+
+    def front_to_back(self, origin, direction):
+        """
+        Yields (obj_id, entry distance) of objects whose boxes are crossed by the ray
+        in order of increasing entry distance. direction has to be a unit vector
+        """
+        if self.root is None:
+            return
+        t = ray_box_entry(origin, direction, self.root.box)
+        if t is None:
+            return
+        counter = 0     # tie breaker, nodes are not comparable
+        heap = [(t, counter, self.root)]
+        while heap:
+            t, _, node = heapq.heappop(heap)
+            if not isinstance(node, BVHNode):   # object id
+                yield node, t
+            elif node.is_leaf():
+                for obj_id in node.obj_ids:
+                    t_obj = ray_box_entry(origin, direction, self.boxes[obj_id])
+                    if t_obj is not None:
+                        counter += 1
+                        heapq.heappush(heap, (t_obj, counter, obj_id))
+            else:
+                for child in (node.left, node.right):
+                    t_child = ray_box_entry(origin, direction, child.box)
+                    if t_child is not None:
+                        counter += 1
+                        heapq.heappush(heap, (t_child, counter, child))
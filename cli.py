@@ -0,0 +1,175 @@
+"""
+Headless simulation without Tk, for scripts and job schedulers.
+
+    python cli.py scene.json                                    trace with Tracer, print timings
+    python cli.py scene.json -b batch -n 100000 --detectors hist.csv --image rays.png
+    python cli.py -b parallel --workers 8 --paths paths.csv     the demo scene on a process pool
+
+-n sets n_rays of every emitter (sources.Emitter) of the scene. Outputs:
+    --paths         CSV, one row per segment: ray, depth, x1, y1, x2, y2, weight, wavelength, obj_id, tir
+    --detectors     CSV, one row per histogram bin: detector, histogram (position or angle), bin, value
+    --image         PNG of raster.Raster, PPM if the name ends with .ppm
+With the batch backend and only --detectors, rays are streamed in batches and their paths are not kept.
+--adaptive refines emitters with adaptive.AdaptiveSampler where neighbouring paths differ by more than TOLERANCE.
+"""
+import argparse
+import csv
+import json
+import time
+from math import isnan
+from scene import demo_scene
+from tracer import Tracer
+from stats import Stats
+import scenefile
+try:
+    import numpy as np
+    import sources
+    import raster
+    from batch import BatchTracer, record
+    from parallel import ParallelTracer
+    from adaptive import AdaptiveSampler
+except ImportError:     # numpy is not installed, only the tracer backend
+    np = sources = raster = BatchTracer = ParallelTracer = AdaptiveSampler = None
+
+BACKENDS = ['tracer'] if BatchTracer is None else ['tracer', 'batch', 'parallel']
+
+
+def set_rays(scene, n_rays):
+    emitters = [source for source in scene.sources() if isinstance(source, sources.Emitter)]
+    for emitter in emitters:
+        emitter.n_rays = n_rays
+    return len(emitters)
+
+
+def path_rows(paths):
+    ray = -1
+    for path in paths:
+        for segment in path.segments:
+            if segment.depth == 0:
+                ray += 1
+            yield (ray, segment.depth, segment.start.x, segment.start.y, segment.end.x, segment.end.y,
+                   segment.weight, '' if segment.wavelength is None else segment.wavelength,
+                   -1 if segment.obj_id is None else segment.obj_id, int(segment.tir))
+
+
+def result_rows(result):
+    """
+    Rows of a batch.BatchResult, in the order of its segment_arrays()
+    """
+    starts, ends, _ = result.segment_arrays()
+    valid = np.arange(result.obj_id.shape[1])[None, :] < result.n_segments[:, None]
+    ray_index, depth = np.nonzero(valid)
+    wavelength = [('' if isnan(w) else w) for w in result.wavelength[ray_index].tolist()]
+    return zip(ray_index.tolist(), depth.tolist(), starts[:, 0].tolist(), starts[:, 1].tolist(),
+               ends[:, 0].tolist(), ends[:, 1].tolist(), result.weight[ray_index].tolist(), wavelength,
+               result.obj_id[valid].tolist(), result.tir[valid].astype(int).tolist())
+
+
+def write_paths(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['ray', 'depth', 'x1', 'y1', 'x2', 'y2', 'weight', 'wavelength', 'obj_id', 'tir'])
+        writer.writerows(rows)
+
+
+def write_detectors(path, detectors):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['detector', 'histogram', 'bin', 'value'])
+        for detector in detectors:
+            writer.writerows((detector.name, 'position', i, value) for i, value in enumerate(detector.position))
+            writer.writerows((detector.name, 'angle', i, value) for i, value in enumerate(detector.angle))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scene', nargs='?', help='scene file, the demo scene by default')
+    parser.add_argument('-b', '--backend', default='tracer', choices=BACKENDS)
+    parser.add_argument('-n', '--rays', type=int, help='rays per emitter')
+    parser.add_argument('--adaptive', type=float, metavar='TOLERANCE',
+                        help='batch: sample emitters adaptively instead of with n_rays rays')
+    parser.add_argument('--no-split', action='store_true',
+                        help='tracer: follow only the transmitted ray, the reflected one on total internal reflection')
+    parser.add_argument('--workers', type=int, help='parallel: number of processes')
+    parser.add_argument('--paths', help='write segments as CSV')
+    parser.add_argument('--detectors', help='write detector histograms as CSV')
+    parser.add_argument('--image', help='render the rays into a PNG or PPM file')
+    parser.add_argument('--size', default='1280x720', help='image width x height in pixels')
+    parser.add_argument('--scale', type=float, default=1.0, help='image pixels per scene unit')
+    parser.add_argument('--stats', action='store_true', help='tracer: print counters as JSON')
+    args = parser.parse_args()
+    if args.image and raster is None:
+        parser.error('--image needs numpy')
+    if args.adaptive is not None and args.backend != 'batch':
+        parser.error('--adaptive needs the batch backend')
+    if args.stats and args.backend != 'tracer':
+        parser.error('--stats needs the tracer backend')
+
+    t = time.perf_counter()
+    scene = scenefile.load(args.scene) if args.scene else demo_scene()
+    if args.rays is not None and sources is not None:
+        set_rays(scene, args.rays)
+    detectors = scene.detectors()
+    for detector in detectors:
+        detector.reset()
+    print(f'{"load:":<8}{time.perf_counter() - t:10.3f} s    {len(scene.obj_list)} objects, '
+          f'{len(scene.sources())} sources, {len(detectors)} detectors')
+
+    t = time.perf_counter()
+    stats = Stats() if args.stats else None
+    paths = result = None
+    if args.backend == 'tracer':
+        paths = Tracer(scene, split=not args.no_split, stats=stats).trace()
+        for detector in detectors:
+            for path in paths:
+                detector.record_path(path)
+        n_rays = sum(segment.depth == 0 for path in paths for segment in path.segments)
+        n_segments = sum(len(path.segments) for path in paths)
+    elif args.adaptive is not None:
+        result = AdaptiveSampler(BatchTracer(scene), tolerance=args.adaptive).trace_sources()
+        n_rays = len(result)
+        n_segments = int(result.n_segments.sum())
+    elif args.backend == 'batch' and not args.paths and not args.image:
+        tracer = BatchTracer(scene)
+        n_rays = 0
+        for n_rays in tracer.stream(tracer.source_batches(), detectors):
+            pass
+        n_segments = None
+    else:
+        if args.backend == 'batch':
+            result = BatchTracer(scene).trace_sources()
+        else:
+            with ParallelTracer(scene, workers=args.workers) as tracer:
+                origins, directions, weights, wavelengths = BatchTracer(scene).source_rays()
+                result = tracer.trace_batch(origins, directions, wavelengths=wavelengths, weights=weights)
+        record(detectors, result)
+        n_rays = len(result)
+        n_segments = int(result.n_segments.sum())
+    t = time.perf_counter() - t
+    print(f'{"trace:":<8}{t:10.3f} s    {n_rays} rays' +
+          (f', {n_segments} segments' if n_segments is not None else '') +
+          (f', {n_rays / t:.0f} rays/s' if t > 0 else ''))
+    for detector in detectors:
+        print(f'        {detector.name}: {detector.hits} hits, power {detector.power:.6g}')
+    if stats is not None:
+        print(json.dumps(stats.summary(), indent=2))
+
+    t = time.perf_counter()
+    if args.paths:
+        write_paths(args.paths, path_rows(paths) if paths is not None else result_rows(result))
+    if args.detectors:
+        write_detectors(args.detectors, detectors)
+    if args.image:
+        width, height = (int(v) for v in args.size.lower().split('x'))
+        image = raster.Raster(width, height, scale=args.scale)
+        if paths is not None:
+            image.add_paths(paths)
+        else:
+            image.add_result(result)
+        image.save(args.image)
+    if args.paths or args.detectors or args.image:
+        print(f'{"write:":<8}{time.perf_counter() - t:10.3f} s')
+
+
+if __name__ == '__main__':
+    main()
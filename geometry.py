@@ -0,0 +1,375 @@
+from math import inf, pi, fabs, cos, tan, atan
+
+
+class CustomError(Exception):
+    def __init__(self, *args):
+        if args:
+            self.message = args[0]
+        else:
+            self.message = None
+
+    def __str__(self):
+        if self.message:
+            return str(self.message)
+        else:
+            return 'CustomError has been raised'
+
+
+class Vector2:
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x=0.0, y=0.0):
+        self.x = x
+        self.y = y
+
+    def __add__(self, other):
+        return Vector2(self.x+other.x, self.y+other.y)
+
+    def __sub__(self, other):
+        return Vector2(self.x-other.x, self.y-other.y)
+
+    def __mul__(self, k):
+        return Vector2(self.x*k, self.y*k)
+
+    def __neg__(self):
+        return Vector2(-self.x, -self.y)
+
+    def __str__(self):
+        return f'({self.x}, {self.y})'
+
+    def dist(self, vector2):
+        return ((vector2.x - self.x)**2 + (vector2.y - self.y)**2)**0.5
+
+    def dot(self, vector2):
+        return self.x*vector2.x + self.y*vector2.y
+
+    def length(self):
+        return (self.x**2 + self.y**2)**0.5
+
+    def normalized(self):
+        length = self.length()
+        return Vector2(self.x/length, self.y/length)
+
+
+class Line:
+    """
+    a*x + b*y + c = 0
+    Lines are not changed after creation, the slope is computed once
+    """
+    __slots__ = ('a', 'b', 'c', 'slope')
+
+    def __init__(self, a, b, c):
+        self.a = a
+        self.b = b
+        self.c = c
+        self.slope = None if b == 0 else -a/b
+
+    def is_vertical(self):
+        """
+        a*x + b*y + c = 0
+        b = 0
+        <=>
+        x = -c/a
+        """
+        if self.b == 0:
+            return True
+        else:
+            return False
+
+    def is_horizontal(self):
+        """
+        a*x + b*y + c = 0
+        a = 0
+        <=>
+        y = -c/b
+        """
+        if self.a == 0:
+            return True
+        else:
+            return False
+
+    def k(self):
+        """
+        a*x + b*y + c = 0
+        y = k*x + l
+        k = -a/b
+        """
+        return self.slope
+
+    def angle(self):
+        """
+        y = kx + l
+        k = tan(alpha)
+        alpha = atan(k)
+        """
+        if self.slope is None:
+            return pi/2
+        else:
+            return atan(self.slope)
+
+    def intersection_line(self, line):
+        """
+        { a1*x + b1*y + c1 = 0
+        { a2*x + b2*y + c2 = 0
+
+        d = |a1 b1| = a1*b2 - b1*a2
+            |a2 b2|
+
+        dx = |-c1 b1| = -c1*b2 + b1*c2
+             |-c2 b2|
+
+        dy = |a1 -c1| = -a1*c2 + c1*a2
+             |a2 -c2|
+
+        x = dx / d
+        y = dy / d
+        """
+        d = self.a * line.b - self.b * line.a
+        if d == 0:      # no intersections
+            return None
+        else:
+            dx = -self.c * line.b + self.b * line.c
+            dy = -self.a * line.c + self.c * line.a
+            return Vector2(dx/d, dy/d)
+
+    def intersection_circle(self, center, r):
+        """
+        { a*x + b*y + c = 0
+        { (x-x0)^2 + (y-y0)^2 = R^2
+
+        x^2*(a^2+b^2) + x*(2(ac+aby0-2b^2*x0)) + (b^2*(x0^2+y0^2-r^2)+c^2+2bcy0) = 0
+
+        D = 4(ac+aby0-b^2*x0)^2 - 4(a^2+b^2)*(b^2*(x0^2+y0^2-r^2)+c^2+2bcy0)
+
+        x1,2 = (-2(ac+aby0-2b^2*x0) +- sqrt(D)) / (2*(a^2+b^2))
+        y1,2 = (-a * x1,2 - c) / b
+        """
+        x0, y0 = center.x, center.y
+        if not self.is_vertical():      # not vertical line
+            d = 4*(self.a*self.c + self.a*self.b*y0 - self.b**2 * x0)**2 - 4*(self.a**2 + self.b**2) *\
+                (self.b**2 * (x0**2 + y0**2 - r**2) + self.c**2 + 2*self.b*self.c*y0)
+            if d > 0:       # two intersections
+                x1 = (-2*(self.a*self.c + self.a*self.b*y0 - self.b**2 * x0) + d**0.5) / (2*(self.a**2 + self.b**2))
+                x2 = (-2*(self.a*self.c + self.a*self.b*y0 - self.b**2 * x0) - d**0.5) / (2*(self.a**2 + self.b**2))
+                y1 = (-self.a*x1 - self.c) / self.b
+                y2 = (-self.a*x2 - self.c) / self.b
+                return [Vector2(x1, y1), Vector2(x2, y2)]
+            elif d == 0:    # one intersection
+                x = (-2*(self.a*self.c + self.a*self.b*y0 - self.b**2 * x0)) / (2*(self.a**2 + self.b**2))
+                y = (-self.a*x - self.c) / self.b
+                return [Vector2(x, y)]
+            else:           # no intersections
+                return []
+        else:                           # vertical line
+            x = -self.c / self.a
+            und_sqrt = r**2 - (x - x0)**2
+            if und_sqrt >= 0:
+                y1 = und_sqrt**0.5 + y0
+                y2 = -und_sqrt**0.5 + y0
+                if y1 != y2:    # two intersections
+                    return [Vector2(x, y2), Vector2(x, y1)]
+                else:           # one intersection
+                    return [Vector2(x, y2)]
+            else:               # no intersections
+                return []
+
+    def intersection_angle(self, line):
+        """
+        y = k1*x + l1
+        y = k2*x + l2
+        tan(O) = (k2 - k1) / (1 + k1*k2)
+        return angle from self to line
+        """
+        k1 = self.slope
+        k2 = line.slope
+        if (k1 is not None) and (k2 is not None):   # both lines are not vertical
+            if k1*k2 == -1:     # perpendicular lines (atan(inf) = pi/2)
+                if k1 > k2:
+                    return -pi/2
+                else:
+                    return pi/2
+            else:               # not perpendicular lines
+                return atan((k2 - k1) / (1 + k1*k2))
+        elif (k1 is None) and (k2 is not None):     # first line is vertical
+            return -pi/2 + atan(k2)
+        elif (k1 is not None) and (k2 is None):     # second line is vertical
+            return pi/2 - atan(k1)
+        else:                                       # both lines are vertical
+            return 0
+
+    def rotate(self, point, angle):
+        """
+        y = k1*x + l1
+        y = k2*x + l2
+        k1 = tan(alpha1)
+        k2 = tan(alpha2)
+        alpha2 = alpha1 + angle
+        """
+        return Line.line_through_1p_angle(point, self.angle()+angle)
+
+    def direction(self, point_from, point_surf, surface, get_through):
+        """
+        Positive direction is a direction of increasing X. Or Y if line is vertical
+        """
+        positive_direction = True
+        if self.is_vertical():
+            point_chck = Vector2((-self.b/self.a) * (point_surf.y+1) - self.c/self.a, point_surf.y+1)
+        else:
+            point_chck = Vector2(point_surf.x+1, (-self.a/self.b) * (point_surf.x+1) - self.c/self.b)
+
+        if not surface.is_vertical():
+            if point_from.y > (-surface.a/surface.b) * point_from.x - surface.c/surface.b:
+                if point_chck.y > (-surface.a/surface.b) * point_chck.x - surface.c/surface.b:
+                    same_side = True
+                else:
+                    same_side = False
+            else:
+                if point_chck.y > (-surface.a/surface.b) * point_chck.x - surface.c/surface.b:
+                    same_side = False
+                else:
+                    same_side = True
+        else:
+            if point_from.x > point_surf.x:
+                if point_chck.x > point_surf.x:
+                    same_side = True
+                else:
+                    same_side = False
+            else:
+                if point_chck.x > point_surf.x:
+                    same_side = False
+                else:
+                    same_side = True
+
+        if not same_side:
+            positive_direction = not positive_direction
+
+        if get_through:
+            positive_direction = not positive_direction
+
+        return positive_direction
+
+    @staticmethod
+    def line_through_2p(p1, p2):
+        """
+        (x-x1)/(x2-x1) = (y-y1)/(y2-y1)
+        <=>
+        (y2-y1)x + (x1-x2)y - (x1*y2-x2*y1) = 0
+        """
+        if p1.x != p2.x or p1.y != p2.y:
+            return Line(p2.y-p1.y, p1.x-p2.x, p2.x*p1.y-p1.x*p2.y)
+        else:
+            raise CustomError('Points should not be the same')
+
+    @staticmethod
+    def line_through_1p_k(p, k):
+        """
+        y = k(x-x0) + y0
+        <=>
+        -kx + y + (k*x0-y0) = 0
+        """
+        if k == inf or k == -inf or k is None:   # vertical line
+            return Line(1, 0, -p.x)
+        else:                       # not vertical line
+            return Line(-k, 1, k*p.x-p.y)
+
+    @staticmethod
+    def line_through_1p_angle(p, angle):
+        """
+        y = kx + l
+        k = tan(alpha)
+        """
+        if fabs(cos(angle)) < 1e-12:    # tan(pi/2) = inf, but math.tan returns a huge finite number
+            k = None
+        else:
+            k = tan(angle)
+        return Line.line_through_1p_k(p, k)
+
+    @staticmethod
+    def line_k_l(k, l):
+        """
+        y = kx + l
+        <=>
+        -kx + y - l = 0
+        """
+        if k == inf or k == -inf or k is None:  # vertical line
+            return Line(1, 0, -l)
+        else:                                   # not vertical line
+            return Line(-k, 1, -l)
+
+    @staticmethod
+    def line_tangent_to_circle(p, center, r):
+        """
+        (x1–х0)*(х–х0) + (у1–у0)*(у–у0) = R^2
+        (x1-x0)*x + (y1-y0)*y + (x0^2 - x0*x1 + y0^2 - y0*y1 - R^2) = 0
+        """
+        x0, y0 = center.x, center.y
+        return Line(p.x-x0, p.y-y0, x0**2-x0*p.x+y0**2-y0*p.y-r**2)
+
+
+class Ray:
+    """
+    p(t) = origin + t*direction, t >= 0, |direction| = 1
+    """
+    __slots__ = ('origin', 'direction')
+
+    def __init__(self, origin, direction):
+        self.origin = origin
+        self.direction = direction
+
+    def point(self, t):
+        return Vector2(self.origin.x + t*self.direction.x, self.origin.y + t*self.direction.y)
+
+    def intersection_segment(self, p1, p2):
+        """
+        origin + t*d = p1 + u*(p2-p1), 0 <= u <= 1
+        t = ((p1-origin) x (p2-p1)) / (d x (p2-p1))
+        u = ((p1-origin) x d) / (d x (p2-p1))
+        return t or None
+        """
+        d = self.direction
+        ex, ey = p2.x - p1.x, p2.y - p1.y
+        denom = d.x*ey - d.y*ex
+        if denom == 0:      # parallel
+            return None
+        wx, wy = p1.x - self.origin.x, p1.y - self.origin.y
+        u = (wx*d.y - wy*d.x) / denom
+        if 0 <= u <= 1:
+            return (wx*ey - wy*ex) / denom
+        return None
+
+    def intersection_circle(self, center, r):
+        """
+        |origin + t*d - center|^2 = r^2, |d| = 1
+        t^2 + 2*b*t + cc = 0, b = d*(origin-center), cc = |origin-center|^2 - r^2
+        t1,2 = -b -+ sqrt(b^2 - cc)
+        """
+        ox, oy = self.origin.x - center.x, self.origin.y - center.y
+        b = self.direction.x*ox + self.direction.y*oy
+        disc = b*b - (ox*ox + oy*oy - r*r)
+        if disc < 0:
+            return []
+        sq = disc**0.5
+        return [-b - sq, -b + sq]
+
+    @staticmethod
+    def snell(direction, normal, n1, n2):
+        """
+        cos_i = -d*n (normal is flipped to face the incoming ray)
+        k = 1 - (n1/n2)^2 * (1 - cos_i^2), k < 0 means total internal reflection
+        reflected = d + 2*cos_i*n
+        refracted = (n1/n2)*d + ((n1/n2)*cos_i - sqrt(k))*n
+        return normal, cos_i, cos_t (None in case of TIR), reflected, refracted (None in case of TIR)
+        """
+        cos_i = -direction.dot(normal)
+        if cos_i < 0:
+            normal = -normal
+            cos_i = -cos_i
+        reflected = Vector2(direction.x + 2*cos_i*normal.x, direction.y + 2*cos_i*normal.y)
+        eta = n1/n2
+        k = 1 - eta*eta * (1 - cos_i*cos_i)
+        if k < 0:
+            return normal, cos_i, None, reflected, None
+        cos_t = k**0.5
+        m = eta*cos_i - cos_t
+        refracted = Vector2(eta*direction.x + m*normal.x, eta*direction.y + m*normal.y)
+        return normal, cos_i, cos_t, reflected, refracted
@@ -1,315 +1,34 @@
+import sys
 import tkinter
-from math import inf, pi, fabs, sin, cos, tan, asin, acos, atan, degrees, radians
+from math import pi, asin, degrees
 import time
+from collections import deque
+from functools import partial
+from geometry import Vector2, Line
+from tracer import Tracer
+from stats import Stats
+from spectral import wavelength_color
+import scene
+import scenefile
+try:
+    import sources
+    import raster
+except ImportError:     # numpy is not installed, no emitters and no raster rendering
+    sources = raster = None
 # import keyboard as kb   # pip install keyboard
 
 
-class CustomError(Exception):
-    def __init__(self, *args):
-        if args:
-            self.message = args[0]
-        else:
-            self.message = None
-
-    def __str__(self):
-        if self.message:
-            return str(self.message)
-        else:
-            return 'CustomError has been raised'
-
-
-class Vector2:
-    def __init__(self, x=0.0, y=0.0):
-        self.x = x
-        self.y = y
-
-    def __add__(self, other):
-        return Vector2(self.x+other.x, self.y+other.y)
-
-    def __sub__(self, other):
-        return Vector2(self.x-other.x, self.y-other.y)
-
-    def __str__(self):
-        return f'({self.x}, {self.y})'
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        return None
-
-    def dist(self, vector2):
-        return ((vector2.x - self.x)**2 + (vector2.y - self.y)**2)**0.5
-
-
-class Line:
-    """
-    a*x + b*y + c = 0
-    """
-    def __init__(self, a, b, c):
-        self.a = a
-        self.b = b
-        self.c = c
-
-    def is_vertical(self):
-        """
-        a*x + b*y + c = 0
-        b = 0
-        <=>
-        x = -c/a
-        """
-        if self.b == 0:
-            return True
-        else:
-            return False
-
-    def is_horizontal(self):
-        """
-        a*x + b*y + c = 0
-        a = 0
-        <=>
-        y = -c/b
-        """
-        if self.a == 0:
-            return True
-        else:
-            return False
-
-    def k(self):
-        """
-        a*x + b*y + c = 0
-        y = k*x + l
-        k = -a/b
-        """
-        if self.is_vertical():
-            return None
-        else:
-            return -self.a/self.b
-
-    def angle(self):
-        """
-        y = kx + l
-        k = tan(alpha)
-        alpha = atan(k)
-        """
-        if self.is_vertical():
-            return pi/2
-        else:
-            return atan(self.k())
-
-    def intersection_line(self, line):
-        """
-        { a1*x + b1*y + c1 = 0
-        { a2*x + b2*y + c2 = 0
-
-        d = |a1 b1| = a1*b2 - b1*a2
-            |a2 b2|
-
-        dx = |-c1 b1| = -c1*b2 + b1*c2
-             |-c2 b2|
-
-        dy = |a1 -c1| = -a1*c2 + c1*a2
-             |a2 -c2|
-
-        x = dx / d
-        y = dy / d
-        """
-        d = self.a * line.b - self.b * line.a
-        if d == 0:      # no intersections
-            return None
-        else:
-            dx = -self.c * line.b + self.b * line.c
-            dy = -self.a * line.c + self.c * line.a
-            return Vector2(dx/d, dy/d)
-
-    def intersection_circle(self, center, r):
-        """
-        { a*x + b*y + c = 0
-        { (x-x0)^2 + (y-y0)^2 = R^2
-
-        x^2*(a^2+b^2) + x*(2(ac+aby0-2b^2*x0)) + (b^2*(x0^2+y0^2-r^2)+c^2+2bcy0) = 0
-
-        D = 4(ac+aby0-b^2*x0)^2 - 4(a^2+b^2)*(b^2*(x0^2+y0^2-r^2)+c^2+2bcy0)
-
-        x1,2 = (-2(ac+aby0-2b^2*x0) +- sqrt(D)) / (2*(a^2+b^2))
-        y1,2 = (-a * x1,2 - c) / b
-        """
-        x0, y0 = center.x, center.y
-        if not self.is_vertical():      # not vertical line
-            d = 4*(self.a*self.c + self.a*self.b*y0 - self.b**2 * x0)**2 - 4*(self.a**2 + self.b**2) *\
-                (self.b**2 * (x0**2 + y0**2 - r**2) + self.c**2 + 2*self.b*self.c*y0)
-            if d > 0:       # two intersections
-                x1 = (-2*(self.a*self.c + self.a*self.b*y0 - self.b**2 * x0) + d**0.5) / (2*(self.a**2 + self.b**2))
-                x2 = (-2*(self.a*self.c + self.a*self.b*y0 - self.b**2 * x0) - d**0.5) / (2*(self.a**2 + self.b**2))
-                y1 = (-self.a*x1 - self.c) / self.b
-                y2 = (-self.a*x2 - self.c) / self.b
-                return [Vector2(x1, y1), Vector2(x2, y2)]
-            elif d == 0:    # one intersection
-                x = (-2*(self.a*self.c + self.a*self.b*y0 - self.b**2 * x0)) / (2*(self.a**2 + self.b**2))
-                y = (-self.a*x - self.c) / self.b
-                return [Vector2(x, y)]
-            else:           # no intersections
-                return []
-        else:                           # vertical line
-            x = -self.c / self.a
-            und_sqrt = r**2 - (x - x0)**2
-            if und_sqrt >= 0:
-                y1 = und_sqrt**0.5 + y0
-                y2 = -und_sqrt**0.5 + y0
-                if y1 != y2:    # two intersections
-                    return [Vector2(x, y2), Vector2(x, y1)]
-                else:           # one intersection
-                    return [Vector2(x, y2)]
-            else:               # no intersections
-                return []
-
-    def intersection_angle(self, line):
-        """
-        y = k1*x + l1
-        y = k2*x + l2
-        tan(O) = (k2 - k1) / (1 + k1*k2)
-        return angle from self to line
-        """
-        k1 = self.k()
-        k2 = line.k()
-        if (k1 is not None) and (k2 is not None):   # both lines are not vertical
-            if k1*k2 == -1:     # perpendicular lines (atan(inf) = pi/2)
-                if k1 > k2:
-                    return -pi/2
-                else:
-                    return pi/2
-            else:               # not perpendicular lines
-                return atan((k2 - k1) / (1 + k1*k2))
-        elif (k1 is None) and (k2 is not None):     # first line is vertical
-            return -pi/2 + atan(k2)
-        elif (k1 is not None) and (k2 is None):     # second line is vertical
-            return pi/2 - atan(k1)
-        else:                                       # both lines are vertical
-            return 0
-
-    def rotate(self, point, angle):
-        """
-        y = k1*x + l1
-        y = k2*x + l2
-        k1 = tan(alpha1)
-        k2 = tan(alpha2)
-        alpha2 = alpha1 + angle
-        """
-        return Line.line_through_1p_angle(point, self.angle()+angle)
-
-    def direction(self, point_from, point_surf, surface, get_through):
-        """
-        Positive direction is a direction of increasing X. Or Y if line is vertical
-        """
-        positive_direction = True
-        if self.is_vertical():
-            point_chck = Vector2((-self.b/self.a) * (point_surf.y+1) - self.c/self.a, point_surf.y+1)
-        else:
-            point_chck = Vector2(point_surf.x+1, (-self.a/self.b) * (point_surf.x+1) - self.c/self.b)
-
-        if not surface.is_vertical():
-            if point_from.y > (-surface.a/surface.b) * point_from.x - surface.c/surface.b:
-                if point_chck.y > (-surface.a/surface.b) * point_chck.x - surface.c/surface.b:
-                    same_side = True
-                else:
-                    same_side = False
-            else:
-                if point_chck.y > (-surface.a/surface.b) * point_chck.x - surface.c/surface.b:
-                    same_side = False
-                else:
-                    same_side = True
-        else:
-            if point_from.x > point_surf.x:
-                if point_chck.x > point_surf.x:
-                    same_side = True
-                else:
-                    same_side = False
-            else:
-                if point_chck.x > point_surf.x:
-                    same_side = False
-                else:
-                    same_side = True
-
-        if not same_side:
-            positive_direction = not positive_direction
-
-        if get_through:
-            positive_direction = not positive_direction
-
-        return positive_direction
-
-    @staticmethod
-    def line_through_2p(p1, p2):
-        """
-        (x-x1)/(x2-x1) = (y-y1)/(y2-y1)
-        <=>
-        (y2-y1)x + (x1-x2)y - (x1*y2-x2*y1) = 0
-        """
-        if p1.x != p2.x or p1.y != p2.y:
-            return Line(p2.y-p1.y, p1.x-p2.x, p2.x*p1.y-p1.x*p2.y)
-        else:
-            raise CustomError('Points should not be the same')
-
-    @staticmethod
-    def line_through_1p_k(p, k):
-        """
-        y = k(x-x0) + y0
-        <=>
-        -kx + y + (k*x0-y0) = 0
-        """
-        if k == inf or k == -inf or k is None:   # vertical line
-            return Line(1, 0, -p.x)
-        else:                       # not vertical line
-            return Line(-k, 1, k*p.x-p.y)
-
-    @staticmethod
-    def line_through_1p_angle(p, angle):
-        """
-        y = kx + l
-        k = tan(alpha)
-        """
-        try:
-            k = tan(angle)
-        except:     # tan(pi/2) = inf
-            k = None
-        return Line.line_through_1p_k(p, k)
-
-    @staticmethod
-    def line_k_l(k, l):
-        """
-        y = kx + l
-        <=>
-        -kx + y - l = 0
-        """
-        if k == inf or k == -inf or k is None:  # vertical line
-            return Line(1, 0, -l)
-        else:                                   # not vertical line
-            return Line(-k, 1, -l)
-
-    @staticmethod
-    def line_tangent_to_circle(p, center, r):
-        """
-        (x1–х0)*(х–х0) + (у1–у0)*(у–у0) = R^2
-        (x1-x0)*x + (y1-y0)*y + (x0^2 - x0*x1 + y0^2 - y0*y1 - R^2) = 0
-        """
-        x0, y0 = center.x, center.y
-        return Line(p.x-x0, p.y-y0, x0**2-x0*p.x+y0**2-y0*p.y-r**2)
-
-
-class Ruler:
+class Ruler(scene.Ruler):
     def __init__(self, plane, v1, v2, name, color='grey', dbg=False):
+        super().__init__(v1, v2, name)
         self.plane = plane
-        self.name = name
         self.color = color
         self.dbg = dbg
         self.name_dbg = f'{name}Dbg'
         self.name_v1 = f'{name}v1'
         self.name_v2 = f'{name}v2'
-        self.v1 = v1
-        self.v2 = v2
         self.move_offset = Vector2()
         self.move_offset_pix = Vector2()
-        self.line = Line.line_through_2p(v1, v2)
 
     def draw_dbg(self):
         plane = self.plane
@@ -363,9 +82,6 @@ class Ruler:
         plane.canvas.tag_bind(self.name, '<Button-1>', self.click_v1)
         plane.canvas.tag_bind(self.name, '<B1-Motion>', self.drag_line)
 
-    def recalculate_line(self):
-        self.line = Line.line_through_2p(self.v1, self.v2)
-
     def drag_v1(self, event):
         move = Vector2(self.plane.pix2x(event.x) - self.v1.x - self.move_offset.x,
                        self.plane.pix2y(event.y) - self.v1.y - self.move_offset.y)
@@ -376,7 +92,7 @@ class Ruler:
         self.recalculate_line()
         self.draw_dbg()
         self.draw_line()
-        self.plane.update()
+        self.plane.request_update()
 
     def drag_v2(self, event):
         move = Vector2(self.plane.pix2x(event.x) - self.v2.x - self.move_offset.x,
@@ -388,7 +104,7 @@ class Ruler:
         self.recalculate_line()
         self.draw_dbg()
         self.draw_line()
-        self.plane.update()
+        self.plane.request_update()
 
     def drag_line(self, event):
         move = Vector2(self.plane.pix2x(event.x) - self.v1.x - self.move_offset.x,
@@ -402,7 +118,7 @@ class Ruler:
         self.v2 += move
         self.recalculate_line()
         self.draw_dbg()
-        self.plane.update()
+        self.plane.request_update()
 
     def click_v1(self, event):
         self.move_offset = Vector2(self.plane.pix2x(event.x)-self.v1.x,
@@ -417,21 +133,56 @@ class Ruler:
                                        event.y-self.plane.y2pix(self.v2.y))
 
 
-class RayCaster:
-    def __init__(self, plane, v1, v2, name, color='grey', ray_color='red', dbg=False):
+class Detector(Ruler, scene.Detector):
+    """
+    Shows the hit count, the total weight and the position histogram of the rays traced in the last frame
+    """
+    def __init__(self, plane, v1, v2, name, bins=64, angle_bins=36, color='orange', dbg=False):
+        super().__init__(plane, v1, v2, name, color=color, dbg=dbg)
+        self.bins = bins
+        self.angle_bins = angle_bins
+        self.reset()
+
+    def draw_dbg(self):
+        plane = self.plane
+        plane.canvas.delete(self.name_dbg)
+        x = self.v1.x + (self.v2.x - self.v1.x) / 2
+        y = self.v1.y + (self.v2.y - self.v1.y) / 2
+        text = f'{self.hits} hits\nPower: {self.power.__round__(3)}'
+        if self.dbg:
+            text = f'Name:  {self.name}\n{text}'
+        plane.canvas.create_text(plane.x2pix(x), plane.y2pix(y+5),
+                                 text=text,
+                                 fill=plane.color_ol, font=plane.font, anchor=tkinter.SW,
+                                 tag=self.name_dbg)
+
+        # histogram drawn along the normal, the fullest bin is 40 px high
+        peak = max(self.position)
+        if peak > 0:
+            normal = scene.segment_normal(self.v1, self.v2)
+            edge = (self.v2 - self.v1) * (1 / self.bins)
+            coords = []
+            for i, power in enumerate(self.position):
+                point = self.v1 + edge*(i + 0.5) + normal*(40 * power / peak)
+                coords += (plane.x2pix(point.x), plane.y2pix(point.y))
+            if len(coords) > 2:
+                plane.canvas.create_line(*coords, fill=self.color, tag=self.name_dbg)
+
+
+class RayCaster(scene.RayCaster):
+    """
+    options go to the scene class, e.g. n_rays and width of emitters
+    """
+    def __init__(self, plane, v1, v2, name, color='grey', ray_color='red', wavelengths=None, dbg=False, **options):
+        super().__init__(v1, v2, name, ray_color=ray_color, wavelengths=wavelengths, **options)
         self.plane = plane
         self.dbg = dbg
         self.color = color
-        self.ray_color = ray_color
-        self.name = name
         self.name_dbg = f'{name}Dbg'
         self.name_v1 = f'{name}v1'
         self.name_v2 = f'{name}v2'
-        self.v1 = v1
-        self.v2 = v2
         self.move_offset = Vector2()
         self.move_offset_pix = Vector2()
-        self.line = Line.line_through_2p(v1, v2)
 
     def draw_dbg(self):
         if self.dbg:
@@ -482,9 +233,6 @@ class RayCaster:
         plane.canvas.tag_bind(self.name, '<Button-1>', self.click_v1)
         plane.canvas.tag_bind(self.name, '<B1-Motion>', self.drag_line)
 
-    def recalculate_line(self):
-        self.line = Line.line_through_2p(self.v1, self.v2)
-
     def drag_v1(self, event):
         move = Vector2(self.plane.pix2x(event.x) - self.v1.x - self.move_offset.x,
                        self.plane.pix2y(event.y) - self.v1.y - self.move_offset.y)
@@ -493,9 +241,10 @@ class RayCaster:
         self.plane.canvas.move(self.name_v1, move_pix.x, move_pix.y)
         self.v1 += move
         self.recalculate_line()
+        self.plane.source_moved(self)
         self.draw_dbg()
         self.draw_line()
-        self.plane.update()
+        self.plane.request_update()
 
     def drag_v2(self, event):
         move = Vector2(self.plane.pix2x(event.x) - self.v2.x - self.move_offset.x,
@@ -505,9 +254,10 @@ class RayCaster:
         self.plane.canvas.move(self.name_v2, move_pix.x, move_pix.y)
         self.v2 += move
         self.recalculate_line()
+        self.plane.source_moved(self)
         self.draw_dbg()
         self.draw_line()
-        self.plane.update()
+        self.plane.request_update()
 
     def drag_line(self, event):
         move = Vector2(self.plane.pix2x(event.x) - self.v1.x - self.move_offset.x,
@@ -520,8 +270,9 @@ class RayCaster:
         self.v1 += move
         self.v2 += move
         self.recalculate_line()
+        self.plane.source_moved(self)
         self.draw_dbg()
-        self.plane.update()
+        self.plane.request_update()
 
     def click_v1(self, event):
         self.move_offset = Vector2(self.plane.pix2x(event.x)-self.v1.x,
@@ -536,41 +287,23 @@ class RayCaster:
                                        event.y-self.plane.y2pix(self.v2.y))
 
 
-class Polygon:
-    def __init__(self, plane, v1, name, length, width, angle_l=pi/2, angle_r=pi/2, abs_refr_indx=1.65, dbg=False):
+if sources is not None:
+    EMITTERS = {name: type(name, (RayCaster, cls), {}) for name, cls in sources.EMITTERS.items()}
+else:
+    EMITTERS = {}
+
+
+class Polygon(scene.Polygon):
+    def __init__(self, plane, v1, name, length, width, angle_l=pi/2, angle_r=pi/2, abs_refr_indx=1.65, material=None,
+                 dbg=False):
+        super().__init__(v1, name, length, width, angle_l=angle_l, angle_r=angle_r, abs_refr_indx=abs_refr_indx,
+                         material=material)
         self.plane = plane
         self.dbg = dbg
-        self.name = name
         self.name_mask = f'{name}Mask'
         self.name_dbg = f'{name}Dbg'
-        self.abs_refr_indx = abs_refr_indx
-        self.angle_l = angle_l
-        self.angle_r = angle_r
         self.move_offset = Vector2()
         self.move_offset_pix = Vector2()
-        self.width = width
-        if self.angle_r + self.angle_l == pi:
-            self.length_t = self.length_b = length
-        elif self.angle_l + self.angle_r < pi:  # top is shorter
-            self.length_t = length
-            self.length_b = length + self.width/tan(angle_l) + self.width/tan(angle_r)
-        else:                                   # bottom is shorter
-            self.length_t = length + self.width*tan(angle_l-pi/2) + self.width*tan(angle_r-pi/2)
-            self.length_b = length
-
-        self.v1 = v1
-        self.v2 = Vector2(self.v1.x+self.length_t, self.v1.y)
-        if self.angle_r == pi/2:
-            self.v3 = Vector2(self.v2.x, self.v2.y-self.width)
-        else:
-            self.v3 = Vector2(self.width/tan(self.angle_r)+self.v2.x, -self.width+self.v2.y)
-        self.v4 = Vector2(self.v3.x-self.length_b, self.v3.y)
-
-        self.line12 = Line(0, 0, 0)
-        self.line23 = Line(0, 0, 0)
-        self.line34 = Line(0, 0, 0)
-        self.line41 = Line(0, 0, 0)
-        self.recalculate_lines()
 
     def draw_dbg(self):
         if self.dbg:
@@ -619,54 +352,6 @@ class Polygon:
         plane.canvas.tag_bind(self.name_mask, '<Button-1>', self.click)
         plane.canvas.tag_bind(self.name_mask, '<B1-Motion>', self.drag)
 
-    def intersections(self, line):
-        result = []
-        # top
-        intr_point = self.line12.intersection_line(line)
-        if intr_point is not None:
-            if self.v1.x < intr_point.x < self.v2.x:
-                result.append([intr_point, self.line12.intersection_angle(line), self.line12, self.abs_refr_indx])
-
-        # right
-        intr_point = self.line23.intersection_line(line)
-        if intr_point is not None:
-            if self.angle_r == pi/2:
-                if self.v3.y <= intr_point.y <= self.v2.y:
-                    result.append([intr_point, self.line23.intersection_angle(line), self.line23, self.abs_refr_indx])
-            elif self.angle_r > pi/2:
-                if self.v3.x <= intr_point.x <= self.v2.x:
-                    result.append([intr_point, self.line23.intersection_angle(line), self.line23, self.abs_refr_indx])
-            else:
-                if self.v2.x <= intr_point.x <= self.v3.x:
-                    result.append([intr_point, self.line23.intersection_angle(line), self.line23, self.abs_refr_indx])
-
-        # down
-        intr_point = self.line34.intersection_line(line)
-        if intr_point is not None:
-            if self.v4.x < intr_point.x < self.v3.x:
-                result.append([intr_point, self.line34.intersection_angle(line), self.line34, self.abs_refr_indx])
-
-        # left
-        intr_point = self.line41.intersection_line(line)
-        if intr_point is not None:
-            if self.angle_l == pi/2:
-                if self.v4.y <= intr_point.y <= self.v1.y:
-                    result.append([intr_point, self.line41.intersection_angle(line), self.line41, self.abs_refr_indx])
-            elif self.angle_l > pi/2:
-                if self.v1.x <= intr_point.x <= self.v4.x:
-                    result.append([intr_point, self.line41.intersection_angle(line), self.line41, self.abs_refr_indx])
-            else:
-                if self.v4.x <= intr_point.x <= self.v1.x:
-                    result.append([intr_point, self.line41.intersection_angle(line), self.line41, self.abs_refr_indx])
-
-        return result
-
-    def recalculate_lines(self):
-        self.line12 = Line.line_through_2p(self.v1, self.v2)
-        self.line23 = Line.line_through_2p(self.v2, self.v3)
-        self.line34 = Line.line_through_2p(self.v3, self.v4)
-        self.line41 = Line.line_through_2p(self.v4, self.v1)
-
     def drag(self, event):
         move = Vector2(self.plane.pix2x(event.x) - self.v1.x - self.move_offset.x,
                        self.plane.pix2y(event.y) - self.v1.y - self.move_offset.y)
@@ -674,13 +359,11 @@ class Polygon:
                            event.y - self.plane.y2pix(self.v1.y) - self.move_offset_pix.y)
         self.plane.canvas.move(self.name, move_pix.x, move_pix.y)
         self.plane.canvas.move(self.name_mask, move_pix.x, move_pix.y)
-        self.v1 += move
-        self.v2 += move
-        self.v3 += move
-        self.v4 += move
-        self.recalculate_lines()
+        old_box = self.bbox()
+        self.move(move)
+        self.plane.object_moved(self, old_box)
         self.draw_dbg()
-        self.plane.update()
+        self.plane.request_update()
 
     def click(self, event):
         self.move_offset = Vector2(self.plane.pix2x(event.x)-self.v1.x,
@@ -689,38 +372,15 @@ class Polygon:
                                        event.y-self.plane.y2pix(self.v1.y))
 
 
-class Lens:
-    def __init__(self, plane, v1, name, length, width, rad_l, rad_r, abs_refr_indx=1.65, dbg=False):
+class Lens(scene.Lens):
+    def __init__(self, plane, v1, name, length, width, rad_l, rad_r, abs_refr_indx=1.65, material=None, dbg=False):
+        super().__init__(v1, name, length, width, rad_l, rad_r, abs_refr_indx=abs_refr_indx, material=material)
         self.dbg = dbg
-        self.name = name
         self.plane = plane
         self.name_mask = f'{name}Mask'
         self.name_dbg = f'{name}Dbg'
-        self.abs_refr_indx = abs_refr_indx
-        self.length = length
-        self.width = width
-        self.convex_l = True if (rad_l >= 0) else False
-        self.convex_r = True if (rad_r >= 0) else False
-        self.v1 = v1
-        self.v2 = Vector2(v1.x + length, v1.y)
-        self.v3 = Vector2(self.v2.x, self.v2.y-width)
-        self.v4 = Vector2(v1.x, v1.y-width)
-        self.line12 = Line.line_through_2p(self.v1, self.v2)
-        self.line34 = Line.line_through_2p(self.v3, self.v4)
         self.move_offset = Vector2()
         self.move_offset_pix = Vector2()
-        self.rad_l = abs(rad_l)
-        self.rad_r = abs(rad_r)
-        self.alpha_l = asin(width/(2*self.rad_l))
-        self.alpha_r = asin(width/(2*self.rad_r))
-        if self.convex_l:
-            self.center_l = Vector2(self.v1.x + self.rad_l * cos(self.alpha_l), self.v1.y - width / 2)
-        else:
-            self.center_l = Vector2(self.v1.x - self.rad_l * cos(self.alpha_l), self.v1.y - width / 2)
-        if self.convex_r:
-            self.center_r = Vector2(self.v2.x - self.rad_r * cos(self.alpha_r), self.v2.y - width / 2)
-        else:
-            self.center_r = Vector2(self.v2.x + self.rad_r * cos(self.alpha_r), self.v2.y - width / 2)
 
     def draw_dbg(self):
         if self.dbg:
@@ -794,51 +454,6 @@ class Lens:
         plane.canvas.tag_bind(self.name_mask, '<Button-1>', self.click)
         plane.canvas.tag_bind(self.name_mask, '<B1-Motion>', self.drag)
 
-    def intersections(self, line):
-        result = []
-
-        # top
-        intr_point = self.line12.intersection_line(line)
-        if intr_point is not None:
-            if self.v1.x <= intr_point.x <= self.v2.x:
-                result.append([intr_point, self.line12.intersection_angle(line), self.line12, self.abs_refr_indx])
-
-        # right
-        intr_points = line.intersection_circle(self.center_r, self.rad_r)
-        for intr_point in intr_points:
-            if self.center_r.y-self.width/2 <= intr_point.y <= self.center_r.y+self.width/2:
-                tangent = Line.line_tangent_to_circle(intr_point, self.center_r, self.rad_r)
-                if self.convex_r:
-                    if intr_point.x >= self.center_r.x:
-                        result.append([intr_point, tangent.intersection_angle(line), tangent, self.abs_refr_indx])
-                else:
-                    if intr_point.x <= self.center_r.x:
-                        result.append([intr_point, tangent.intersection_angle(line), tangent, self.abs_refr_indx])
-
-        # bottom
-        intr_point = self.line34.intersection_line(line)
-        if intr_point is not None:
-            if self.v4.x <= intr_point.x <= self.v3.x:
-                result.append([intr_point, self.line34.intersection_angle(line), self.line34, self.abs_refr_indx])
-
-        # left
-        intr_points = line.intersection_circle(self.center_l, self.rad_l)
-        for intr_point in intr_points:
-            if self.center_l.y-self.width/2 <= intr_point.y <= self.center_l.y+self.width/2:
-                tangent = Line.line_tangent_to_circle(intr_point, self.center_l, self.rad_l)
-                if self.convex_l:
-                    if intr_point.x <= self.center_l.x:
-                        result.append([intr_point, tangent.intersection_angle(line), tangent, self.abs_refr_indx])
-                else:
-                    if intr_point.x >= self.center_l.x:
-                        result.append([intr_point, tangent.intersection_angle(line), tangent, self.abs_refr_indx])
-
-        return result
-
-    def recalculate_lines(self):
-        self.line12 = Line.line_through_2p(self.v1, self.v2)
-        self.line34 = Line.line_through_2p(self.v3, self.v4)
-
     def drag(self, event):
         move = Vector2(self.plane.pix2x(event.x) - self.v1.x - self.move_offset.x,
                        self.plane.pix2y(event.y) - self.v1.y - self.move_offset.y)
@@ -846,15 +461,11 @@ class Lens:
                            event.y - self.plane.y2pix(self.v1.y) - self.move_offset_pix.y)
         self.plane.canvas.move(self.name, move_pix.x, move_pix.y)
         self.plane.canvas.move(self.name_mask, move_pix.x, move_pix.y)
-        self.v1 += move
-        self.v2 += move
-        self.v3 += move
-        self.v4 += move
-        self.center_l += move
-        self.center_r += move
-        self.recalculate_lines()
+        old_box = self.bbox()
+        self.move(move)
+        self.plane.object_moved(self, old_box)
         self.draw_dbg()
-        self.plane.update()
+        self.plane.request_update()
 
     def click(self, event):
         self.move_offset = Vector2(self.plane.pix2x(event.x)-self.v1.x,
@@ -863,8 +474,141 @@ class Lens:
                                        event.y-self.plane.y2pix(self.v1.y))
 
 
+class ItemPool:
+    """
+    Canvas items of one kind reused between frames.
+    Items are moved with coords() instead of being deleted and created again,
+    the surplus is hidden and deleted only once the pool is much larger than needed.
+    """
+    def __init__(self, canvas, create):
+        self.canvas = canvas
+        self.create = create
+        self.items = []
+        self.visible = 0
+        self.used = 0
+
+    def begin(self):
+        self.used = 0
+
+    def get(self, *coords):
+        if self.used < len(self.items):
+            item = self.items[self.used]
+            self.canvas.coords(item, *coords)
+        else:
+            item = self.create(*coords)
+            self.items.append(item)
+        self.used += 1
+        return item
+
+    def end(self):
+        for item in self.items[self.visible:self.used]:
+            self.canvas.itemconfig(item, state=tkinter.NORMAL)
+        for item in self.items[self.used:self.visible]:
+            self.canvas.itemconfig(item, state=tkinter.HIDDEN)
+        self.visible = self.used
+        if len(self.items) > 2*self.used + 16:
+            self.canvas.delete(*self.items[self.used:])
+            del self.items[self.used:]
+
+    def clear(self):
+        if self.items:
+            self.canvas.delete(*self.items)
+        self.items = []
+        self.visible = self.used = 0
+
+
+class FrameScheduler:
+    """
+    Coalesces update requests: callback runs at most once per 1/fps seconds,
+    no matter how many requests came in between
+    """
+    def __init__(self, tk_root, callback, fps=60):
+        self.root = tk_root
+        self.callback = callback
+        self.frame_time = 1 / fps
+        self.pending = None
+        self.last_frame = 0.0
+        self.intervals = deque(maxlen=30)
+
+    def request(self):
+        if self.pending is not None:
+            return
+        delay = self.last_frame + self.frame_time - time.time()
+        if delay > 0:
+            self.pending = self.root.after(int(delay * 1000), self.run)
+        else:
+            self.pending = self.root.after_idle(self.run)
+
+    def run(self):
+        self.pending = None
+        now = time.time()
+        if now - self.last_frame < 1:   # idle gaps are not frames
+            self.intervals.append(now - self.last_frame)
+        self.last_frame = now
+        self.callback()
+
+    def fps(self):
+        if not self.intervals:
+            return None
+        return len(self.intervals) / sum(self.intervals)
+
+
+class DisplayPolicy:
+    """
+    Level of detail of the drawn rays. Until no update has been requested for settle_time seconds
+    a frame draws at most budget segments: every stride-th primary ray with all its branches,
+    each cut to an equal share of the budget. Settled frames draw everything.
+    Debug glyphs (surfaces, hit points, angles) are only drawn in full frames with at most glyph_limit hits
+    """
+    def __init__(self, budget=3000, glyph_limit=200, settle_time=0.3):
+        self.budget = budget
+        self.glyph_limit = glyph_limit
+        self.settle_time = settle_time
+        self.last_request = 0.0
+
+    def interact(self):
+        self.last_request = time.time()
+
+    def settled(self):
+        return time.time() - self.last_request >= self.settle_time
+
+    def plan(self, paths):
+        """
+        (stride, segments per primary ray or None, glyphs) for a frame of paths
+        """
+        n_segments = sum(len(path.segments) for path in paths)
+        if n_segments <= self.budget or self.settled():
+            hits = sum(segment.is_hit() for path in paths for segment in path.segments)
+            return 1, None, hits <= self.glyph_limit
+        n_rays = sum(segment.depth == 0 for path in paths for segment in path.segments)
+        stride = -(-n_segments // self.budget)
+        return stride, max(self.budget // max(-(-n_rays // stride), 1), 1), False
+
+
+def decimated(segments, stride=1, max_segments=None, first_ray=0):
+    """
+    Segments of every stride-th primary ray, at most max_segments of each.
+    first_ray is the index of the first primary ray of segments among the primary rays of all paths of the frame
+    """
+    ray = first_ray - 1
+    ray_segments = 0
+    for segment in segments:
+        if segment.depth == 0:
+            ray += 1
+            ray_segments = 0
+        if ray % stride or (max_segments is not None and ray_segments >= max_segments):
+            continue
+        ray_segments += 1
+        yield segment
+
+
 class Plane:
-    def __init__(self, tk_root, resolution=(1280, 720), dbg=False):
+    """
+    renderer='raster' draws rays as one density image (raster.Raster) instead of one line item per segment,
+    for ray counts the canvas cannot draw. display is the DisplayPolicy of the line renderer
+    """
+    def __init__(self, tk_root, resolution=(1280, 720), fps=60, stats=False, renderer='lines', dbg=False,
+                 display=None):
         self.root = tk_root
         self.dbg = dbg
         self.color_bg = 'white'
@@ -881,68 +625,124 @@ class Plane:
         self.move_offset_pix = Vector2()
         self.canvas = tkinter.Canvas(tk_root, width=self.res_x, height=self.res_y, bg=self.color_bg)
         self.canvas.pack()
-        self.max_recursion_depth = 25
-        self.abs_refr_indx = 1.0
         self.s = 4
-        self.tools_list = [
-            Ruler(self, Vector2(0, 0), Vector2(100, 0), 'Ruler', dbg=False),
-            RayCaster(self, Vector2(-500, 15*self.s), Vector2(-475, 15*self.s), 'RayCaster1', ray_color='red', dbg=True),
-            RayCaster(self, Vector2(-500, 7.5*self.s), Vector2(-475, 7.5*self.s), 'RayCaster2', ray_color='green', dbg=True),
-            RayCaster(self, Vector2(-500, -7.5*self.s), Vector2(-475, -7.5*self.s), 'RayCaster3', ray_color='blue', dbg=True),
-            RayCaster(self, Vector2(-500, -15*self.s), Vector2(-475, -15*self.s), 'RayCaster4', ray_color='purple', dbg=True)
-        ]
-
-        self.obj_list = [
-            Polygon(self, Vector2(200, 0), 'PolygonTest', length=80, width=150, angle_l=radians(60), angle_r=radians(60), dbg=True),
-            # Lens(self, Vector2(-200, 0), 'LensTest', length=20, width=140, rad_l=140, rad_r=140, dbg=True)
-            # Lens(self, Vector2(-10, 259), 'Lens1', length=10, width=518, rad_l=297.14, rad_r=-975.8, abs_refr_indx=1.475, dbg=True),
-            # Lens(self, Vector2(-15, 347.5), 'Lens2', length=15, width=695, rad_l=529.45, rad_r=2096.50, abs_refr_indx=1.475, dbg=True),
-            # Lens(self, Vector2(-20, 570), 'Lens3', length=20, width=1140, rad_l=848.41, rad_r=1000000000.0, abs_refr_indx=1.4575, dbg=True),
-            # Lens(self, Vector2(-140, 447.5), 'Lens4', length=140, width=895, rad_l=2921.96, rad_r=2921.96, abs_refr_indx=1.4575, dbg=True),
-            # Lens(self, Vector2(-140, 447.5), 'None', length=140, width=895, rad_l=2921.96, rad_r=2921.96, abs_refr_indx=1.4575, dbg=True),
-
-            Lens(self, Vector2(-1.0*self.s, 25.9*self.s), 'Lens1', length=1.0*self.s, width=51.8*self.s, rad_l=29.*self.s, rad_r=-97.58*self.s, abs_refr_indx=1.475, dbg=True),
-            Lens(self, Vector2(-1.0*self.s, 25.9*self.s), 'Lens1R', length=1.0*self.s, width=51.8*self.s, rad_l=-97.58*self.s, rad_r=29.714*self.s, abs_refr_indx=1.475, dbg=True),
-            Lens(self, Vector2(-1.5*self.s, 34.75*self.s), 'Lens2', length=1.5*self.s, width=69.5*self.s, rad_l=52.945*self.s, rad_r=209.650*self.s, abs_refr_indx=1.475, dbg=True),
-            Lens(self, Vector2(-1.5*self.s, 34.75*self.s), 'Lens2R', length=1.5*self.s, width=69.5*self.s, rad_l=209.650*self.s, rad_r=52.945*self.s, abs_refr_indx=1.475, dbg=True),
-            #Lens(self, Vector2(-2.0*self.s, 57.0*self.s), 'Lens3', length=2.0*self.s, width=114.0*self.s, rad_l=84.841*self.s, rad_r=1000000000.0, abs_refr_indx=1.4575, dbg=True),
-            #Lens(self, Vector2(-2.0*self.s, 57.0*self.s), 'Lens3R', length=2.0*self.s, width=114.0*self.s, rad_l=1000000000.0, rad_r=84.841*self.s, abs_refr_indx=1.4575, dbg=True),
-            Lens(self, Vector2(-14.0*self.s, 44.75*self.s), 'Lens4', length=14.0*self.s, width=89.5*self.s, rad_l=292.196*self.s, rad_r=292.196*self.s, abs_refr_indx=1.4575, dbg=True),
-            Lens(self, Vector2(-0.5 * self.s, 5.5 * self.s), 'Lens5', length=0.5 * self.s, width=11 * self.s, rad_l=11.25 * self.s, rad_r=11.25 * self.s, abs_refr_indx=1.4575, dbg=True),
-        ]
+        self.scene = scene.demo_scene(self.s, **self.constructors())
+        self.stats = Stats() if stats else None
+        self.tracer = Tracer(self.scene, incremental=True, stats=self.stats, dbg=dbg)
+        self.ray_pools = {}         # source -> ItemPools of ray segments and dbg glyphs
+        self.drawn_paths = {}       # source -> (RayPath, (plan, first_ray)) currently on the canvas
+        self.drawn_origin = None
+        self.display = display if display is not None else DisplayPolicy()
+        self.settle_pending = None
+        self.fps_item = None
+        self.axis_items = None
+        self.scheduler = FrameScheduler(tk_root, self.update, fps=fps)
+        self.moved_objects = {}     # object -> bbox before the first move since the last frame
+        self.raster = raster.Raster(self.res_x, self.res_y) if renderer == 'raster' else None
+        self.raster_item = None
+        self.raster_photo = None
 
         self.canvas.bind('<Button-3>', self.click)
         self.canvas.bind('<B3-Motion>', self.drag)
 
+    def constructors(self):
+        """
+        Scene classes bound to the plane, for scene.demo_scene and scenefile.load
+        """
+        return {
+            'polygon': partial(Polygon, self, dbg=True),
+            'lens': partial(Lens, self, dbg=True),
+            'ray_caster': partial(RayCaster, self, dbg=True),
+            'ruler': partial(Ruler, self, dbg=False),
+            'detector': partial(Detector, self, dbg=False),
+            'emitters': {name: partial(cls, self, dbg=True) for name, cls in EMITTERS.items()},
+        }
+
+    def load_scene(self, path):
+        self.canvas.delete('all')
+        self.ray_pools = {}
+        self.drawn_paths = {}
+        self.fps_item = None
+        self.axis_items = None
+        self.raster_item = None
+        self.moved_objects = {}
+        self.scene = scenefile.load(path, **self.constructors())
+        self.tracer = Tracer(self.scene, incremental=True, stats=self.stats, dbg=self.dbg)
+        self.draw()
+        self.request_update()
+
+    def save_scene(self, path):
+        scenefile.save(self.scene, path)
+
+    def request_update(self):
+        self.display.interact()
+        self.scheduler.request()
+
+    def settle(self):
+        """
+        Full frame once interaction stopped
+        """
+        self.settle_pending = None
+        delay = self.display.last_request + self.display.settle_time - time.time()
+        if delay > 0:
+            self.settle_pending = self.root.after(int(delay * 1000) + 1, self.settle)
+        else:
+            self.scheduler.request()
+
+    def object_moved(self, obj, old_box):
+        if obj not in self.moved_objects:
+            self.moved_objects[obj] = old_box
+
+    def source_moved(self, source):
+        self.tracer.source_moved(source)
+
     def update(self):
         t = time.time()
-        self.canvas.delete(self.name_ray, self.name_dbg)
-
 
+        for obj, old_box in self.moved_objects.items():
+            self.tracer.object_moved(obj, old_box)
+        self.moved_objects = {}
+        t_trace = time.time()
+        paths = self.tracer.trace()
+        t_trace = time.time() - t_trace
+        if self.raster is not None:
+            self.draw_raster(paths)
+        else:
+            self.draw_paths(paths)
+            if self.settle_pending is None and not self.display.settled():
+                self.settle_pending = self.root.after(int(self.display.settle_time * 1000), self.settle)
 
-        for tool in self.tools_list:
-            if isinstance(tool, RayCaster):
-                if tool.v2.x > tool.v1.x:
-                    pos_dir = True
-                elif tool.v2.x < tool.v1.x:
-                    pos_dir = False
-                else:
-                    if tool.v2.y >= tool.v1.y:
-                        pos_dir = True
-                    else:
-                        pos_dir = False
-                self.cast_ray(tool.v2, tool.line, pos_dir, self.abs_refr_indx, color=tool.ray_color)
+        for detector in self.scene.detectors():
+            detector.reset()
+            for path in paths:
+                detector.record_path(path)
+            detector.draw_dbg()
 
         self.canvas.tag_lower(self.name_dbg)
 
         t = time.time() - t
-        self.canvas.create_text(3, 3, text=f'{int(1 / t) if t >= 0.0005 else "inf"} FPS\n{int(t * 1000)} ms',
-                                font=self.font, anchor=tkinter.NW, tag=self.name_dbg)
+        fps = self.scheduler.fps()
+        if self.stats is not None:
+            self.stats.frames += 1
+            self.stats.timers['trace'] += t_trace
+            self.stats.timers['draw'] += t - t_trace
+            text = self.stats.overlay_text(fps)
+        else:
+            text = f'{int(fps) if fps is not None else "-"} FPS\n{int(t * 1000)} ms'
+        if self.fps_item is None:
+            self.fps_item = self.canvas.create_text(3, 3, text=text, font=self.font, anchor=tkinter.NW,
+                                                    tag=self.name_dbg)
+        else:
+            self.canvas.itemconfig(self.fps_item, text=text)
 
         line_x = Line(0, 1, 0)
         line_y = Line(1, 0, 0)
-        self.draw_line(line_x, 'grey', self.name_dbg)
-        self.draw_line(line_y, 'grey', self.name_dbg)
+        if self.axis_items is None:
+            self.axis_items = [self.draw_line(line_x, 'grey', self.name_dbg),
+                               self.draw_line(line_y, 'grey', self.name_dbg)]
+        else:
+            for item, line in zip(self.axis_items, (line_x, line_y)):
+                self.canvas.coords(item, *self.line_coords(line))
 
     def x2pix(self, x):
         return self.pix_x0 + x
@@ -957,7 +757,15 @@ class Plane:
         return self.pix_y0 - pix_y
 
     def add_obj(self, obj):
-        pass
+        """
+        Adds an element made with the plane's constructors and draws it
+        """
+        if isinstance(obj, (scene.Ruler, scene.RayCaster)):
+            self.scene.tools_list.append(obj)
+        else:
+            self.scene.obj_list.append(obj)
+        obj.draw()
+        self.request_update()
 
     def intersections(self, line):
         result = []
@@ -984,112 +792,106 @@ class Plane:
                 result.append(intr_point)
         return result
 
-    def cast_ray(self, origin, line, positive_dir, refr_indx, color='red', recursion_depth=0):
-        if recursion_depth > self.max_recursion_depth:
-            if self.dbg:
-                print('Recursion gone too deep')
-            return None
-        eps = 0.001
-        collision = None
-        min_dist = inf
-        for obj in self.obj_list:
-            for intr_info in obj.intersections(line):
-                if positive_dir:
-                    if line.is_vertical():
-                        if intr_info[0].y < origin.y + eps:
-                            continue
-                    else:
-                        if intr_info[0].x < origin.x + eps:
-                            continue
-                else:
-                    if line.is_vertical():
-                        if intr_info[0].y > origin.y - eps:
-                            continue
-                    else:
-                        if intr_info[0].x > origin.x - eps:
-                            continue
-                distance = origin.dist(intr_info[0])
-                if distance < min_dist:
-                    min_dist = distance
-                    collision = intr_info
-
-        if collision is not None:
-            if self.dbg:
-                self.draw_line(collision[2], color='grey', tag=self.name_dbg, dash=(4, 2))
-
-            n1 = refr_indx
-            if collision[3] == n1:
-                n2 = self.abs_refr_indx
-            else:
-                n2 = collision[3]
-            angle = collision[1]
-
-            if angle != 0:
-                alpha = angle/fabs(angle) * (pi/2 - fabs(angle))
-            else:
-                alpha = pi/2
-
-            beta_tmp = sin(alpha)*n1/n2
-            if -1 <= beta_tmp <= 1:
-                beta = asin(beta_tmp)
-                angle = alpha - beta
-                refr_line = line.rotate(collision[0], angle)
-                refr_pos_dir = refr_line.direction(origin, collision[0], collision[2], get_through=True)
-
-                self.cast_ray(collision[0], refr_line, refr_pos_dir, refr_indx=n2, color=color, recursion_depth=recursion_depth+1)
-            else:
-                refl_line = line.rotate(collision[0], -collision[1] * 2)
-                refl_pos_dir = refl_line.direction(origin, collision[0], collision[2], get_through=False)
-
-                self.cast_ray(collision[0], refl_line, refl_pos_dir, refr_indx=refr_indx, color=color,
-                              recursion_depth=recursion_depth + 1)
-
-            self.canvas.create_line(self.x2pix(origin.x), self.y2pix(origin.y),
-                                    self.x2pix(collision[0].x), self.y2pix(collision[0].y),
-                                    fill=color, tag=self.name_ray)
-            if self.dbg:
-                self.canvas.create_oval(self.x2pix(collision[0].x - 2), self.y2pix(collision[0].y + 2),
-                                        self.x2pix(collision[0].x + 2), self.y2pix(collision[0].y - 2),
-                                        fill=color, outline=color, tag=self.name_dbg)
-
-                self.canvas.create_text(self.x2pix(collision[0].x), self.y2pix(collision[0].y + 10),
-                                        text=f'{degrees(collision[1]).__round__(1)}',
-                                        fill=color, font=self.font, tag=self.name_dbg)
+    def draw_paths(self, paths):
+        """
+        Redraws the paths that changed since the last frame
+        """
+        origin = (self.pix_x0, self.pix_y0)
+        plan = self.display.plan(paths)
+        sources = set()
+        first_ray = 0
+        for path in paths:
+            sources.add(path.source)
+            drawn = self.drawn_paths.get(path.source)
+            key = (plan, first_ray if plan[0] > 1 else 0)
+            if drawn is None or drawn[0] is not path or drawn[1] != key or self.drawn_origin != origin:
+                self.draw_path(path, plan, key[1])
+                self.drawn_paths[path.source] = (path, key)
+            first_ray += sum(segment.depth == 0 for segment in path.segments)
+        for source in list(self.ray_pools):
+            if source not in sources:
+                for pool in self.ray_pools.pop(source):
+                    pool.clear()
+                self.drawn_paths.pop(source, None)
+        self.drawn_origin = origin
+
+    def color_rgb(self, color):
+        return tuple(c / 65535 for c in self.canvas.winfo_rgb(color))
+
+    def draw_raster(self, paths):
+        """
+        All paths as one transparent image item above the objects
+        """
+        self.raster.origin = (self.pix_x0, self.pix_y0)
+        self.raster.clear()
+        self.raster.add_paths(paths, self.color_rgb)
+        self.raster_photo = tkinter.PhotoImage(data=self.raster.png(level=1, background=None), format='png')
+        if self.raster_item is None:
+            self.raster_item = self.canvas.create_image(0, 0, image=self.raster_photo, anchor=tkinter.NW,
+                                                        tag=self.name_ray)
         else:
-            point = None
-            for intr_point in self.intersections(line):
-                if positive_dir:
-                    if line.is_vertical():
-                        if intr_point.y < origin.y:
-                            continue
-                    else:
-                        if intr_point.x < origin.x:
-                            continue
-                else:
-                    if line.is_vertical():
-                        if intr_point.y > origin.y:
-                            continue
-                    else:
-                        if intr_point.x > origin.x:
-                            continue
-                point = intr_point
-            if point is not None:
-                self.canvas.create_line(self.x2pix(origin.x), self.y2pix(origin.y),
-                                        self.x2pix(point.x), self.y2pix(point.y),
-                                        fill=color, tag=self.name_ray)
+            self.canvas.itemconfig(self.raster_item, image=self.raster_photo)
+            self.canvas.coords(self.raster_item, 0, 0)
+
+    def path_pools(self, source, color):
+        if source not in self.ray_pools:
+            canvas = self.canvas
+            self.ray_pools[source] = (
+                ItemPool(canvas, lambda *c: canvas.create_line(*c, fill=color, tag=self.name_ray)),
+                ItemPool(canvas, lambda *c: canvas.create_line(*c, fill='grey', dash=(4, 2), tag=self.name_dbg)),
+                ItemPool(canvas, lambda *c: canvas.create_oval(*c, fill=color, outline=color, tag=self.name_dbg)),
+                ItemPool(canvas, lambda *c: canvas.create_text(*c, fill=color, font=self.font, tag=self.name_dbg)),
+            )
+        return self.ray_pools[source]
+
+    def draw_path(self, path, plan=(1, None, True), first_ray=0):
+        """
+        plan is (stride, segments per primary ray, glyphs) of DisplayPolicy.plan,
+        first_ray the index of the first primary ray of path in the frame
+        """
+        stride, max_segments, glyphs = plan
+        pools = self.path_pools(path.source, path.color)
+        ray_pool, surface_pool, oval_pool, text_pool = pools
+        for pool in pools:
+            pool.begin()
+        for segment in decimated(path.segments, stride, max_segments, first_ray):
+            item = ray_pool.get(self.x2pix(segment.start.x), self.y2pix(segment.start.y),
+                                self.x2pix(segment.end.x), self.y2pix(segment.end.y))
+            if segment.wavelength is not None:
+                self.canvas.itemconfig(item, fill=wavelength_color(segment.wavelength))
+            if self.dbg and glyphs and segment.is_hit():
+                normal, point = segment.normal, segment.end
+                surface = Line(normal.x, normal.y, -normal.dot(point))
+                coords = self.line_coords(surface)
+                if coords:
+                    surface_pool.get(*coords)
+                oval_pool.get(self.x2pix(point.x - 2), self.y2pix(point.y + 2),
+                              self.x2pix(point.x + 2), self.y2pix(point.y - 2))
+
+                # angle between the ray and the surface
+                item = text_pool.get(self.x2pix(point.x), self.y2pix(point.y + 10))
+                self.canvas.itemconfig(item, text=f'{degrees(asin(min(segment.cos_i, 1.0))).__round__(1)}')
+        for pool in pools:
+            pool.end()
 
     def draw(self):
-        for i in self.obj_list:
+        for i in self.scene.obj_list:
             i.draw()
-        for i in self.tools_list:
+        for i in self.scene.tools_list:
             i.draw()
 
-    def draw_line(self, line, color='black', tag=None, dash=None):
+    def line_coords(self, line):
         intr = self.intersections(line)
         if len(intr) > 1:
-            self.canvas.create_line(self.x2pix(intr[0].x), self.y2pix(intr[0].y),
-                                    self.x2pix(intr[1].x), self.y2pix(intr[1].y),
-                                    fill=color, tag=tag, dash=dash)
+            return (self.x2pix(intr[0].x), self.y2pix(intr[0].y),
+                    self.x2pix(intr[1].x), self.y2pix(intr[1].y))
+        return ()
+
+    def draw_line(self, line, color='black', tag=None, dash=None):
+        coords = self.line_coords(line)
+        if coords:
+            return self.canvas.create_line(*coords, fill=color, tag=tag, dash=dash)
+        return None
 
     def drag(self, event):
         move = Vector2(self.pix2x(event.x) - self.pix2x(self.pix_x0) - self.move_offset.x,
@@ -1099,7 +901,7 @@ class Plane:
         self.canvas.move('all', move_pix.x, move_pix.y)
         self.pix_x0 += move_pix.x
         self.pix_y0 += move_pix.y
-        self.update()
+        self.request_update()
 
     def click(self, event):
         self.move_offset = Vector2(self.pix2x(event.x)-self.pix2x(self.pix_x0),
@@ -1111,6 +913,9 @@ class Plane:
 if __name__ == '__main__':
     root = tkinter.Tk()
     pl = Plane(root, (1280, 720))
-    pl.draw()
+    if len(sys.argv) > 1:
+        pl.load_scene(sys.argv[1])
+    else:
+        pl.draw()
     pl.update()
     root.mainloop()
@@ -0,0 +1,190 @@
+"""
+Optimization of scene parameters against a merit function of a batch trace, e.g. the RMS spot size at a detector.
+
+    optimizer = Optimizer(scene, [Parameter('Lens4', 'x', -100, 100), Parameter('Lens4', 'rad_l', 100, 2000)],
+                          detector='Detector')
+    values, merit = optimizer.run()
+    best = optimizer.best_scene()
+
+Parameters are the arguments of scene.modified: x and y of any element, constructor arguments of objects
+(rad_l, rad_r, abs_refr_indx, angle_l, ...) and attributes of tools. Elements are found by name.
+"""
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from math import inf
+import numpy as np
+from scene import GEOMETRY_ERRORS, Body, Detector, modified
+from batch import BatchTracer, crossings
+
+
+def rms_spot(result, detector):
+    """
+    Weighted RMS distance of the crossings from their centroid along the detector, inf if no ray reaches it
+    """
+    u, _, w = crossings(detector, result)
+    if not len(u) or w.sum() <= 0:
+        return inf
+    x = u * detector.length()
+    mean = np.average(x, weights=w)
+    return float(np.sqrt(np.average((x - mean)**2, weights=w)))
+
+
+class Parameter:
+    """
+    step is the initial step of the search, 10% of the initial value (or 1 for 0) by default
+    """
+    def __init__(self, element, name, lower=-inf, upper=inf, step=None):
+        self.element = element
+        self.name = name
+        self.lower = lower
+        self.upper = upper
+        self.step = step
+
+    def clip(self, value):
+        return min(max(value, self.lower), self.upper)
+
+    def value(self, scene):
+        element = scene.element(self.element)
+        if self.name in ('x', 'y'):
+            return getattr(element.v1, self.name)
+        if isinstance(element, Body):
+            return element.arguments()[self.name]
+        return getattr(element, self.name)
+
+
+def changes(parameters, values):
+    """
+    {element name: {parameter name: value}} for scene.Scene.modified
+    """
+    result = {}
+    for parameter, value in zip(parameters, values):
+        result.setdefault(parameter.element, {})[parameter.name] = value
+    return result
+
+
+class Evaluator:
+    """
+    Merit of candidate values. Keeps one BatchTracer over a private copy of the scene: objects whose parameters
+    changed are patched in with BatchTracer.update, the surface data of the rest is reused.
+    If only detectors changed, the last trace is reused as well.
+    Impossible geometry, e.g. a lens radius below half of its width or a polygon angle of 0, has an infinite merit
+    """
+    def __init__(self, scene, parameters, detector, merit=rms_spot, batch_options=None):
+        self.base = scene.snapshot()
+        self.parameters = parameters
+        self.detector = detector
+        self.merit = merit
+        self.tracer = BatchTracer(self.base.snapshot(), **(batch_options or {}))
+        self.index = {}     # element name -> (is object, position)
+        for i, obj in enumerate(self.base.obj_list):
+            self.index[obj.name] = (True, i)
+        for i, tool in enumerate(self.base.tools_list):
+            self.index[tool.name] = (False, i)
+        self.applied = {}   # element name -> changes the tracer's scene has
+        self.result = None
+
+    def __call__(self, values):
+        retrace = self.result is None
+        for name, element_changes in changes(self.parameters, values).items():
+            if self.applied.get(name) == element_changes:
+                continue
+            is_obj, i = self.index[name]
+            try:
+                element = modified((self.base.obj_list if is_obj else self.base.tools_list)[i], **element_changes)
+            except GEOMETRY_ERRORS:
+                # earlier elements may already have been patched, the last trace no longer matches the tracer
+                self.result = None
+                return inf
+            if is_obj:
+                self.tracer.update(i, element)
+            else:
+                self.tracer.scene.tools_list[i] = element
+            self.applied[name] = element_changes
+            retrace = retrace or not isinstance(element, Detector)
+
+        if retrace:
+            origins, directions, weights, wavelengths = self.tracer.source_rays()
+            self.result = self.tracer.trace(origins, directions, wavelengths=wavelengths, weights=weights)
+        return self.merit(self.result, self.tracer.scene.tools_list[self.index[self.detector][1]])
+
+
+# state of a worker process, set once per optimization by init_worker
+worker_evaluator = None
+
+
+def init_worker(evaluator_bytes):
+    global worker_evaluator
+    worker_evaluator = pickle.loads(evaluator_bytes)
+
+
+def evaluate(values):
+    return worker_evaluator(values)
+
+
+class Optimizer:
+    """
+    Compass search. Every iteration evaluates each parameter one step up and one step down, all candidates
+    at once on a process pool. It moves to the best candidate if that improves the merit, otherwise halves the steps.
+    Stops once every step is below tolerance times its initial step, or after max_evaluations.
+    With workers=0 candidates are evaluated in this process.
+    merit(result, detector) is minimized, it has to be picklable to run on the pool
+    """
+    def __init__(self, scene, parameters, detector, merit=rms_spot, workers=None, tolerance=1e-3,
+                 max_evaluations=1000, batch_options=None):
+        self.scene = scene
+        self.parameters = list(parameters)
+        self.detector = detector
+        self.merit = merit
+        self.workers = workers
+        self.tolerance = tolerance
+        self.max_evaluations = max_evaluations
+        self.batch_options = batch_options or {}
+        self.evaluations = 0
+        self.history = []       # (values, merit) of every accepted step
+        self.values = None
+        self.best = None
+
+    def initial_values(self):
+        return [parameter.clip(parameter.value(self.scene)) for parameter in self.parameters]
+
+    def run(self, values=None):
+        values = self.initial_values() if values is None else [p.clip(v) for p, v in zip(self.parameters, values)]
+        steps = [parameter.step if parameter.step is not None else (abs(value) * 0.1 or 1.0)
+                 for parameter, value in zip(self.parameters, values)]
+        min_steps = [step * self.tolerance for step in steps]
+        evaluator = Evaluator(self.scene, self.parameters, self.detector, self.merit, self.batch_options)
+
+        pool = None
+        if self.workers != 0:
+            pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(pickle.dumps(evaluator),))
+        try:
+            best = evaluator(values)
+            self.evaluations = 1
+            self.history = [(values, best)]
+            while self.evaluations < self.max_evaluations and any(s >= m for s, m in zip(steps, min_steps)):
+                candidates = []
+                for i, parameter in enumerate(self.parameters):
+                    for sign in (1, -1):
+                        candidate = list(values)
+                        candidate[i] = parameter.clip(values[i] + sign*steps[i])
+                        if candidate[i] != values[i]:
+                            candidates.append(candidate)
+                if not candidates:
+                    break
+                merits = list(pool.map(evaluate, candidates) if pool is not None else map(evaluator, candidates))
+                self.evaluations += len(candidates)
+                i = min(range(len(merits)), key=merits.__getitem__)
+                if merits[i] < best:
+                    values, best = candidates[i], merits[i]
+                    self.history.append((values, best))
+                else:
+                    steps = [step / 2 for step in steps]
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.values = values
+        self.best = best
+        return values, best
+
+    def best_scene(self):
+        return self.scene.modified(changes(self.parameters, self.values))
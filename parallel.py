@@ -0,0 +1,106 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from tracer import Tracer
+from batch import BatchTracer, BatchResult
+
+
+# state of a worker process, set once per scene version by init_worker
+worker_tracer = None
+worker_batch_tracer = None
+
+
+def init_worker(scene_bytes, tracer_options, batch_options):
+    global worker_tracer, worker_batch_tracer
+    scene = pickle.loads(scene_bytes)
+    worker_tracer = Tracer(scene, **tracer_options)
+    worker_batch_tracer = BatchTracer(scene, **batch_options)
+
+
+def trace_sources(source_ids):
+    sources = worker_tracer.scene.sources()
+    return [worker_tracer.trace_source(sources[i]) for i in source_ids]
+
+
+def trace_batch(origins, directions, refr_indx, wavelengths, weights):
+    return worker_batch_tracer.trace(origins, directions, refr_indx, wavelengths, weights)
+
+
+class ParallelTracer:
+    """
+    Traces on a process pool. Workers get a read-only snapshot of the scene once per scene version:
+    the pool is restarted whenever the snapshot differs from the one the workers have.
+    Work is split into fixed-size chunks merged back in order, so results do not depend on the number of workers.
+    """
+    def __init__(self, scene, workers=None, sources_per_task=4, rays_per_task=16384,
+                 tracer_options=None, batch_options=None):
+        self.scene = scene
+        self.workers = workers
+        self.sources_per_task = sources_per_task
+        self.rays_per_task = rays_per_task
+        self.tracer_options = tracer_options or {}
+        self.batch_options = batch_options or {}
+        self.executor = None
+        self.scene_bytes = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def pool(self):
+        scene_bytes = pickle.dumps(self.scene.snapshot())
+        if self.executor is None or scene_bytes != self.scene_bytes:
+            self.close()
+            self.scene_bytes = scene_bytes
+            self.executor = ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                                initargs=(scene_bytes, self.tracer_options, self.batch_options))
+        return self.executor
+
+    def trace(self):
+        """
+        Same as Tracer.trace, one RayPath per source
+        """
+        pool = self.pool()
+        sources = self.scene.sources()
+        chunks = [list(range(i, min(i + self.sources_per_task, len(sources))))
+                  for i in range(0, len(sources), self.sources_per_task)]
+        paths = []
+        for result in pool.map(trace_sources, chunks):
+            paths.extend(result)
+        for path, source in zip(paths, sources):
+            path.source = source    # workers return their copies of the sources
+        return paths
+
+    def trace_batch(self, origins, directions, refr_indx=None, wavelengths=None, weights=None):
+        """
+        Same as BatchTracer.trace
+        """
+        origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+        directions = np.asarray(directions, dtype=float).reshape(-1, 2)
+        if refr_indx is None:
+            refr_indx = np.full(len(origins), self.scene.abs_refr_indx)
+        refr_indx = np.broadcast_to(np.asarray(refr_indx, dtype=float), (len(origins),))
+        if wavelengths is None:
+            wavelengths = np.full(len(origins), np.nan)
+        wavelengths = np.broadcast_to(np.asarray(wavelengths, dtype=float), (len(origins),))
+        if weights is None:
+            weights = np.ones(len(origins))
+        weights = np.broadcast_to(np.asarray(weights, dtype=float), (len(origins),))
+        pool = self.pool()
+        bounds = range(0, len(origins), self.rays_per_task)
+        results = list(pool.map(trace_batch,
+                                [origins[i:i + self.rays_per_task] for i in bounds],
+                                [directions[i:i + self.rays_per_task] for i in bounds],
+                                [refr_indx[i:i + self.rays_per_task] for i in bounds],
+                                [wavelengths[i:i + self.rays_per_task] for i in bounds],
+                                [weights[i:i + self.rays_per_task] for i in bounds]))
+        if not results:
+            return BatchTracer(self.scene.snapshot(), **self.batch_options).trace(origins, directions)
+        return BatchResult.concatenate(results)
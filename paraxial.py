@@ -0,0 +1,193 @@
+"""
+Paraxial analysis of co-axial Lens stacks with ray transfer (ABCD) matrices.
+The axis is horizontal, rays go towards +x. Rays are (y, angle) column vectors, angles are not reduced.
+    translation by d:                       [[1, d], [0, 1]]
+    refraction n1 -> n2, radius R:          [[1, 0], [(n1 - n2) / (R*n2), n1/n2]]
+R > 0 if the center of curvature lies right of the vertex.
+Afocal systems (C = 0, also no lenses at all) have focal lengths, foci and principal planes at inf.
+"""
+from math import inf
+from geometry import Vector2, Ray
+from scene import Scene, Lens
+from tracer import Tracer, RayPath
+
+
+def multiply(m1, m2):
+    (a1, b1), (c1, d1) = m1
+    (a2, b2), (c2, d2) = m2
+    return (a1*a2 + b1*c2, a1*b2 + b1*d2), (c1*a2 + d1*c2, c1*b2 + d1*d2)
+
+
+def over(value, c):
+    """
+    value / c, inf for c = 0
+    """
+    return value / c if c else inf
+
+
+def translation(d):
+    return (1.0, d), (0.0, 1.0)
+
+
+def refraction(r, n1, n2):
+    return (1.0, 0.0), ((n1 - n2) / (r*n2), n1/n2)
+
+
+def lens_axis(lens):
+    return lens.v1.y - lens.width/2
+
+
+def lens_vertices(lens):
+    """
+    (x, R) of the left and the right surface on the axis.
+    Convex sides bulge out to center -+ rad, concave ones bend in to center +- rad
+    """
+    if lens.convex_l:
+        left = (lens.center_l.x - lens.rad_l, lens.rad_l)
+    else:
+        left = (lens.center_l.x + lens.rad_l, -lens.rad_l)
+    if lens.convex_r:
+        right = (lens.center_r.x + lens.rad_r, -lens.rad_r)
+    else:
+        right = (lens.center_r.x - lens.rad_r, lens.rad_r)
+    return left, right
+
+
+class ParaxialSystem:
+    """
+    Surfaces of the lenses ordered by their vertex on the axis. The index after each surface follows
+    the rule of Tracer.cast_ray: leaving a medium of the lens' index goes back to the scene medium,
+    so overlapping lenses are handled the way the tracer handles them.
+
+    matrix maps rays from the first to the last vertex plane. Positions are x in scene coordinates,
+    focal lengths are measured from the principal planes.
+    wavelength (nm) selects the indices of lenses with a material.
+    """
+    def __init__(self, lenses, medium=1.0, wavelength=None):
+        self.lenses = list(lenses)
+        self.medium = medium
+        self.wavelength = wavelength
+        self.axis = lens_axis(self.lenses[0]) if self.lenses else 0.0
+        surfaces = []
+        for lens in self.lenses:
+            left, right = lens_vertices(lens)
+            surfaces.append((left[0], left[1], lens))
+            surfaces.append((right[0], right[1], lens))
+        surfaces.sort(key=lambda surface: surface[0])
+        self.surfaces = surfaces
+
+        matrix = ((1.0, 0.0), (0.0, 1.0))
+        n = medium
+        x = surfaces[0][0] if surfaces else 0.0
+        for vertex, r, lens in surfaces:
+            obj_n = lens.refr_indx(wavelength)
+            n2 = medium if obj_n == n else obj_n
+            matrix = multiply(refraction(r, n, n2), multiply(translation(vertex - x), matrix))
+            n = n2
+            x = vertex
+        self.matrix = matrix
+        self.n_out = n
+        self.first = surfaces[0][0] if surfaces else 0.0
+        self.last = x
+
+    @staticmethod
+    def from_scene(scene, axis=None, tolerance=1e-9, wavelength=None):
+        """
+        Lenses of the scene on the axis (y), by default the axis of the first lens
+        """
+        lenses = [obj for obj in scene.obj_list if isinstance(obj, Lens)]
+        if axis is None and lenses:
+            axis = lens_axis(lenses[0])
+        lenses = [lens for lens in lenses if abs(lens_axis(lens) - axis) <= tolerance]
+        return ParaxialSystem(lenses, scene.abs_refr_indx, wavelength)
+
+    def determinant(self):
+        """
+        n_in / n_out
+        """
+        return self.medium / self.n_out
+
+    def power(self):
+        """
+        -C, 0 for an afocal system
+        """
+        return -self.matrix[1][0]
+
+    def focal_length(self):
+        """
+        Rear effective focal length -1/C
+        """
+        return over(-1, self.matrix[1][0])
+
+    def front_focal_length(self):
+        """
+        -det/C
+        """
+        return over(-self.determinant(), self.matrix[1][0])
+
+    def back_focal_distance(self):
+        """
+        From the last vertex to the rear focal point, -A/C
+        """
+        (a, _), (c, _) = self.matrix
+        return over(-a, c)
+
+    def front_focal_distance(self):
+        """
+        From the first vertex to the front focal point, D/C (negative if it lies in front of the system)
+        """
+        (_, _), (c, d) = self.matrix
+        return over(d, c)
+
+    def rear_focus(self):
+        return self.last + self.back_focal_distance()
+
+    def front_focus(self):
+        return self.first + self.front_focal_distance()
+
+    def rear_principal_plane(self):
+        """
+        Where an incoming ray parallel to the axis and its outgoing ray meet, last + (1 - A)/C
+        """
+        (a, _), (c, _) = self.matrix
+        return self.last + over(1 - a, c)
+
+    def front_principal_plane(self):
+        """
+        first + (D - det)/C
+        """
+        (_, _), (c, d) = self.matrix
+        return self.first + over(d - self.determinant(), c)
+
+    def summary(self):
+        return {
+            'focal_length': self.focal_length(),
+            'front_focal_length': self.front_focal_length(),
+            'back_focal_distance': self.back_focal_distance(),
+            'front_focal_distance': self.front_focal_distance(),
+            'rear_focus': self.rear_focus(),
+            'front_focus': self.front_focus(),
+            'rear_principal_plane': self.rear_principal_plane(),
+            'front_principal_plane': self.front_principal_plane(),
+        }
+
+    def traced_focus(self, height, max_recursion_depth=25):
+        """
+        Exact x where a ray parallel to the axis at height crosses the axis after the system,
+        traced with Tracer. None if it leaves parallel to the axis
+        """
+        scene = Scene(self.lenses, abs_refr_indx=self.medium, max_recursion_depth=max_recursion_depth)
+        tracer = Tracer(scene, split=False)
+        path = RayPath(None)
+        start = min(lens.bbox()[0] for lens in self.lenses) - 1
+        tracer.cast_ray(path, Ray(Vector2(start, self.axis + height), Vector2(1.0, 0.0)), self.medium,
+                        wavelength=self.wavelength)
+        last = path.segments[-1]
+        dx, dy = last.end.x - last.start.x, last.end.y - last.start.y
+        if dy == 0:
+            return None
+        return last.start.x + (self.axis - last.start.y) * dx / dy
+
+    def traced_back_focal_distance(self, height):
+        focus = self.traced_focus(height)
+        return None if focus is None else focus - self.last
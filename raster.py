@@ -0,0 +1,182 @@
+"""
+Offscreen density renderer for large numbers of rays. Segments are clipped to the image, sampled about once
+per pixel and their weights are added into float accumulation buffers, one for the density and three
+for the colour. image() tone maps them: alpha = 1 - exp(-exposure * density / reference) blends the mean colour
+of every pixel over the background. The result goes to the GUI as one transparent PNG image (background=None)
+and into PNG or PPM files.
+"""
+import struct
+import zlib
+import numpy as np
+from spectral import wavelength_rgb
+
+COLORS = {
+    'red': (1.0, 0.0, 0.0), 'green': (0.0, 0.5, 0.0), 'blue': (0.0, 0.0, 1.0), 'purple': (0.5, 0.0, 0.5),
+    'black': (0.0, 0.0, 0.0), 'grey': (0.5, 0.5, 0.5), 'orange': (1.0, 0.65, 0.0),
+}
+
+
+def named_rgb(color):
+    return COLORS.get(color, COLORS['black'])
+
+
+def clip(p0, p1, width, height):
+    """
+    Liang-Barsky clipping of segments p0-p1 to 0 <= x <= width, 0 <= y <= height
+    return clipped p0, p1 and the mask of segments that are at least partly inside
+    """
+    d = p1 - p0
+    t0 = np.zeros(len(p0))
+    t1 = np.ones(len(p0))
+    inside = np.ones(len(p0), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in ((-d[:, 0], p0[:, 0]), (d[:, 0], width - p0[:, 0]),
+                     (-d[:, 1], p0[:, 1]), (d[:, 1], height - p0[:, 1])):
+            r = q / p
+            parallel = p == 0
+            inside &= ~(parallel & (q < 0))
+            t0 = np.where(~parallel & (p < 0), np.maximum(t0, r), t0)
+            t1 = np.where(~parallel & (p > 0), np.minimum(t1, r), t1)
+    inside &= t0 <= t1
+    return p0 + t0[:, None]*d, p0 + t1[:, None]*d, inside
+
+
+class Raster:
+    """
+    World (x, y) goes to pixel (origin[0] + x*scale, origin[1] - y*scale) like Plane.x2pix and Plane.y2pix.
+    max_samples bounds the number of pixel samples held at once
+    """
+    def __init__(self, width, height, origin=None, scale=1.0, max_samples=1 << 22):
+        self.width = width
+        self.height = height
+        self.origin = origin if origin is not None else (width / 2, height / 2)
+        self.scale = scale
+        self.max_samples = max_samples
+        self.density = np.zeros(width * height)
+        self.rgb = np.zeros((3, width * height))
+
+    def clear(self):
+        self.density[:] = 0
+        self.rgb[:] = 0
+
+    def to_pixels(self, points):
+        return np.stack([self.origin[0] + points[:, 0]*self.scale, self.origin[1] - points[:, 1]*self.scale], axis=1)
+
+    def add_segments(self, starts, ends, weights=None, colors=None):
+        """
+        starts, ends (N, 2) in world coordinates, weights (N,), colors (N, 3) or (3,) in 0..1.
+        Every pixel crossed by a segment gets its weight
+        """
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+        weights = np.broadcast_to(np.ones(1) if weights is None else np.asarray(weights, dtype=float), (len(starts),))
+        colors = np.broadcast_to(np.zeros(3) if colors is None else np.asarray(colors, dtype=float), (len(starts), 3))
+
+        p0, p1, inside = clip(self.to_pixels(starts), self.to_pixels(ends), self.width, self.height)
+        p0, p1, weights, colors = p0[inside], p1[inside], weights[inside], colors[inside]
+        n = np.ceil(np.abs(p1 - p0).max(axis=1)).astype(np.int64) + 1      # samples per segment
+        first = 0
+        while first < len(n):
+            # as many segments as fit into max_samples, at least one
+            last = first + max(int(np.searchsorted(np.cumsum(n[first:]), self.max_samples)), 1)
+            self.sample(p0[first:last], p1[first:last], n[first:last], weights[first:last], colors[first:last])
+            first = last
+
+    def sample(self, p0, p1, n, weights, colors):
+        """
+        Sample k of a segment lies at p0 + (k + 0.5)*(p1 - p0)/n.
+        Uniform weights and colours are applied once per pixel instead of once per sample
+        """
+        segment = np.repeat(np.arange(len(n)), n)
+        k = np.arange(len(segment), dtype=float) - np.repeat(np.cumsum(n) - n, n) + 0.5
+        x = np.take(p0[:, 0], segment) + k*np.take((p1[:, 0] - p0[:, 0]) / n, segment)
+        y = np.take(p0[:, 1], segment) + k*np.take((p1[:, 1] - p0[:, 1]) / n, segment)
+        pixel = np.minimum(y.astype(np.int64), self.height - 1)*self.width + np.minimum(x.astype(np.int64),
+                                                                                        self.width - 1)
+        size = self.width * self.height
+        if (weights == weights[0]).all():
+            density = np.bincount(pixel, minlength=size) * weights[0]
+        else:
+            density = np.bincount(pixel, np.take(weights, segment), size)
+        self.density += density
+        if (colors == colors[0]).all():
+            self.rgb += colors[0][:, None] * density
+        else:
+            w = np.take(weights, segment)
+            for channel in range(3):
+                self.rgb[channel] += np.bincount(pixel, w*np.take(colors[:, channel], segment), size)
+
+    def add_result(self, result, color=(0.0, 0.0, 0.0)):
+        """
+        Segments of a batch.BatchResult weighted by result.weight, spectral rays in their colour
+        """
+        starts, ends, ray_index = result.segment_arrays()
+        colors = np.tile(np.asarray(color, dtype=float), (len(result), 1))
+        spectral = ~np.isnan(result.wavelength)
+        if spectral.any():
+            distinct, index = np.unique(result.wavelength[spectral], return_inverse=True)
+            colors[spectral] = np.array([wavelength_rgb(w) for w in distinct])[index.reshape(-1)]
+        self.add_segments(starts, ends, result.weight[ray_index], colors[ray_index])
+
+    def add_paths(self, paths, color_rgb=named_rgb):
+        """
+        Segments of tracer.RayPaths weighted by the energy they carry, color_rgb maps path colours to (r, g, b)
+        """
+        starts, ends, weights, colors = [], [], [], []
+        for path in paths:
+            rgb = color_rgb(path.color)
+            for segment in path.segments:
+                starts.append((segment.start.x, segment.start.y))
+                ends.append((segment.end.x, segment.end.y))
+                weights.append(segment.weight)
+                colors.append(rgb if segment.wavelength is None else wavelength_rgb(segment.wavelength))
+        if starts:
+            self.add_segments(starts, ends, weights, colors)
+
+    def image(self, exposure=1.0, reference=None, background=(1.0, 1.0, 1.0)):
+        """
+        (height, width, 3) uint8. reference is the density that gets alpha 1 - exp(-exposure),
+        the 99th percentile of the covered pixels by default.
+        With background=None the result is (height, width, 4), the mean colour with alpha
+        """
+        covered = self.density > 0
+        if reference is None:
+            reference = np.percentile(self.density[covered], 99) if covered.any() else 1.0
+        alpha = 1 - np.exp(-exposure * self.density / reference)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(covered, self.rgb / self.density, 0)
+        if background is None:
+            out = np.concatenate([mean, alpha[None, :]])
+        else:
+            out = np.asarray(background, dtype=float)[:, None]*(1 - alpha) + mean*alpha
+        return np.round(np.clip(out, 0, 1) * 255).astype(np.uint8).T.reshape(self.height, self.width, len(out))
+
+    def ppm(self, **options):
+        """
+        Binary PPM of image(), tkinter.PhotoImage(data=...) reads it
+        """
+        return b'P6 %d %d 255\n' % (self.width, self.height) + self.image(**options).tobytes()
+
+    def png(self, level=6, **options):
+        """
+        8 bit RGB (RGBA with background=None) PNG of image(), every row with filter type 0.
+        level is the zlib compression level
+        """
+        image = self.image(**options)
+        color_type = 6 if image.shape[2] == 4 else 2
+        rows = np.concatenate([np.zeros((self.height, 1), dtype=np.uint8), image.reshape(self.height, -1)], axis=1)
+
+        def chunk(kind, data):
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+        return (b'\x89PNG\r\n\x1a\n' +
+                chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, color_type, 0, 0, 0)) +
+                chunk(b'IDAT', zlib.compress(rows.tobytes(), level)) +
+                chunk(b'IEND', b''))
+
+    def save(self, path, **options):
+        """
+        PNG, or PPM if the path ends with .ppm
+        """
+        with open(path, 'wb') as f:
+            f.write(self.ppm(**options) if path.endswith('.ppm') else self.png(**options))
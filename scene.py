@@ -0,0 +1,525 @@
+from array import array
+from collections import namedtuple
+from math import pi, tan, asin, cos, radians, inf, atan2, copysign
+from geometry import Vector2, Line, Ray
+from spectral import D_LINE
+
+
+def segment_normal(p1, p2):
+    return Vector2(p1.y - p2.y, p2.x - p1.x).normalized()
+
+
+class Ruler:
+    def __init__(self, v1, v2, name):
+        self.name = name
+        self.v1 = v1
+        self.v2 = v2
+        self.line = Line.line_through_2p(v1, v2)
+
+    def recalculate_line(self):
+        self.line = Line.line_through_2p(self.v1, self.v2)
+
+    def length(self):
+        return self.v1.dist(self.v2)
+
+    def snapshot(self):
+        return Ruler(Vector2(self.v1.x, self.v1.y), Vector2(self.v2.x, self.v2.y), self.name)
+
+
+class Detector(Ruler):
+    """
+    Transparent segment v1-v2 binning the rays that cross it into fixed-size histograms, raw hits are not kept.
+    position: weight per bin along v1 -> v2
+    angle:    weight per bin of the angle of incidence, -pi/2..pi/2 from the normal facing the ray,
+              positive if the ray is turned counterclockwise from it
+    hits, power: number and total weight of the crossings
+    """
+    def __init__(self, v1, v2, name, bins=64, angle_bins=36):
+        super().__init__(v1, v2, name)
+        self.bins = bins
+        self.angle_bins = angle_bins
+        self.position = array('d')
+        self.angle = array('d')
+        self.hits = 0
+        self.power = 0.0
+        self.reset()
+
+    def reset(self):
+        """
+        Histograms are replaced, not cleared, so references to the old ones keep their data
+        """
+        self.position = array('d', [0.0]) * self.bins
+        self.angle = array('d', [0.0]) * self.angle_bins
+        self.hits = 0
+        self.power = 0.0
+
+    def position_bin(self, u):
+        return min(int(u*self.bins), self.bins - 1)
+
+    def angle_bin(self, angle):
+        return min(max(int((angle + pi/2) / pi * self.angle_bins), 0), self.angle_bins - 1)
+
+    def record(self, start, end, weight=1.0):
+        """
+        Adds the segment start-end if it crosses the detector, returns True if it does
+        start + t*s = v1 + u*e, s = end - start, e = v2 - v1
+        t = (w x e) / (s x e), u = (w x s) / (s x e), w = v1 - start
+        0 < t <= 1 so a crossing shared by two segments of a path is counted once
+        angle = atan2(sign(s x e) * (s*e), |s x e|)
+        """
+        ex, ey = self.v2.x - self.v1.x, self.v2.y - self.v1.y
+        sx, sy = end.x - start.x, end.y - start.y
+        denom = sx*ey - sy*ex
+        if denom == 0:      # parallel
+            return False
+        wx, wy = self.v1.x - start.x, self.v1.y - start.y
+        t = (wx*ey - wy*ex) / denom
+        u = (wx*sy - wy*sx) / denom
+        if not (0 < t <= 1 and 0 <= u <= 1):
+            return False
+        self.position[self.position_bin(u)] += weight
+        self.angle[self.angle_bin(atan2(copysign(sx*ex + sy*ey, denom), abs(denom)))] += weight
+        self.hits += 1
+        self.power += weight
+        return True
+
+    def record_path(self, path):
+        """
+        Adds every segment of a tracer.RayPath, weighted by the energy it carries
+        """
+        for segment in path.segments:
+            self.record(segment.start, segment.end, segment.weight)
+
+    def bin_width(self):
+        return self.length() / self.bins
+
+    def irradiance(self):
+        """
+        Power per unit length of every position bin
+        """
+        width = self.bin_width()
+        return [power / width for power in self.position]
+
+    def snapshot(self):
+        """
+        Geometry only, the histograms start empty
+        """
+        return Detector(Vector2(self.v1.x, self.v1.y), Vector2(self.v2.x, self.v2.y), self.name,
+                        bins=self.bins, angle_bins=self.angle_bins)
+
+
+class RayCaster:
+    """
+    Casts one ray of ray_color, or one ray per wavelength (nm) if wavelengths are given
+    """
+    def __init__(self, v1, v2, name, ray_color='red', wavelengths=None):
+        self.name = name
+        self.ray_color = ray_color
+        self.wavelengths = list(wavelengths) if wavelengths is not None else None
+        self.v1 = v1
+        self.v2 = v2
+        self.line = Line.line_through_2p(v1, v2)
+
+    def recalculate_line(self):
+        self.line = Line.line_through_2p(self.v1, self.v2)
+
+    def positive_dir(self):
+        """
+        Positive direction is a direction of increasing X. Or Y if line is vertical
+        """
+        if self.v2.x > self.v1.x:
+            return True
+        elif self.v2.x < self.v1.x:
+            return False
+        else:
+            return self.v2.y >= self.v1.y
+
+    def ray(self):
+        return Ray(self.v2, (self.v2 - self.v1).normalized())
+
+    def rays(self):
+        """
+        (ray, weight) pairs emitted by the source, see sources.py for sources of many rays
+        """
+        return [(self.ray(), 1.0)]
+
+    def snapshot(self):
+        return RayCaster(Vector2(self.v1.x, self.v1.y), Vector2(self.v2.x, self.v2.y), self.name,
+                         ray_color=self.ray_color, wavelengths=self.wavelengths)
+
+
+class SegmentSurface(namedtuple('SegmentSurface', 'surface_id p0 p1 edge normal tangent line')):
+    """
+    p0 + u*edge, 0 <= u <= 1
+    normal is the outward unit normal, tangent = edge/|edge|, line is the line through p0 and p1
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def build(surface_id, p0, p1):
+        edge = p1 - p0
+        return SegmentSurface(surface_id, p0, p1, edge, segment_normal(p0, p1), edge.normalized(),
+                              Line.line_through_2p(p0, p1))
+
+    def ray_intersections(self, ray):
+        t = ray.intersection_segment(self.p0, self.p1)
+        if t is None:
+            return []
+        return [(t, ray.point(t), self.normal)]
+
+    def line_intersections(self, line):
+        """
+        f(p) = a*x + b*y + c
+        u = f(p0) / (f(p0) - f(p1))
+        """
+        f0 = line.a*self.p0.x + line.b*self.p0.y + line.c
+        f1 = line.a*self.p1.x + line.b*self.p1.y + line.c
+        if f0 == f1:        # parallel
+            return []
+        u = f0 / (f0 - f1)
+        if 0 <= u <= 1:
+            return [self.p0 + self.edge*u]
+        return []
+
+    def tangent_line(self, point):
+        return self.line
+
+
+class ArcSurface(namedtuple('ArcSurface', 'surface_id center r y_min y_max side outward chord')):
+    """
+    |p - center| = r, y_min <= p.y <= y_max, side*(p.x - center.x) >= 0
+    outward is 1 if (p - center) points out of the object, -1 if it points inside
+    chord (x, y, r) is the circle having the chord of the arc as a diameter, the arc lies inside it
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def build(surface_id, center, r, half_width, side, outward):
+        """
+        Chord ends: center.y +- half_width, center.x + side*sqrt(r^2 - half_width^2)
+        The chord circle is padded against rounding of the hit points
+        """
+        chord_x = center.x + side*max(r*r - half_width*half_width, 0)**0.5
+        chord = (chord_x, center.y, half_width + 1e-6*(1 + r))
+        return ArcSurface(surface_id, center, r, center.y - half_width, center.y + half_width, side, outward, chord)
+
+    def misses(self, ray, t_min=0.0, t_max=inf):
+        """
+        True if the ray passes the chord circle or reaches it outside of t_min < t < t_max
+        """
+        mx, my, mr = self.chord
+        qx, qy = ray.origin.x - mx, ray.origin.y - my
+        b = ray.direction.x*qx + ray.direction.y*qy
+        return qx*qx + qy*qy - b*b > mr*mr or -b - mr >= t_max or -b + mr <= t_min
+
+    def contains(self, point):
+        return self.y_min <= point.y <= self.y_max and self.side*(point.x - self.center.x) >= 0
+
+    def normal(self, point):
+        return Vector2(self.outward*(point.x - self.center.x)/self.r, self.outward*(point.y - self.center.y)/self.r)
+
+    def ray_intersections(self, ray):
+        if self.misses(ray, -inf, inf):
+            return []
+        result = []
+        for t in ray.intersection_circle(self.center, self.r):
+            point = ray.point(t)
+            if self.contains(point):
+                result.append((t, point, self.normal(point)))
+        return result
+
+    def line_intersections(self, line):
+        return [point for point in line.intersection_circle(self.center, self.r) if self.contains(point)]
+
+    def tangent_line(self, point):
+        return Line.line_tangent_to_circle(point, self.center, self.r)
+
+
+class Body:
+    """
+    Object made of surface records. Subclasses rebuild self.surfaces in recalculate_surfaces()
+    whenever their geometry changes, arguments() returns their constructor arguments.
+    With a material (spectral.Cauchy, spectral.Sellmeier) the index depends on the wavelength
+    and abs_refr_indx is its value at spectral.D_LINE
+    """
+    def set_material(self, material, abs_refr_indx):
+        self.material = material
+        self.abs_refr_indx = material.index(D_LINE) if material is not None else abs_refr_indx
+
+    def refr_indx(self, wavelength=None):
+        if wavelength is None or self.material is None:
+            return self.abs_refr_indx
+        return self.material.index(wavelength)
+
+    def intersections(self, line):
+        """
+        [point, angle, line, n, surface_id] for every surface crossed by the line
+        """
+        result = []
+        for surface in self.surfaces:
+            for point in surface.line_intersections(line):
+                tangent = surface.tangent_line(point)
+                result.append([point, tangent.intersection_angle(line), tangent, self.abs_refr_indx,
+                               surface.surface_id])
+        return result
+
+    def ray_intersections(self, ray):
+        """
+        [t, point, normal, surface_id] for every surface hit by the ray
+        """
+        result = []
+        for surface in self.surfaces:
+            for t, point, normal in surface.ray_intersections(ray):
+                result.append([t, point, normal, surface.surface_id])
+        return result
+
+
+class Polygon(Body):
+    """
+    Surface ids: 0 - top, 1 - right, 2 - bottom, 3 - left
+    """
+    def __init__(self, v1, name, length, width, angle_l=pi/2, angle_r=pi/2, abs_refr_indx=1.65, material=None):
+        self.name = name
+        self.set_material(material, abs_refr_indx)
+        self.angle_l = angle_l
+        self.angle_r = angle_r
+        self.length = length
+        self.width = width
+        if self.angle_r + self.angle_l == pi:
+            self.length_t = self.length_b = length
+        elif self.angle_l + self.angle_r < pi:  # top is shorter
+            self.length_t = length
+            self.length_b = length + self.width/tan(angle_l) + self.width/tan(angle_r)
+        else:                                   # bottom is shorter
+            self.length_t = length + self.width*tan(angle_l-pi/2) + self.width*tan(angle_r-pi/2)
+            self.length_b = length
+
+        self.v1 = v1
+        self.v2 = Vector2(self.v1.x+self.length_t, self.v1.y)
+        if self.angle_r == pi/2:
+            self.v3 = Vector2(self.v2.x, self.v2.y-self.width)
+        else:
+            self.v3 = Vector2(self.width/tan(self.angle_r)+self.v2.x, -self.width+self.v2.y)
+        self.v4 = Vector2(self.v3.x-self.length_b, self.v3.y)
+
+        self.surfaces = ()
+        self.recalculate_surfaces()
+
+    def recalculate_surfaces(self):
+        vertices = (self.v1, self.v2, self.v3, self.v4)
+        self.surfaces = tuple(SegmentSurface.build(surface_id, vertices[surface_id], vertices[(surface_id+1) % 4])
+                              for surface_id in range(4))
+
+    def bbox(self):
+        xs = (self.v1.x, self.v2.x, self.v3.x, self.v4.x)
+        ys = (self.v1.y, self.v2.y, self.v3.y, self.v4.y)
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def move(self, offset):
+        self.v1 += offset
+        self.v2 += offset
+        self.v3 += offset
+        self.v4 += offset
+        self.recalculate_surfaces()
+
+    def arguments(self):
+        return {'v1': Vector2(self.v1.x, self.v1.y), 'name': self.name, 'length': self.length, 'width': self.width,
+                'angle_l': self.angle_l, 'angle_r': self.angle_r, 'abs_refr_indx': self.abs_refr_indx,
+                'material': self.material}
+
+    def snapshot(self):
+        return Polygon(**self.arguments())
+
+
+class Lens(Body):
+    """
+    Surface ids: 0 - top, 1 - right, 2 - bottom, 3 - left
+    """
+    def __init__(self, v1, name, length, width, rad_l, rad_r, abs_refr_indx=1.65, material=None):
+        self.name = name
+        self.set_material(material, abs_refr_indx)
+        self.length = length
+        self.width = width
+        self.convex_l = True if (rad_l >= 0) else False
+        self.convex_r = True if (rad_r >= 0) else False
+        self.v1 = v1
+        self.v2 = Vector2(v1.x + length, v1.y)
+        self.v3 = Vector2(self.v2.x, self.v2.y-width)
+        self.v4 = Vector2(v1.x, v1.y-width)
+        self.rad_l = abs(rad_l)
+        self.rad_r = abs(rad_r)
+        self.alpha_l = asin(width/(2*self.rad_l))
+        self.alpha_r = asin(width/(2*self.rad_r))
+        if self.convex_l:
+            self.center_l = Vector2(self.v1.x + self.rad_l * cos(self.alpha_l), self.v1.y - width / 2)
+        else:
+            self.center_l = Vector2(self.v1.x - self.rad_l * cos(self.alpha_l), self.v1.y - width / 2)
+        if self.convex_r:
+            self.center_r = Vector2(self.v2.x - self.rad_r * cos(self.alpha_r), self.v2.y - width / 2)
+        else:
+            self.center_r = Vector2(self.v2.x + self.rad_r * cos(self.alpha_r), self.v2.y - width / 2)
+
+        self.surfaces = ()
+        self.recalculate_surfaces()
+
+    def recalculate_surfaces(self):
+        """
+        Arcs keep the half of the circle facing outwards for convex sides and inwards for concave ones
+        """
+        half = self.width/2
+        self.surfaces = (
+            SegmentSurface.build(0, self.v1, self.v2),
+            SegmentSurface.build(2, self.v3, self.v4),
+            ArcSurface.build(1, self.center_r, self.rad_r, half,
+                             side=1 if self.convex_r else -1, outward=1 if self.convex_r else -1),
+            ArcSurface.build(3, self.center_l, self.rad_l, half,
+                             side=-1 if self.convex_l else 1, outward=1 if self.convex_l else -1),
+        )
+
+    def bbox(self):
+        """
+        Concave sides bend inwards, convex ones stick out by (rad - rad*cos(alpha))
+        """
+        x_min = self.center_l.x - self.rad_l if self.convex_l else self.v1.x
+        x_max = self.center_r.x + self.rad_r if self.convex_r else self.v2.x
+        return x_min, self.v4.y, x_max, self.v1.y
+
+    def move(self, offset):
+        self.v1 += offset
+        self.v2 += offset
+        self.v3 += offset
+        self.v4 += offset
+        self.center_l += offset
+        self.center_r += offset
+        self.recalculate_surfaces()
+
+    def arguments(self):
+        """
+        Radii are signed like in the constructor, negative for concave sides
+        """
+        return {'v1': Vector2(self.v1.x, self.v1.y), 'name': self.name, 'length': self.length, 'width': self.width,
+                'rad_l': self.rad_l if self.convex_l else -self.rad_l,
+                'rad_r': self.rad_r if self.convex_r else -self.rad_r,
+                'abs_refr_indx': self.abs_refr_indx, 'material': self.material}
+
+    def snapshot(self):
+        return Lens(**self.arguments())
+
+
+class Scene:
+    def __init__(self, obj_list=None, tools_list=None, abs_refr_indx=1.0, max_recursion_depth=25):
+        self.obj_list = obj_list if obj_list is not None else []
+        self.tools_list = tools_list if tools_list is not None else []
+        self.abs_refr_indx = abs_refr_indx
+        self.max_recursion_depth = max_recursion_depth
+
+    def sources(self):
+        return [tool for tool in self.tools_list if isinstance(tool, RayCaster)]
+
+    def detectors(self):
+        return [tool for tool in self.tools_list if isinstance(tool, Detector)]
+
+    def element(self, name):
+        for element in self.obj_list + self.tools_list:
+            if element.name == name:
+                return element
+        raise KeyError(name)
+
+    def modified(self, changes):
+        """
+        Snapshot with changed elements, changes maps element names to keyword arguments of modified()
+        """
+        copy = self.snapshot()
+        copy.obj_list = [modified(obj, **changes[obj.name]) if obj.name in changes else obj
+                         for obj in copy.obj_list]
+        copy.tools_list = [modified(tool, **changes[tool.name]) if tool.name in changes else tool
+                           for tool in copy.tools_list]
+        return copy
+
+    def snapshot(self):
+        """
+        Copy of the scene made of plain scene classes only, safe to pickle and independent of the GUI
+        """
+        return Scene([obj.snapshot() for obj in self.obj_list], [tool.snapshot() for tool in self.tools_list],
+                     abs_refr_indx=self.abs_refr_indx, max_recursion_depth=self.max_recursion_depth)
+
+
+# raised by modified() and the object constructors for parameters without a valid geometry
+GEOMETRY_ERRORS = (ValueError, ArithmeticError)
+
+
+def modified(element, **changes):
+    """
+    Plain copy of a scene element with some of its parameters changed.
+    x and y place v1, the whole element moves with it. Objects take their constructor arguments,
+    abs_refr_indx replaces the material. Tools take attributes, e.g. n_rays or width of emitters, bins of detectors.
+    Raises one of GEOMETRY_ERRORS if the changed object has no valid geometry
+    """
+    x = changes.pop('x', None)
+    y = changes.pop('y', None)
+    copy = element.snapshot()
+    if isinstance(copy, Body):
+        arguments = copy.arguments()
+        if 'abs_refr_indx' in changes:
+            arguments['material'] = None
+        arguments.update(changes)
+        copy = type(copy)(**arguments)
+    elif changes:
+        for name, value in changes.items():
+            setattr(copy, name, value)
+        if isinstance(copy, Detector):
+            copy.reset()
+
+    offset = Vector2((copy.v1.x if x is None else x) - copy.v1.x, (copy.v1.y if y is None else y) - copy.v1.y)
+    if offset.x or offset.y:
+        if isinstance(copy, Body):
+            copy.move(offset)
+        else:
+            copy.v1 += offset
+            copy.v2 += offset
+            copy.recalculate_line()
+    return copy
+
+
+def demo_scene(s=4, polygon=Polygon, lens=Lens, ray_caster=RayCaster, ruler=Ruler, **constructors):
+    """
+    Scene the GUI starts with: a trapezoid prism and a stack of co-axial lenses scaled by s.
+    Constructors can be replaced, the GUI passes its own classes bound to the plane, unused ones are ignored
+    """
+    tools_list = [
+        ruler(Vector2(0, 0), Vector2(100, 0), 'Ruler'),
+        ray_caster(Vector2(-500, 15*s), Vector2(-475, 15*s), 'RayCaster1', ray_color='red'),
+        ray_caster(Vector2(-500, 7.5*s), Vector2(-475, 7.5*s), 'RayCaster2', ray_color='green'),
+        ray_caster(Vector2(-500, -7.5*s), Vector2(-475, -7.5*s), 'RayCaster3', ray_color='blue'),
+        ray_caster(Vector2(-500, -15*s), Vector2(-475, -15*s), 'RayCaster4', ray_color='purple')
+    ]
+
+    obj_list = [
+        polygon(Vector2(200, 0), 'PolygonTest', length=80, width=150, angle_l=radians(60), angle_r=radians(60)),
+
+        lens(Vector2(-1.0*s, 25.9*s), 'Lens1', length=1.0*s, width=51.8*s, rad_l=29.*s, rad_r=-97.58*s, abs_refr_indx=1.475),
+        lens(Vector2(-1.0*s, 25.9*s), 'Lens1R', length=1.0*s, width=51.8*s, rad_l=-97.58*s, rad_r=29.714*s, abs_refr_indx=1.475),
+        lens(Vector2(-1.5*s, 34.75*s), 'Lens2', length=1.5*s, width=69.5*s, rad_l=52.945*s, rad_r=209.650*s, abs_refr_indx=1.475),
+        lens(Vector2(-1.5*s, 34.75*s), 'Lens2R', length=1.5*s, width=69.5*s, rad_l=209.650*s, rad_r=52.945*s, abs_refr_indx=1.475),
+        #lens(Vector2(-2.0*s, 57.0*s), 'Lens3', length=2.0*s, width=114.0*s, rad_l=84.841*s, rad_r=1000000000.0, abs_refr_indx=1.4575),
+        #lens(Vector2(-2.0*s, 57.0*s), 'Lens3R', length=2.0*s, width=114.0*s, rad_l=1000000000.0, rad_r=84.841*s, abs_refr_indx=1.4575),
+        lens(Vector2(-14.0*s, 44.75*s), 'Lens4', length=14.0*s, width=89.5*s, rad_l=292.196*s, rad_r=292.196*s, abs_refr_indx=1.4575),
+        lens(Vector2(-0.5 * s, 5.5 * s), 'Lens5', length=0.5 * s, width=11 * s, rad_l=11.25 * s, rad_r=11.25 * s, abs_refr_indx=1.4575),
+    ]
+    return Scene(obj_list, tools_list, abs_refr_indx=1.0, max_recursion_depth=25)
+
+
+def large_lens_scene(polygon=Polygon, lens=Lens, ray_caster=RayCaster, ruler=Ruler, **constructors):
+    """
+    Unscaled lenses the demo scene has been built from. They share the axis and overlap like in the demo
+    """
+    tools_list = [ray_caster(Vector2(-1500, y), Vector2(-1475, y), f'RayCaster{i+1}')
+                  for i, y in enumerate((400, 250, 100, -100, -250, -400))]
+    obj_list = [
+        lens(Vector2(-200, 0), 'LensTest', length=20, width=140, rad_l=140, rad_r=140),
+        lens(Vector2(-10, 259), 'Lens1', length=10, width=518, rad_l=297.14, rad_r=-975.8, abs_refr_indx=1.475),
+        lens(Vector2(-15, 347.5), 'Lens2', length=15, width=695, rad_l=529.45, rad_r=2096.50, abs_refr_indx=1.475),
+        lens(Vector2(-20, 570), 'Lens3', length=20, width=1140, rad_l=848.41, rad_r=1000000000.0, abs_refr_indx=1.4575),
+        lens(Vector2(-140, 447.5), 'Lens4', length=140, width=895, rad_l=2921.96, rad_r=2921.96, abs_refr_indx=1.4575),
+    ]
+    return Scene(obj_list, tools_list, abs_refr_indx=1.0, max_recursion_depth=25)
@@ -0,0 +1,254 @@
+"""
+Scene files.
+
+JSON (.json) is the human-readable format:
+    {
+        "version": 1, "abs_refr_indx": 1.0, "max_recursion_depth": 25,
+        "objects": [{"type": "Polygon", "name": "P", "v1": [200, 0], "length": 80, "width": 150,
+                     "angle_l": 1.047, "angle_r": 1.047, "abs_refr_indx": 1.65},
+                    {"type": "Lens", "name": "L", "v1": [-4, 22], "length": 4, "width": 44,
+                     "rad_l": 45, "rad_r": -45, "abs_refr_indx": 1.4575}],
+        "tools": [{"type": "Ruler", "name": "R", "v1": [0, 0], "v2": [100, 0]},
+                  {"type": "RayCaster", "name": "S", "v1": [-500, 0], "v2": [-475, 0], "ray_color": "red"},
+                  {"type": "Detector", "name": "D", "v1": [300, -100], "v2": [300, 100], "bins": 64, "angle_bins": 36},
+                  {"type": "Beam", "name": "B", "v1": [-500, 50], "v2": [-475, 50], "n_rays": 100, "power": 1.0,
+                   "width": 40, "ray_color": "blue"}]
+    }
+Fields are the constructor arguments, angles are in radians, negative radii are concave sides.
+Detector histograms are not stored. Emitters of sources.py (Fan, Beam, PointSource, Lambertian) need numpy.
+Optional fields: "material" of objects ({"type": "Sellmeier", "b": [...], "c": [...]} or
+{"type": "Cauchy", "a": ..., "b": ..., "c": ...}) and "wavelengths" (nm) of ray casters and emitters.
+
+Binary (any other extension) is columnar: a JSON header with names, colors, materials, wavelengths and the order
+of elements, followed by one float64 table per element type stored column after column.
+"""
+import json
+import struct
+import sys
+from array import array
+from geometry import Vector2
+from scene import Scene, Polygon, Lens, RayCaster, Ruler, Detector
+from spectral import material_from_dict
+try:
+    from sources import EMITTERS
+except ImportError:     # numpy is not installed
+    EMITTERS = {}
+
+
+VERSION = 1
+MAGIC = b'2DOS'
+
+# numeric columns of the binary tables
+COLUMNS = {
+    'Polygon': ('x', 'y', 'length', 'width', 'angle_l', 'angle_r', 'abs_refr_indx'),
+    'Lens': ('x', 'y', 'length', 'width', 'rad_l', 'rad_r', 'abs_refr_indx'),
+    'Ruler': ('x1', 'y1', 'x2', 'y2'),
+    'RayCaster': ('x1', 'y1', 'x2', 'y2'),
+    'Detector': ('x1', 'y1', 'x2', 'y2', 'bins', 'angle_bins'),
+    'Fan': ('x1', 'y1', 'x2', 'y2', 'n_rays', 'power', 'angle'),
+    'Beam': ('x1', 'y1', 'x2', 'y2', 'n_rays', 'power', 'width'),
+    'PointSource': ('x1', 'y1', 'x2', 'y2', 'n_rays', 'power'),
+    'Lambertian': ('x1', 'y1', 'x2', 'y2', 'n_rays', 'power', 'width'),
+}
+KINDS = {'Polygon': 'P', 'Lens': 'L', 'Ruler': 'R', 'RayCaster': 'C', 'Detector': 'D',
+         'Fan': 'F', 'Beam': 'B', 'PointSource': 'S', 'Lambertian': 'E'}
+SOURCES = ('RayCaster', 'Fan', 'Beam', 'PointSource', 'Lambertian')     # have ray_color and wavelengths
+INTEGERS = ('bins', 'angle_bins', 'n_rays')
+
+
+def element_type(element):
+    # subclasses first: emitters are ray casters, Detector is a Ruler
+    for cls in (*EMITTERS.values(), Polygon, Lens, RayCaster, Detector, Ruler):
+        if isinstance(element, cls):
+            return cls.__name__
+    raise TypeError(f'Cannot save {type(element).__name__}')
+
+
+def row(element):
+    """
+    Numeric columns of an element, see COLUMNS
+    """
+    if isinstance(element, Polygon):
+        return (element.v1.x, element.v1.y, element.length, element.width,
+                element.angle_l, element.angle_r, element.abs_refr_indx)
+    if isinstance(element, Lens):
+        return (element.v1.x, element.v1.y, element.length, element.width,
+                element.rad_l if element.convex_l else -element.rad_l,
+                element.rad_r if element.convex_r else -element.rad_r,
+                element.abs_refr_indx)
+    return (element.v1.x, element.v1.y, element.v2.x, element.v2.y,
+            *(getattr(element, column) for column in COLUMNS[element_type(element)][4:]))
+
+
+class Builder:
+    """
+    Turns rows back into elements. Constructors can be replaced like in scene.demo_scene,
+    emitters maps emitter types to their constructors
+    """
+    def __init__(self, polygon=Polygon, lens=Lens, ray_caster=RayCaster, ruler=Ruler, detector=Detector,
+                 emitters=None):
+        self.polygon = polygon
+        self.lens = lens
+        self.ray_caster = ray_caster
+        self.ruler = ruler
+        self.detector = detector
+        self.emitters = EMITTERS if emitters is None else emitters
+
+    def build(self, kind, name, values, ray_color=None, material=None, wavelengths=None):
+        material = material_from_dict(material) if material is not None else None
+        if kind == 'Polygon':
+            x, y, length, width, angle_l, angle_r, n = values
+            return self.polygon(Vector2(x, y), name, length=length, width=width,
+                                angle_l=angle_l, angle_r=angle_r, abs_refr_indx=n, material=material)
+        if kind == 'Lens':
+            x, y, length, width, rad_l, rad_r, n = values
+            return self.lens(Vector2(x, y), name, length=length, width=width,
+                             rad_l=rad_l, rad_r=rad_r, abs_refr_indx=n, material=material)
+        x1, y1, x2, y2, *extra = values
+        options = {column: int(value) if column in INTEGERS else value
+                   for column, value in zip(COLUMNS.get(kind, ())[4:], extra)}
+        if kind == 'Detector':
+            return self.detector(Vector2(x1, y1), Vector2(x2, y2), name, **options)
+        if kind in self.emitters:
+            return self.emitters[kind](Vector2(x1, y1), Vector2(x2, y2), name, ray_color=ray_color,
+                                       wavelengths=wavelengths, **options)
+        if kind == 'RayCaster':
+            return self.ray_caster(Vector2(x1, y1), Vector2(x2, y2), name, ray_color=ray_color,
+                                   wavelengths=wavelengths)
+        if kind == 'Ruler':
+            return self.ruler(Vector2(x1, y1), Vector2(x2, y2), name)
+        raise ValueError(f'Unknown element type {kind}')
+
+
+def to_dict(scene):
+    def element_dict(element):
+        kind = element_type(element)
+        values = dict(zip(COLUMNS[kind], row(element)))
+        result = {'type': kind, 'name': element.name}
+        if kind in ('Polygon', 'Lens'):
+            result['v1'] = [values.pop('x'), values.pop('y')]
+        else:
+            result['v1'] = [values.pop('x1'), values.pop('y1')]
+            result['v2'] = [values.pop('x2'), values.pop('y2')]
+        result.update(values)
+        if kind in ('Polygon', 'Lens') and element.material is not None:
+            result['material'] = element.material.to_dict()
+        if kind in SOURCES:
+            result['ray_color'] = element.ray_color
+            if element.wavelengths is not None:
+                result['wavelengths'] = element.wavelengths
+        return result
+
+    return {
+        'version': VERSION,
+        'abs_refr_indx': scene.abs_refr_indx,
+        'max_recursion_depth': scene.max_recursion_depth,
+        'objects': [element_dict(obj) for obj in scene.obj_list],
+        'tools': [element_dict(tool) for tool in scene.tools_list],
+    }
+
+
+def from_dict(data, **constructors):
+    builder = Builder(**constructors)
+
+    def element(item):
+        kind = item['type']
+        if kind in ('Polygon', 'Lens'):
+            values = (*item['v1'], *(item[column] for column in COLUMNS[kind][2:]))
+        else:
+            values = (*item['v1'], *item['v2'], *(item[column] for column in COLUMNS[kind][4:]))
+        return builder.build(kind, item['name'], values, item.get('ray_color', 'red'),
+                             item.get('material'), item.get('wavelengths'))
+
+    return Scene([element(item) for item in data['objects']], [element(item) for item in data['tools']],
+                 abs_refr_indx=data.get('abs_refr_indx', 1.0),
+                 max_recursion_depth=data.get('max_recursion_depth', 25))
+
+
+def to_bytes(scene):
+    elements = scene.obj_list + scene.tools_list
+    kinds = [element_type(element) for element in elements]
+    tables = {kind: [] for kind in COLUMNS}
+    for element, kind in zip(elements, kinds):
+        tables[kind].append(row(element))
+    header = {
+        'version': VERSION,
+        'abs_refr_indx': scene.abs_refr_indx,
+        'max_recursion_depth': scene.max_recursion_depth,
+        'objects': ''.join(KINDS[kind] for kind in kinds[:len(scene.obj_list)]),
+        'tools': ''.join(KINDS[kind] for kind in kinds[len(scene.obj_list):]),
+        'names': [element.name for element in elements],
+        'ray_colors': [element.ray_color for element, kind in zip(elements, kinds) if kind in SOURCES],
+        # sparse, keyed by the position of the element
+        'materials': {str(i): element.material.to_dict() for i, (element, kind) in enumerate(zip(elements, kinds))
+                      if kind in ('Polygon', 'Lens') and element.material is not None},
+        'wavelengths': {str(i): element.wavelengths for i, (element, kind) in enumerate(zip(elements, kinds))
+                        if kind in SOURCES and element.wavelengths is not None},
+    }
+    header = json.dumps(header, separators=(',', ':')).encode()
+
+    data = array('d')
+    for kind, rows in tables.items():
+        for column in zip(*rows):       # column after column
+            data.extend(column)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return MAGIC + struct.pack('<I', len(header)) + header + data.tobytes()
+
+
+def from_bytes(buffer, **constructors):
+    if buffer[:4] != MAGIC:
+        raise ValueError('Not a scene file')
+    header_size, = struct.unpack_from('<I', buffer, 4)
+    header = json.loads(buffer[8:8 + header_size])
+    data = array('d')
+    data.frombytes(buffer[8 + header_size:])
+    if sys.byteorder == 'big':
+        data.byteswap()
+
+    codes = {code: kind for kind, code in KINDS.items()}
+    order = header['objects'] + header['tools']
+    rows = {}
+    offset = 0
+    for kind, columns in COLUMNS.items():
+        n = order.count(KINDS[kind])
+        table = [data[offset + i*n:offset + (i+1)*n] for i in range(len(columns))]
+        rows[kind] = iter(zip(*table))
+        offset += n * len(columns)
+    if offset != len(data):
+        raise ValueError('Corrupted scene file')
+
+    builder = Builder(**constructors)
+    names = iter(header['names'])
+    ray_colors = iter(header['ray_colors'])
+    materials = header.get('materials', {})
+    wavelengths = header.get('wavelengths', {})
+    elements = []
+    for i, code in enumerate(order):
+        kind = codes[code]
+        ray_color = next(ray_colors) if kind in SOURCES else None
+        elements.append(builder.build(kind, next(names), next(rows[kind]), ray_color,
+                                      materials.get(str(i)), wavelengths.get(str(i))))
+    n_objects = len(header['objects'])
+    return Scene(elements[:n_objects], elements[n_objects:], abs_refr_indx=header['abs_refr_indx'],
+                 max_recursion_depth=header['max_recursion_depth'])
+
+
+def save(scene, path):
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(to_dict(scene), f, indent=2)
+    else:
+        with open(path, 'wb') as f:
+            f.write(to_bytes(scene))
+
+
+def load(path, **constructors):
+    """
+    Format is detected by content, constructors are passed to Builder
+    """
+    with open(path, 'rb') as f:
+        buffer = f.read()
+    if buffer[:4] == MAGIC:
+        return from_bytes(buffer, **constructors)
+    return from_dict(json.loads(buffer), **constructors)
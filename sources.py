@@ -0,0 +1,130 @@
+"""
+Sources emitting many rays. Like RayCaster they are placed by v1 and v2: rays start around v2,
+the axis points from v1 to v2. Rays are generated as numpy arrays, ray i of n is sampled at u = (i + 0.5)/n
+so the same source always gives the same rays. Each ray carries power/n_rays.
+"""
+from abc import ABC, abstractmethod
+from math import pi, radians
+import numpy as np
+from geometry import Vector2, Ray
+from scene import RayCaster
+
+GOLDEN = (5**0.5 - 1) / 2
+
+
+class Emitter(RayCaster, ABC):
+    """
+    Subclasses implement sample(i, u) returning the angle of each ray to the axis
+    (counterclockwise positive) and its offset from v2 across the axis
+    """
+    def __init__(self, v1, v2, name, n_rays=64, power=1.0, ray_color='red', wavelengths=None):
+        super().__init__(v1, v2, name, ray_color=ray_color, wavelengths=wavelengths)
+        self.n_rays = n_rays
+        self.power = power
+
+    @abstractmethod
+    def sample(self, i, u):
+        pass
+
+    def ray_arrays(self, start=0, stop=None):
+        """
+        origins (N, 2), directions (N, 2) and weights (N,) of rays start..stop
+        """
+        stop = self.n_rays if stop is None else stop
+        i = np.arange(start, stop, dtype=float)
+        origins, directions = self.rays_at(i, (i + 0.5) / self.n_rays)
+        return origins, directions, np.full(len(i), self.power / self.n_rays)
+
+    def rays_at(self, i, u):
+        """
+        origins (N, 2) and directions (N, 2) of the rays sampled at u, i are their (possibly fractional) indices
+        """
+        angle, offset = self.sample(i, u)
+        axis = (self.v2 - self.v1).normalized()
+        across = np.array([-axis.y, axis.x])
+        axis = np.array([axis.x, axis.y])
+        cos, sin = np.cos(angle)[:, None], np.sin(angle)[:, None]
+        origins = np.array([self.v2.x, self.v2.y]) + np.broadcast_to(offset, u.shape)[:, None]*across
+        return origins, axis*cos + across*sin
+
+    def batches(self, batch_size=65536):
+        """
+        (origins, directions, weights, wavelengths) of at most batch_size rays each, for BatchTracer.stream.
+        Every ray is repeated once per wavelength, wavelengths are NaN for monochromatic sources
+        """
+        wavelengths = np.array(self.wavelengths if self.wavelengths is not None else [np.nan], dtype=float)
+        step = max(batch_size // len(wavelengths), 1)
+        for start in range(0, self.n_rays, step):
+            origins, directions, weights = self.ray_arrays(start, min(start + step, self.n_rays))
+            yield (np.repeat(origins, len(wavelengths), axis=0), np.repeat(directions, len(wavelengths), axis=0),
+                   np.repeat(weights, len(wavelengths)), np.tile(wavelengths, len(origins)))
+
+    def rays(self):
+        origins, directions, weights = self.ray_arrays()
+        return [(Ray(Vector2(ox, oy), Vector2(dx, dy)), w)
+                for (ox, oy), (dx, dy), w in zip(origins.tolist(), directions.tolist(), weights.tolist())]
+
+    def copy_args(self):
+        return (Vector2(self.v1.x, self.v1.y), Vector2(self.v2.x, self.v2.y), self.name,
+                self.n_rays, self.power, self.ray_color, self.wavelengths)
+
+
+class Fan(Emitter):
+    """
+    Rays from v2 evenly spread over angle (radians) around the axis
+    """
+    def __init__(self, v1, v2, name, n_rays=64, power=1.0, ray_color='red', wavelengths=None, angle=radians(30)):
+        super().__init__(v1, v2, name, n_rays=n_rays, power=power, ray_color=ray_color, wavelengths=wavelengths)
+        self.angle = angle
+
+    def sample(self, i, u):
+        return (u - 0.5) * self.angle, 0.0
+
+    def snapshot(self):
+        return Fan(*self.copy_args(), angle=self.angle)
+
+
+class Beam(Emitter):
+    """
+    Parallel rays along the axis evenly spread over width, centered on v2
+    """
+    def __init__(self, v1, v2, name, n_rays=64, power=1.0, ray_color='red', wavelengths=None, width=50.0):
+        super().__init__(v1, v2, name, n_rays=n_rays, power=power, ray_color=ray_color, wavelengths=wavelengths)
+        self.width = width
+
+    def sample(self, i, u):
+        return np.zeros_like(u), (u - 0.5) * self.width
+
+    def snapshot(self):
+        return Beam(*self.copy_args(), width=self.width)
+
+
+class PointSource(Emitter):
+    """
+    Rays from v2 evenly spread over the full circle, the axis only sets the direction of the first one
+    """
+    def sample(self, i, u):
+        return (u - 0.5) * 2*pi, 0.0
+
+    def snapshot(self):
+        return PointSource(*self.copy_args())
+
+
+class Lambertian(Emitter):
+    """
+    Surface of the given width across the axis, centered on v2, radiating into the half plane the axis points to.
+    Intensity falls off as cos(angle): angle = asin(2u - 1) is the inverse of its cumulative distribution.
+    Offsets follow the golden ratio sequence so that they are not correlated with the angles
+    """
+    def __init__(self, v1, v2, name, n_rays=64, power=1.0, ray_color='red', wavelengths=None, width=0.0):
+        super().__init__(v1, v2, name, n_rays=n_rays, power=power, ray_color=ray_color, wavelengths=wavelengths)
+        self.width = width
+
+    def sample(self, i, u):
+        return np.arcsin(2*u - 1), ((i*GOLDEN + 0.5) % 1 - 0.5) * self.width
+
+    def snapshot(self):
+        return Lambertian(*self.copy_args(), width=self.width)
+
+
+EMITTERS = {cls.__name__: cls for cls in (Fan, Beam, PointSource, Lambertian)}
@@ -0,0 +1,107 @@
+"""
+Wavelength dependent refractive indices and spectral colours. Wavelengths are in nanometers.
+index() works on floats and, elementwise, on numpy arrays.
+"""
+from functools import lru_cache
+
+D_LINE = 587.6      # wavelength the scalar abs_refr_indx of a material is taken at
+VISIBLE = (380.0, 780.0)
+
+
+class Cauchy:
+    """
+    n = A + B/l^2 + C/l^4, l in micrometers
+    """
+    def __init__(self, a, b, c=0.0):
+        self.a = a
+        self.b = b
+        self.c = c
+
+    def index(self, wavelength):
+        l2 = (wavelength / 1000)**2
+        return self.a + self.b/l2 + self.c/(l2*l2)
+
+    def to_dict(self):
+        return {'type': 'Cauchy', 'a': self.a, 'b': self.b, 'c': self.c}
+
+
+class Sellmeier:
+    """
+    n^2 = 1 + sum(B_i*l^2 / (l^2 - C_i)), l in micrometers
+    """
+    def __init__(self, b, c):
+        self.b = tuple(b)
+        self.c = tuple(c)
+
+    def index(self, wavelength):
+        l2 = (wavelength / 1000)**2
+        n2 = 1.0
+        for b, c in zip(self.b, self.c):
+            n2 = n2 + b*l2/(l2 - c)
+        return n2**0.5
+
+    def to_dict(self):
+        return {'type': 'Sellmeier', 'b': list(self.b), 'c': list(self.c)}
+
+
+def material_from_dict(data):
+    if data['type'] == 'Cauchy':
+        return Cauchy(data['a'], data['b'], data.get('c', 0.0))
+    if data['type'] == 'Sellmeier':
+        return Sellmeier(data['b'], data['c'])
+    raise ValueError(f'Unknown material type {data["type"]}')
+
+
+# Schott and Malitson coefficients
+MATERIALS = {
+    'N-BK7': Sellmeier((1.03961212, 0.231792344, 1.01046945), (0.00600069867, 0.0200179144, 103.560653)),
+    'F2': Sellmeier((1.34533359, 0.209073176, 0.937357162), (0.00997743871, 0.0470450767, 111.886764)),
+    'fused_silica': Sellmeier((0.6961663, 0.4079426, 0.8974794), (0.0046791483, 0.0135120631, 97.9340025)),
+}
+
+
+def wavelengths(n, lo=VISIBLE[0] + 20, hi=VISIBLE[1] - 80):
+    """
+    n wavelengths evenly spread over the visible range
+    """
+    if n == 1:
+        return [(lo + hi) / 2]
+    return [lo + i*(hi - lo)/(n - 1) for i in range(n)]
+
+
+def wavelength_rgb(wavelength):
+    """
+    Approximate colour of monochromatic light as (r, g, b) in 0..1, black outside of the visible range.
+    Piecewise linear fit by Dan Bruton with intensity falling off at the ends of the range
+    """
+    w = wavelength
+    if 380 <= w < 440:
+        rgb = ((440 - w) / 60, 0.0, 1.0)
+    elif 440 <= w < 490:
+        rgb = (0.0, (w - 440) / 50, 1.0)
+    elif 490 <= w < 510:
+        rgb = (0.0, 1.0, (510 - w) / 20)
+    elif 510 <= w < 580:
+        rgb = ((w - 510) / 70, 1.0, 0.0)
+    elif 580 <= w < 645:
+        rgb = (1.0, (645 - w) / 65, 0.0)
+    elif 645 <= w <= 780:
+        rgb = (1.0, 0.0, 0.0)
+    else:
+        return 0.0, 0.0, 0.0
+    if w < 420:
+        k = 0.3 + 0.7*(w - 380) / 40
+    elif w > 700:
+        k = 0.3 + 0.7*(780 - w) / 80
+    else:
+        k = 1.0
+    return tuple(k*c for c in rgb)
+
+
+@lru_cache(maxsize=1024)
+def wavelength_color(wavelength):
+    """
+    Tk colour string of wavelength_rgb, gamma 0.8
+    """
+    r, g, b = (round(255 * c**0.8) for c in wavelength_rgb(wavelength))
+    return f'#{r:02x}{g:02x}{b:02x}'
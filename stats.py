@@ -0,0 +1,54 @@
+from collections import Counter
+
+
+class Stats:
+    """
+    Counters and timers of the tracer. Tracing code only touches it when a Stats object
+    has been given to it, with stats=None the cost is a single comparison per call site.
+
+    counters:       intersections.<class name> - intersection tests per object type,
+                    intersection_circle - circle equations solved for Lens surfaces,
+                    rays - traced branches, tir - total internal reflections,
+                    max_depth - branches cut by max_recursion_depth
+    depths:         histogram of the depth of traced segments
+    bounces:        histogram of hits per primary ray (one per ray and wavelength of a source),
+                    all of its Fresnel branches together
+    timers:         seconds spent per phase, e.g. trace and draw
+    """
+    def __init__(self):
+        self.counters = Counter()
+        self.depths = Counter()
+        self.bounces = Counter()
+        self.timers = Counter()
+        self.frames = 0
+
+    def reset(self):
+        self.__init__()
+
+    def intersection_test(self, obj, circles=0):
+        self.counters['intersections.' + type(obj).__name__] += 1
+        if circles:
+            self.counters['intersection_circle'] += circles
+
+    def summary(self):
+        return {
+            'frames': self.frames,
+            'counters': dict(self.counters),
+            'depths': dict(sorted(self.depths.items())),
+            'bounces': dict(sorted(self.bounces.items())),
+            'timers': dict(self.timers),
+        }
+
+    def overlay_text(self, fps=None):
+        """
+        Per frame averages for the GUI
+        """
+        frames = max(self.frames, 1)
+        lines = [f'{int(fps) if fps is not None else "-"} FPS']
+        for name in sorted(self.timers):
+            lines.append(f'{name + ":":<14}{self.timers[name] / frames * 1000:.1f} ms')
+        for name in sorted(self.counters):
+            lines.append(f'{name + ":":<24}{self.counters[name] / frames:.0f}')
+        if self.depths:
+            lines.append(f'max depth reached: {max(self.depths)}')
+        return '\n'.join(lines)
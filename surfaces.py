@@ -0,0 +1,139 @@
+from array import array
+from math import inf
+from geometry import Vector2
+from scene import SegmentSurface, ArcSurface
+
+
+class SurfaceTable:
+    """
+    Surface records of all objects of a scene in contiguous float arrays, one row per surface.
+    Segments: p0 + u*e, 0 <= u <= 1, outward unit normal n
+    Arcs: |p - center| = r, y_min <= p.y <= y_max, side*(p.x - center.x) >= 0, outward normal sign,
+          chord circle arc_chord_* enclosing the arc
+    Surfaces of object i are rows seg_first[i]:seg_first[i+1] and arc_first[i]:arc_first[i+1].
+    circle_solves counts the circle equations intersect has solved, arcs rejected by their chord circle are not counted
+    """
+    def __init__(self, obj_list):
+        self.circle_solves = 0
+        rows = [self.rows(obj) for obj in obj_list]
+        self.seg_first = array('i', [0])
+        self.arc_first = array('i', [0])
+        for segments, arcs in rows:
+            self.seg_first.append(self.seg_first[-1] + len(segments))
+            self.arc_first.append(self.arc_first[-1] + len(arcs))
+        self.seg_obj = array('i', [obj_id for obj_id, (segments, _) in enumerate(rows) for _ in segments])
+        self.seg_surface = array('i', [surface.surface_id for segments, _ in rows for surface in segments])
+        self.arc_obj = array('i', [obj_id for obj_id, (_, arcs) in enumerate(rows) for _ in arcs])
+        self.arc_surface = array('i', [surface.surface_id for _, arcs in rows for surface in arcs])
+
+        zeros = array('d', [0.0])
+        n_seg, n_arc = self.seg_first[-1], self.arc_first[-1]
+        self.seg_x0, self.seg_y0 = zeros * n_seg, zeros * n_seg
+        self.seg_ex, self.seg_ey = zeros * n_seg, zeros * n_seg
+        self.seg_nx, self.seg_ny = zeros * n_seg, zeros * n_seg
+        self.arc_cx, self.arc_cy, self.arc_r = zeros * n_arc, zeros * n_arc, zeros * n_arc
+        self.arc_y_min, self.arc_y_max = zeros * n_arc, zeros * n_arc
+        self.arc_side, self.arc_outward = zeros * n_arc, zeros * n_arc
+        self.arc_chord_x, self.arc_chord_y, self.arc_chord_r = zeros * n_arc, zeros * n_arc, zeros * n_arc
+        for obj_id, obj in enumerate(obj_list):
+            self.update(obj_id, obj)
+
+    def __len__(self):
+        return len(self.seg_first) - 1
+
+    @staticmethod
+    def rows(obj):
+        """
+        Surface records of an object split into segments and arcs
+        """
+        segments = [surface for surface in obj.surfaces if isinstance(surface, SegmentSurface)]
+        arcs = [surface for surface in obj.surfaces if isinstance(surface, ArcSurface)]
+        return segments, arcs
+
+    def update(self, obj_id, obj):
+        """
+        Rewrites the rows of a moved object in place
+        """
+        segments, arcs = self.rows(obj)
+        for i, surface in enumerate(segments, self.seg_first[obj_id]):
+            self.seg_x0[i], self.seg_y0[i] = surface.p0.x, surface.p0.y
+            self.seg_ex[i], self.seg_ey[i] = surface.edge.x, surface.edge.y
+            self.seg_nx[i], self.seg_ny[i] = surface.normal.x, surface.normal.y
+        for i, surface in enumerate(arcs, self.arc_first[obj_id]):
+            self.arc_cx[i], self.arc_cy[i], self.arc_r[i] = surface.center.x, surface.center.y, surface.r
+            self.arc_y_min[i], self.arc_y_max[i] = surface.y_min, surface.y_max
+            self.arc_side[i], self.arc_outward[i] = surface.side, surface.outward
+            self.arc_chord_x[i], self.arc_chord_y[i], self.arc_chord_r[i] = surface.chord
+
+    def arc_count(self, obj_id):
+        return self.arc_first[obj_id+1] - self.arc_first[obj_id]
+
+    def intersect(self, obj_id, ox, oy, dx, dy, t_min=0.0, t_max=inf):
+        """
+        Nearest hit of the ray origin + t*d with the object, t_min < t < t_max.
+        Same tests as Ray.intersection_segment and Ray.intersection_circle
+        return (t, is_arc, row) or None
+        """
+        best = None
+        solves = 0
+        x0, y0, ex, ey = self.seg_x0, self.seg_y0, self.seg_ex, self.seg_ey
+        for i in range(self.seg_first[obj_id], self.seg_first[obj_id+1]):
+            sx, sy = ex[i], ey[i]
+            denom = dx*sy - dy*sx
+            if denom == 0:      # parallel
+                continue
+            wx, wy = x0[i] - ox, y0[i] - oy
+            u = (wx*dy - wy*dx) / denom
+            if 0 <= u <= 1:
+                t = (wx*sy - wy*sx) / denom
+                if t_min < t < t_max:
+                    t_max = t
+                    best = (t, False, i)
+
+        chord_x, chord_y, chord_r = self.arc_chord_x, self.arc_chord_y, self.arc_chord_r
+        arc_cx, arc_cy, arc_r = self.arc_cx, self.arc_cy, self.arc_r
+        y_min, y_max, arc_side = self.arc_y_min, self.arc_y_max, self.arc_side
+        for i in range(self.arc_first[obj_id], self.arc_first[obj_id+1]):
+            # same as ArcSurface.misses, rejects without a square root
+            mr = chord_r[i]
+            qx, qy = ox - chord_x[i], oy - chord_y[i]
+            b = dx*qx + dy*qy
+            if qx*qx + qy*qy - b*b > mr*mr or -b - mr >= t_max or -b + mr <= t_min:
+                continue
+
+            solves += 1
+            cx, cy, r = arc_cx[i], arc_cy[i], arc_r[i]
+            qx, qy = ox - cx, oy - cy
+            b = dx*qx + dy*qy
+            disc = b*b - (qx*qx + qy*qy - r*r)
+            if disc < 0:
+                continue
+            sq = disc**0.5
+            side = arc_side[i]
+            t = -b - sq
+            if t_min < t < t_max:
+                py = oy + t*dy
+                if y_min[i] <= py <= y_max[i] and side*(ox + t*dx - cx) >= 0:
+                    t_max = t
+                    best = (t, True, i)
+                    continue
+            t = -b + sq         # the far root only matters if the near one is off the arc
+            if t_min < t < t_max:
+                py = oy + t*dy
+                if y_min[i] <= py <= y_max[i] and side*(ox + t*dx - cx) >= 0:
+                    t_max = t
+                    best = (t, True, i)
+        self.circle_solves += solves
+        return best
+
+    def collision(self, hit, ray):
+        """
+        [t, point, normal, surface_id, obj_id] of a hit returned by intersect
+        """
+        t, is_arc, i = hit
+        point = ray.point(t)
+        if is_arc:
+            cx, cy, r, outward = self.arc_cx[i], self.arc_cy[i], self.arc_r[i], self.arc_outward[i]
+            normal = Vector2(outward*(point.x - cx)/r, outward*(point.y - cy)/r)
+            return [t, point, normal, self.arc_surface[i], self.arc_obj[i]]
+        return [t, point, Vector2(self.seg_nx[i], self.seg_ny[i]), self.seg_surface[i], self.seg_obj[i]]
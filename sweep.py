@@ -0,0 +1,187 @@
+"""
+Parameter sweeps traced headlessly on a process pool.
+
+    configurations = grid({'Lens1.abs_refr_indx': [1.45, 1.5, 1.55], 'Lens1.rad_l': range(100, 200, 10)})
+    Sweep(scene, configurations, 'sweep.csv').run()
+
+A configuration maps 'element.parameter' to a value, parameters are those of scene.modified
+(x, y, rad_l, rad_r, abs_refr_indx, angle_l, angle_r, width of emitters...). Configurations are numbered in order.
+Each gets a CSV row with its index, parameter values and measures as soon as it has been traced.
+Rows are written in chunks, so memory does not grow with the sweep.
+Running an interrupted sweep again skips the configurations already in the file.
+"""
+import csv
+import itertools
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from scene import GEOMETRY_ERRORS
+from batch import BatchTracer, crossings
+from optimize import rms_spot
+
+
+def grid(axes):
+    """
+    Every combination of the values of the axes, the last axis changes fastest
+    """
+    keys = list(axes)
+    for values in itertools.product(*(axes[key] for key in keys)):
+        yield dict(zip(keys, values))
+
+
+def changes(configuration):
+    """
+    {'element.parameter': value} -> {element: {parameter: value}} for scene.Scene.modified
+    """
+    result = {}
+    for key, value in configuration.items():
+        element, parameter = key.rsplit('.', 1)
+        result.setdefault(element, {})[parameter] = value
+    return result
+
+
+def summary_columns(scene):
+    columns = ['rays', 'hits', 'tir', 'truncated']
+    for detector in scene.detectors():
+        columns += [f'{detector.name}.hits', f'{detector.name}.power', f'{detector.name}.rms']
+    return columns
+
+
+def summary(scene, result):
+    """
+    Default measures: traced rays, hits, total internal reflections, paths cut by max_recursion_depth
+    and hits, power and RMS spot size of every detector
+    """
+    row = {
+        'rays': len(result),
+        'hits': int((result.obj_id >= 0).sum()),
+        'tir': int(result.tir.sum()),
+        'truncated': int(result.truncated.sum()),
+    }
+    segments = result.segment_arrays()
+    for detector in scene.detectors():
+        _, _, w = crossings(detector, result, segments)
+        row[f'{detector.name}.hits'] = len(w)
+        row[f'{detector.name}.power'] = float(w.sum())
+        row[f'{detector.name}.rms'] = rms_spot(result, detector)
+    return row
+
+
+# state of a worker process, set once per sweep by init_worker
+worker_scene = None
+worker_measure = None
+worker_batch_options = None
+
+
+def init_worker(scene_bytes, measure, batch_options):
+    global worker_scene, worker_measure, worker_batch_options
+    worker_scene = pickle.loads(scene_bytes)
+    worker_measure = measure
+    worker_batch_options = batch_options
+
+
+def trace_configuration(scene, configuration, measure, batch_options):
+    """
+    Row of measures of one configuration. Geometry the scene classes reject, e.g. a lens radius below half
+    of its width or a polygon angle of 0, goes into the error column
+    """
+    try:
+        scene = scene.modified(changes(configuration))
+    except GEOMETRY_ERRORS as e:
+        return {'error': str(e) or type(e).__name__}
+    result = BatchTracer(scene, **batch_options).trace_sources()
+    return measure(scene, result)
+
+
+def trace_configurations(chunk):
+    return [dict(trace_configuration(worker_scene, configuration, worker_measure, worker_batch_options),
+                 index=index, **configuration)
+            for index, configuration in chunk]
+
+
+class Sweep:
+    """
+    measure(scene, result) returns a dict of the columns listed by columns(scene), summary by default.
+    Configurations go to the workers configurations_per_task at a time, at most 2 tasks per worker are pending.
+    With workers=0 everything runs in this process
+    """
+    def __init__(self, scene, configurations, path, measure=summary, columns=summary_columns, workers=None,
+                 configurations_per_task=16, batch_options=None):
+        self.scene = scene.snapshot()
+        self.configurations = configurations
+        self.path = path
+        self.measure = measure
+        self.columns = columns
+        self.workers = workers
+        self.configurations_per_task = configurations_per_task
+        self.batch_options = batch_options or {}
+
+    def done(self):
+        """
+        Indices of the configurations in the file and its header (None if there is no file).
+        A row cut short by an interruption is removed
+        """
+        if not os.path.exists(self.path):
+            return set(), None
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                f.truncate(end)
+        with open(self.path, newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return set(), None
+            column = header.index('index')
+            return {int(row[column]) for row in reader if row}, header
+
+    def run(self):
+        """
+        Returns the number of configurations traced by this call
+        """
+        configurations = iter(self.configurations)
+        first = next(configurations, None)
+        if first is None:
+            return 0
+        configurations = itertools.chain([first], configurations)
+        header = ['index', *first, *self.columns(self.scene), 'error']
+
+        done, old_header = self.done()
+        if old_header is not None and old_header != header:
+            raise ValueError(f'{self.path} has been written by another sweep: {old_header}')
+        todo = ((index, configuration) for index, configuration in enumerate(configurations) if index not in done)
+        chunks = iter(lambda: list(itertools.islice(todo, self.configurations_per_task)), [])
+
+        traced = 0
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, header, restval='')
+            if old_header is None:
+                writer.writeheader()
+
+            def write(rows):
+                nonlocal traced
+                writer.writerows(rows)
+                f.flush()
+                traced += len(rows)
+
+            if self.workers == 0:
+                init_worker(pickle.dumps(self.scene), self.measure, self.batch_options)
+                for chunk in chunks:
+                    write(trace_configurations(chunk))
+                return traced
+
+            workers = self.workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(workers, initializer=init_worker,
+                                     initargs=(pickle.dumps(self.scene), self.measure, self.batch_options)) as pool:
+                max_pending = 2 * workers
+                pending = set()
+                for chunk in chunks:
+                    pending.add(pool.submit(trace_configurations, chunk))
+                    if len(pending) >= max_pending:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            write(future.result())
+                for future in pending:
+                    write(future.result())
+        return traced
@@ -0,0 +1,9 @@
+def signature(paths, digits=None):
+    """
+    Comparable segments of traced paths, coordinates rounded to digits and weights to digits + 3 if given
+    """
+    def rounded(value, extra=0):
+        return value if digits is None else round(value, digits + extra)
+
+    return [[(rounded(s.start.x), rounded(s.start.y), rounded(s.end.x), rounded(s.end.y), rounded(s.weight, 3),
+              s.depth, s.obj_id, s.surface_id, s.tir, s.wavelength) for s in path.segments] for path in paths]
@@ -0,0 +1,45 @@
+from math import radians
+import numpy as np
+import pytest
+from geometry import Vector2
+from scene import Detector, demo_scene
+from sources import Fan
+from batch import BatchTracer, record
+from adaptive import AdaptiveSampler, spread
+
+
+def test_spread():
+    assert spread(4, np.array([0.5, 3.2]), np.array([2.5, 3.2]), np.array([2.0, 1.0])).tolist() == \
+           pytest.approx([0.5, 1.0, 0.5, 1.0])
+
+
+@pytest.fixture
+def scene():
+    scene = demo_scene()
+    scene.tools_list = [Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=50000, power=2.0, angle=radians(60)),
+                        Detector(Vector2(600, -400), Vector2(600, 400), 'Detector', bins=32)]
+    return scene
+
+
+def test_fewer_rays_same_histogram(scene):
+    detector = scene.detectors()[0]
+    record([detector], BatchTracer(scene).trace_sources())
+    reference = np.array(detector.position)
+
+    detector.reset()
+    result = AdaptiveSampler(BatchTracer(scene), tolerance=5).trace_sources()
+    assert result.weight.sum() == pytest.approx(2.0)
+    assert len(result) < 5000
+    assert detector.power == pytest.approx(reference.sum(), rel=1e-3)
+    assert np.abs(np.array(detector.position) - reference).sum() < 0.005
+
+
+def test_refines_only_where_paths_differ(scene):
+    sampler = AdaptiveSampler(BatchTracer(scene), tolerance=5)
+    u, result, _, differ = sampler.sample(scene.sources()[0])
+    assert np.all(np.diff(u) > 0)
+    gaps = np.diff(u)
+    assert gaps.max() <= 1 / sampler.coarse
+    assert gaps.min() < gaps.max() / 64     # refined much more in some places than in others
+    # pairs left differing are at the smallest gap
+    assert (gaps[differ] <= sampler.min_gap * 1.5).all()
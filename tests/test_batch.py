@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from geometry import Vector2
+from scene import demo_scene, large_lens_scene
+from sources import Fan
+from tracer import Tracer
+from batch import BatchTracer
+
+
+def primary_rays(paths):
+    """
+    Segments of a non-split trace grouped by primary ray
+    """
+    rays = []
+    for path in paths:
+        for segment in path.segments:
+            if segment.depth == 0:
+                rays.append([])
+            rays[-1].append(segment)
+    return rays
+
+
+@pytest.mark.parametrize('make_scene', [demo_scene, large_lens_scene])
+def test_scalar_and_batch_agree(make_scene):
+    scene = make_scene()
+    scene.tools_list.append(Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=64))
+    rays = primary_rays(Tracer(scene, split=False).trace())
+    result = BatchTracer(scene).trace_sources()
+    assert len(rays) == len(result)
+    for i, segments in enumerate(rays):
+        assert result.n_segments[i] == len(segments)
+        for k, segment in enumerate(segments):
+            assert np.allclose(result.points[i, k + 1], (segment.end.x, segment.end.y), atol=1e-6)
+            if segment.is_hit():
+                assert result.obj_id[i, k] == segment.obj_id
+                assert result.surface_id[i, k] == segment.surface_id
+                assert result.tir[i, k] == segment.tir
+                assert np.allclose(result.normal[i, k], (segment.normal.x, segment.normal.y), atol=1e-9)
+            else:
+                assert result.obj_id[i, k] == -1
+
+
+def test_normals_face_incoming_rays():
+    scene = demo_scene()
+    scene.tools_list.append(Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=256))
+    result = BatchTracer(scene).trace_sources()
+    hit = result.obj_id >= 0
+    incoming = result.points[:, 1:] - result.points[:, :-1]
+    assert ((incoming * result.normal).sum(axis=2)[hit] <= 0).all()
+
+
+def test_trace_spectrum_layout():
+    scene = demo_scene()
+    tracer = BatchTracer(scene)
+    origins = np.array([[-500.0, 20.0], [-500.0, -40.0]])
+    directions = np.array([[1.0, 0.0], [1.0, 0.1]])
+    wavelengths = np.array([450.0, 550.0, 650.0])
+    result = tracer.trace_spectrum(origins, directions, wavelengths)
+    assert len(result) == 6
+    for i in range(2):
+        for j, wavelength in enumerate(wavelengths):
+            single = tracer.trace(origins[i:i+1], directions[i:i+1], wavelengths=[wavelength])
+            row = i*len(wavelengths) + j
+            assert result.wavelength[row] == wavelength
+            n = single.n_segments[0]
+            assert result.n_segments[row] == n
+            assert np.allclose(result.points[row, :n + 1], single.points[0, :n + 1])
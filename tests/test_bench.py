@@ -0,0 +1,21 @@
+import pytest
+from geometry import Vector2
+from sources import Fan
+from bench import BACKENDS, measure, trapezoid_scene
+
+
+def test_measure():
+    result = measure(BACKENDS['tracer'], trapezoid_scene(), 1)
+    assert result['rays'] == 4 and result['seconds'] > 0
+
+
+def test_measure_needs_a_repeat():
+    with pytest.raises(ValueError):
+        measure(BACKENDS['tracer'], trapezoid_scene(), 0)
+
+
+@pytest.mark.parametrize('backend', list(BACKENDS))
+def test_measure_counts_rays_of_emitters(backend):
+    scene = trapezoid_scene()
+    scene.tools_list.append(Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=10))
+    assert measure(BACKENDS[backend], scene, 1)['rays'] == 14
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import pytest
+import scenefile
+from geometry import Vector2
+from scene import Detector, demo_scene
+from sources import Fan
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cli.py')
+
+
+def run(*args):
+    return subprocess.run([sys.executable, CLI, *args], capture_output=True, text=True)
+
+
+@pytest.fixture
+def scene_path(tmp_path):
+    scene = demo_scene()
+    scene.tools_list += [Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=50),
+                         Detector(Vector2(600, -400), Vector2(600, 400), 'Detector')]
+    path = str(tmp_path / 'scene.json')
+    scenefile.save(scene, path)
+    return path
+
+
+@pytest.mark.parametrize('backend', ['batch', 'parallel'])
+def test_stats_needs_tracer_backend(backend):
+    process = run('-b', backend, '--stats')
+    assert process.returncode == 2
+    assert '--stats needs the tracer backend' in process.stderr
+
+
+def test_outputs_without_tk(scene_path, tmp_path):
+    paths, detectors, image = (str(tmp_path / name) for name in ('paths.csv', 'detectors.csv', 'rays.png'))
+    process = run(scene_path, '-b', 'batch', '-n', '200', '--paths', paths, '--detectors', detectors,
+                  '--image', image, '--size', '64x48')
+    assert process.returncode == 0, process.stderr
+    assert '204 rays' in process.stdout
+    with open(image, 'rb') as f:
+        assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+    with open(detectors) as f:
+        assert len(f.readlines()) == 1 + 64 + 36
+
+
+def test_batch_and_parallel_histograms_match(scene_path, tmp_path):
+    batch, parallel = str(tmp_path / 'batch.csv'), str(tmp_path / 'parallel.csv')
+    assert run(scene_path, '-b', 'batch', '--detectors', batch).returncode == 0
+    assert run(scene_path, '-b', 'parallel', '--workers', '2', '--detectors', parallel).returncode == 0
+    with open(batch) as f1, open(parallel) as f2:
+        assert f1.read() == f2.read()
+
+
+def test_tkinter_not_imported():
+    process = subprocess.run([sys.executable, '-c', f'import sys; sys.argv = ["cli.py"]; '
+                              f'exec(open({CLI!r}).read()); print("tkinter" in sys.modules)'],
+                             capture_output=True, text=True, cwd=os.path.dirname(CLI))
+    assert process.returncode == 0, process.stderr
+    assert process.stdout.strip().endswith('False')
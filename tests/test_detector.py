@@ -0,0 +1,51 @@
+from math import radians
+import numpy as np
+import pytest
+from geometry import Vector2
+from scene import Detector, demo_scene
+from sources import Fan
+from tracer import Tracer
+from batch import BatchTracer, record
+
+
+def test_record_single_crossing():
+    detector = Detector(Vector2(0, -10), Vector2(0, 10), 'Detector', bins=4, angle_bins=6)
+    assert detector.record(Vector2(-5, 2.5), Vector2(5, 7.5), 0.5)
+    assert not detector.record(Vector2(1, 0), Vector2(5, 0))
+    assert detector.hits == 1 and detector.power == 0.5
+    assert list(detector.position) == [0, 0, 0, 0.5]     # crosses at y = 5, u = 0.75
+    # 26.6 degrees to the normal goes into the bin of 0..30 degrees
+    assert list(detector.angle) == [0, 0, 0, 0.5, 0, 0]
+    assert detector.irradiance() == [0, 0, 0, 0.1]
+
+
+@pytest.fixture
+def scene():
+    scene = demo_scene()
+    scene.tools_list += [Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=500, angle=radians(50)),
+                         Detector(Vector2(600, -400), Vector2(600, 400), 'Detector')]
+    return scene
+
+
+def test_scalar_and_batch_histograms_agree(scene):
+    detector = scene.detectors()[0]
+    for path in Tracer(scene, split=False).trace():
+        detector.record_path(path)
+    scalar = (list(detector.position), list(detector.angle), detector.hits, detector.power)
+    detector.reset()
+    record([detector], BatchTracer(scene).trace_sources())
+    assert detector.hits == scalar[2] > 0
+    assert detector.power == pytest.approx(scalar[3])
+    assert np.allclose(detector.position, scalar[0]) and np.allclose(detector.angle, scalar[1])
+
+
+def test_stream_matches_whole_batch(scene):
+    detector = scene.detectors()[0]
+    tracer = BatchTracer(scene)
+    assert list(tracer.stream(tracer.source_batches(batch_size=64)))[-1] == 504
+    streamed = (list(detector.position), detector.hits, detector.power)
+    detector.reset()
+    record([detector], tracer.trace_sources())
+    assert streamed[1] == detector.hits
+    assert streamed[2] == pytest.approx(detector.power)
+    assert np.allclose(streamed[0], detector.position)
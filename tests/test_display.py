@@ -0,0 +1,46 @@
+import pytest
+from geometry import Vector2
+from scene import RayCaster, demo_scene
+from sources import Fan
+from tracer import Tracer
+
+pytest.importorskip('tkinter')
+from main import DisplayPolicy, decimated     # noqa: E402
+
+
+@pytest.fixture
+def paths():
+    scene = demo_scene()
+    scene.tools_list.append(Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=300))
+    return Tracer(scene, split=False).trace()
+
+
+def test_settled_frames_are_full(paths):
+    policy = DisplayPolicy(budget=500, glyph_limit=10**6)
+    assert policy.plan(paths) == (1, None, True)
+    assert DisplayPolicy(glyph_limit=10).plan(paths)[2] is False
+
+
+def test_interaction_keeps_the_budget(paths):
+    policy = DisplayPolicy(budget=500, settle_time=60)
+    policy.interact()
+    stride, max_segments, glyphs = policy.plan(paths)
+    assert stride > 1 and not glyphs
+    drawn = [segment for path in paths for segment in decimated(path.segments, stride, max_segments)]
+    assert 0 < len(drawn) <= policy.budget
+    assert all(segments == list(decimated(segments)) for segments in (path.segments for path in paths))
+
+
+def test_interaction_keeps_the_budget_over_many_sources():
+    scene = demo_scene()
+    scene.tools_list.extend(RayCaster(Vector2(-600, i), Vector2(-500, i), f'Ray {i}') for i in range(200))
+    paths = Tracer(scene).trace()
+    policy = DisplayPolicy(budget=500, settle_time=60)
+    policy.interact()
+    stride, max_segments, _ = policy.plan(paths)
+    drawn = []
+    first_ray = 0
+    for path in paths:
+        drawn.extend(decimated(path.segments, stride, max_segments, first_ray))
+        first_ray += sum(segment.depth == 0 for segment in path.segments)
+    assert 0 < len(drawn) <= policy.budget
@@ -0,0 +1,20 @@
+from math import asin, cos, radians, sin
+import pytest
+from geometry import Ray, Vector2
+
+
+@pytest.mark.parametrize('angle', [0, 10, 30, 41, 60])
+@pytest.mark.parametrize('n1, n2', [(1.0, 1.5), (1.5, 1.0)])
+def test_snell(angle, n1, n2):
+    a = radians(angle)
+    direction = Vector2(sin(a), -cos(a))
+    normal, cos_i, cos_t, reflected, refracted = Ray.snell(direction, Vector2(0, -1), n1, n2)
+    assert (normal.x, normal.y) == (0, 1)
+    assert cos_i == pytest.approx(cos(a))
+    assert (reflected.x, reflected.y) == pytest.approx((sin(a), cos(a)))
+    if n1 * sin(a) / n2 > 1:
+        assert cos_t is None and refracted is None
+    else:
+        t = asin(n1 * sin(a) / n2)
+        assert cos_t == pytest.approx(cos(t))
+        assert (refracted.x, refracted.y) == pytest.approx((sin(t), -cos(t)))
@@ -0,0 +1,36 @@
+from geometry import Vector2
+from scene import demo_scene
+from sources import Fan
+from tracer import Tracer
+from helpers import signature
+
+
+def scene_with_fan():
+    scene = demo_scene()
+    scene.tools_list.append(Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=16))
+    return scene
+
+
+def test_moved_objects_match_full_retrace():
+    scene = scene_with_fan()
+    tracer = Tracer(scene, incremental=True)
+    tracer.trace()
+    for obj_id, offset in ((5, Vector2(40, 0)), (0, Vector2(0, -30)), (5, Vector2(-200, 15)), (3, Vector2(5, 5))):
+        obj = scene.obj_list[obj_id]
+        old_box = obj.bbox()
+        obj.move(offset)
+        tracer.object_moved(obj, old_box)
+        assert signature(tracer.trace(), 6) == signature(Tracer(scene).trace(), 6)
+
+
+def test_moved_source_matches_full_retrace():
+    scene = scene_with_fan()
+    tracer = Tracer(scene, incremental=True)
+    first = tracer.trace()
+    source = scene.sources()[0]
+    source.v1 += Vector2(0, 25)
+    source.v2 += Vector2(0, 25)
+    tracer.source_moved(source)
+    paths = tracer.trace()
+    assert signature(paths, 6) == signature(Tracer(scene).trace(), 6)
+    assert paths[1:] == first[1:]   # other paths come from the cache
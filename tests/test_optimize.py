@@ -0,0 +1,32 @@
+from math import inf, isfinite
+from geometry import Vector2
+from scene import Detector, demo_scene
+from optimize import Evaluator, Parameter, Optimizer
+
+
+def scene_with_detector():
+    scene = demo_scene()
+    scene.tools_list.append(Detector(Vector2(1000, -1000), Vector2(1000, 1000), 'Detector'))
+    return scene
+
+
+def test_failed_change_forces_retrace():
+    scene = scene_with_detector()
+    parameters = [Parameter('Lens4', 'x'), Parameter('PolygonTest', 'angle_l')]
+    x, angle = (parameter.value(scene) for parameter in parameters)
+    evaluator = Evaluator(scene, parameters, 'Detector')
+    before = evaluator([x, angle])
+    assert evaluator([x + 50, 0.0]) == inf
+    after = evaluator([x + 50, angle])
+    assert after == Evaluator(scene, parameters, 'Detector')([x + 50, angle])
+    assert after != before
+
+
+def test_optimizer_in_process():
+    scene = scene_with_detector()
+    optimizer = Optimizer(scene, [Parameter('Lens4', 'x', -100, 100, step=20)], 'Detector', workers=0,
+                          max_evaluations=20)
+    values, merit = optimizer.run()
+    assert isfinite(merit)
+    assert merit <= optimizer.history[0][1]
+    assert -100 <= values[0] <= 100
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from geometry import Vector2
+from scene import demo_scene
+from sources import Fan
+from tracer import Tracer
+from batch import BatchTracer
+from parallel import ParallelTracer
+from helpers import signature
+
+
+@pytest.fixture
+def scene():
+    scene = demo_scene()
+    scene.tools_list.append(Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=40))
+    return scene
+
+
+def test_paths_match_serial(scene):
+    with ParallelTracer(scene, workers=2, sources_per_task=1) as tracer:
+        paths = tracer.trace()
+    serial = Tracer(scene).trace()
+    assert signature(paths) == signature(serial)
+    assert [path.source for path in paths] == scene.sources()
+
+
+def test_batch_matches_serial(scene):
+    origins, directions, weights, wavelengths = BatchTracer(scene).source_rays()
+    with ParallelTracer(scene, workers=2, rays_per_task=7) as tracer:
+        result = tracer.trace_batch(origins, directions, wavelengths=wavelengths, weights=weights)
+    serial = BatchTracer(scene).trace(origins, directions, wavelengths=wavelengths, weights=weights)
+    assert np.array_equal(result.n_segments, serial.n_segments)
+    assert np.array_equal(result.obj_id, serial.obj_id)
+    assert np.allclose(result.points, serial.points, equal_nan=True)
+    assert np.array_equal(result.weight, serial.weight)
+
+
+def test_pool_follows_scene_changes(scene):
+    with ParallelTracer(scene, workers=2) as tracer:
+        tracer.trace()
+        scene.obj_list[5].move(Vector2(60, 0))
+        assert signature(tracer.trace()) == signature(Tracer(scene).trace())
@@ -0,0 +1,51 @@
+from math import inf
+import pytest
+from geometry import Vector2
+from scene import Lens, Scene, demo_scene
+from paraxial import ParaxialSystem, lens_vertices
+
+
+def thick_lens_focal_length(n, r1, r2, d):
+    return 1 / ((n - 1) * (1/r1 - 1/r2 + (n - 1)*d / (n*r1*r2)))
+
+
+@pytest.mark.parametrize('rad_l, rad_r', [(200.0, 300.0), (200.0, -600.0), (-400.0, 150.0)])
+def test_single_lens_matches_thick_lens_formula(rad_l, rad_r):
+    lens = Lens(Vector2(0, 100), 'Lens', 30, 200, rad_l, rad_r, abs_refr_indx=1.5)
+    system = ParaxialSystem([lens])
+    (x1, r1), (x2, r2) = lens_vertices(lens)
+    f = thick_lens_focal_length(1.5, r1, r2, x2 - x1)
+    assert system.focal_length() == pytest.approx(f)
+    assert system.front_focal_length() == pytest.approx(f)
+    assert system.rear_focus() - system.rear_principal_plane() == pytest.approx(f)
+    assert system.front_principal_plane() - system.front_focus() == pytest.approx(f)
+
+
+def test_traced_focus_converges_to_paraxial():
+    lens = Lens(Vector2(0, 100), 'Lens', 30, 200, 200.0, 300.0, abs_refr_indx=1.5)
+    system = ParaxialSystem([lens])
+    errors = [abs(system.traced_back_focal_distance(height) - system.back_focal_distance())
+              for height in (20, 10, 5, 2.5)]
+    assert errors == sorted(errors, reverse=True)
+    assert errors[-1] < 0.01 * system.focal_length()
+
+
+def test_from_scene_selects_lenses_on_axis():
+    scene = demo_scene()
+    lens = scene.obj_list[1]
+    system = ParaxialSystem.from_scene(scene)
+    assert lens in system.lenses
+    assert all(abs(l.v1.y - l.width/2 - system.axis) < 1e-9 for l in system.lenses)
+    moved = Lens(Vector2(lens.v1.x, lens.v1.y + 500), 'Off', 10, 100, 100.0, 100.0)
+    assert moved not in ParaxialSystem.from_scene(Scene(scene.obj_list + [moved])).lenses
+
+
+def test_afocal_systems_focus_at_infinity():
+    empty = ParaxialSystem([])
+    assert empty.power() == 0
+    assert all(value == inf for value in empty.summary().values())
+
+    telescope = ParaxialSystem([Lens(Vector2(0, 100), 'Lens', 30, 200, 200.0, 300.0, abs_refr_indx=1.5)])
+    telescope.matrix = ((-2.0, 300.0), (0.0, -0.5))
+    assert telescope.power() == 0
+    assert all(abs(value) == inf for value in telescope.summary().values())
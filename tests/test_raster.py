@@ -0,0 +1,29 @@
+import struct
+import zlib
+import numpy as np
+from raster import Raster, clip
+
+
+def test_clip():
+    p0 = np.array([[-10.0, 5.0], [2.0, 2.0], [-5.0, -5.0]])
+    p1 = np.array([[20.0, 5.0], [4.0, 4.0], [-1.0, -1.0]])
+    c0, c1, inside = clip(p0, p1, 10, 10)
+    assert inside.tolist() == [True, True, False]
+    assert np.allclose(c0[0], [0, 5]) and np.allclose(c1[0], [10, 5])
+    assert np.allclose(c0[1], p0[1]) and np.allclose(c1[1], p1[1])
+
+
+def test_segment_density_and_png():
+    raster = Raster(20, 10, origin=(0, 10))
+    raster.add_segments([[0.5, 5.5]], [[19.5, 5.5]], weights=[2.0], colors=(1.0, 0.0, 0.0))
+    density = raster.density.reshape(10, 20)
+    assert density[4].sum() > 0 and density.sum() == density[4].sum()
+    assert raster.image(background=None)[4, 10].tolist() == [255, 0, 0, round(255 * (1 - np.exp(-1)))]
+
+    png = raster.png(background=None)
+    assert png[:8] == b'\x89PNG\r\n\x1a\n'
+    width, height, depth, color_type = struct.unpack('>IIBB', png[16:26])
+    assert (width, height, depth, color_type) == (20, 10, 8, 6)
+    length = struct.unpack('>I', png[33:37])[0]
+    assert png[37:41] == b'IDAT'
+    assert len(zlib.decompress(png[41:41 + length])) == 10 * (1 + 20*4)
@@ -0,0 +1,43 @@
+import json
+from math import radians
+import pytest
+import scenefile
+from geometry import Vector2
+from scene import Detector, demo_scene, modified
+from sources import Beam, Fan, Lambertian, PointSource
+from spectral import MATERIALS
+from tracer import Tracer
+from helpers import signature
+
+
+def full_scene():
+    scene = demo_scene()
+    scene.obj_list[3] = modified(scene.obj_list[3], material=MATERIALS['N-BK7'])
+    scene.tools_list[0].wavelengths = [450.0, 550.0, 650.0]
+    scene.tools_list += [
+        Detector(Vector2(600, -300), Vector2(600, 300), 'Detector', bins=32, angle_bins=12),
+        Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=12, power=2.0, angle=radians(20)),
+        Beam(Vector2(-600, 50), Vector2(-500, 50), 'Beam', n_rays=8, width=80.0, ray_color='blue'),
+        PointSource(Vector2(-600, -50), Vector2(-500, -50), 'Point', n_rays=6, wavelengths=[500.0]),
+        Lambertian(Vector2(-600, 90), Vector2(-500, 90), 'Lambertian', n_rays=5, width=10.0),
+    ]
+    scene.abs_refr_indx = 1.01
+    scene.max_recursion_depth = 12
+    return scene
+
+
+@pytest.mark.parametrize('name', ['scene.json', 'scene.bin'])
+def test_round_trip(tmp_path, name):
+    scene = full_scene()
+    path = str(tmp_path / name)
+    scenefile.save(scene, path)
+    loaded = scenefile.load(path)
+    assert scenefile.to_dict(loaded) == scenefile.to_dict(scene)
+    assert [type(element) for element in loaded.obj_list + loaded.tools_list] == \
+           [type(element) for element in scene.obj_list + scene.tools_list]
+    assert signature(Tracer(loaded).trace()) == signature(Tracer(scene).trace())
+
+
+def test_binary_is_smaller_than_json():
+    scene = full_scene()
+    assert len(scenefile.to_bytes(scene)) < len(json.dumps(scenefile.to_dict(scene)))
@@ -0,0 +1,63 @@
+from math import radians
+import numpy as np
+import pytest
+from geometry import Vector2
+from sources import EMITTERS, Beam, Emitter, Fan, Lambertian, PointSource
+
+
+def emitters():
+    return [Fan(Vector2(0, 0), Vector2(10, 0), 'Fan', n_rays=9, power=3.0, angle=radians(40)),
+            Beam(Vector2(0, 0), Vector2(0, 10), 'Beam', n_rays=5, width=20.0),
+            PointSource(Vector2(0, 0), Vector2(10, 0), 'Point', n_rays=8),
+            Lambertian(Vector2(0, 0), Vector2(10, 0), 'Lambertian', n_rays=100, width=4.0)]
+
+
+@pytest.mark.parametrize('emitter', emitters(), ids=lambda emitter: emitter.name)
+def test_rays_batches_and_weights_agree(emitter):
+    origins, directions, weights = emitter.ray_arrays()
+    assert len(origins) == emitter.n_rays
+    assert weights.sum() == pytest.approx(emitter.power)
+    assert np.allclose(np.linalg.norm(directions, axis=1), 1)
+    batches = list(emitter.batches(batch_size=3))
+    assert np.allclose(np.concatenate([batch[0] for batch in batches]), origins)
+    assert np.allclose(np.concatenate([batch[1] for batch in batches]), directions)
+    rays = emitter.rays()
+    assert [(ray.origin.x, ray.origin.y, ray.direction.x, ray.direction.y) for ray, _ in rays] == \
+           pytest.approx([(*o, *d) for o, d in zip(origins.tolist(), directions.tolist())])
+    assert type(emitter.snapshot()) is type(emitter) and emitter.snapshot().copy_args()[3:] == emitter.copy_args()[3:]
+
+
+def test_shapes():
+    fan, beam, point, lambertian = emitters()
+    _, directions, _ = fan.ray_arrays()
+    angles = np.degrees(np.arctan2(directions[:, 1], directions[:, 0]))
+    assert angles.min() > -20 and angles.max() < 20 and angles[4] == pytest.approx(0)
+    origins, directions, _ = beam.ray_arrays()
+    assert np.allclose(directions, [0, 1]) and np.allclose(origins[:, 1], 10)
+    assert origins[:, 0].min() > -10 and origins[:, 0].max() < 10
+    _, directions, _ = point.ray_arrays()
+    assert np.allclose(directions.sum(axis=0), 0, atol=1e-12)
+    origins, directions, _ = lambertian.ray_arrays()
+    assert (directions[:, 0] > 0).all()
+    # cos(angle) distribution: mean cosine is pi/4
+    assert directions[:, 0].mean() == pytest.approx(np.pi / 4, abs=0.01)
+    assert np.abs(origins[:, 1]).max() <= 2
+
+
+def test_wavelengths_repeat_rays():
+    fan = Fan(Vector2(0, 0), Vector2(10, 0), 'Fan', n_rays=4, wavelengths=[450, 650])
+    origins, _, weights, wavelengths = next(fan.batches())
+    assert len(origins) == 8 and wavelengths.tolist() == [450, 650] * 4
+    assert np.allclose(origins[::2], origins[1::2]) and weights.sum() == pytest.approx(2 * fan.power)
+
+
+def test_registry():
+    assert set(EMITTERS) == {'Fan', 'Beam', 'PointSource', 'Lambertian'}
+
+
+def test_emitters_have_to_sample():
+    class Incomplete(Emitter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(Vector2(0, 0), Vector2(1, 0), 'Incomplete')
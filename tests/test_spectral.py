@@ -0,0 +1,76 @@
+import numpy as np
+import spectral
+from geometry import Vector2
+from scene import Lens, RayCaster, Scene
+from sources import Fan
+from spectral import MATERIALS
+from stats import Stats
+from batch import BatchTracer
+from tracer import RayPath, Tracer
+
+
+def test_dispersion_scalar_and_batch():
+    material = MATERIALS['N-BK7']
+    assert material.index(450) > material.index(650)
+    scene = Scene([Lens(Vector2(-10, 100), 'Lens', 20, 200, 150, 150, material=material)],
+                  [RayCaster(Vector2(-200, 60), Vector2(-100, 60), 'RayCaster', wavelengths=[450, 650])])
+    result = BatchTracer(scene).trace_sources()
+    assert result.wavelength.tolist() == [450, 650]
+    blue, red = (result.points[i, result.n_segments[i]] for i in range(2))
+    assert not np.allclose(blue, red)
+
+    path = Tracer(scene, split=False).trace()[0]
+    ends = [segment.end for segment in path.segments if not segment.is_hit()]
+    assert np.allclose([(end.x, end.y) for end in ends], [blue, red])
+
+
+def window_scene(wavelengths):
+    """
+    A window without material in front of an N-BK7 lens, lit by a fan at wavelengths
+    """
+    return Scene([Lens(Vector2(-100, 100), 'Window', 20, 200, 10**9, 10**9),
+                  Lens(Vector2(90, 100), 'Lens', 20, 200, 150, 150, material=MATERIALS['N-BK7'])],
+                 [Fan(Vector2(-400, 0), Vector2(-300, 0), 'Fan', n_rays=32, wavelengths=wavelengths)])
+
+
+def test_scalar_wavelengths_share_segments_in_front_of_dispersion():
+    wavelengths = spectral.wavelengths(10)
+    scene = window_scene(wavelengths)
+    stats = Stats()
+    path = Tracer(scene, stats=stats).trace()[0]
+
+    tracer = Tracer(scene)
+    reference = RayPath(None)
+    for ray, weight in scene.sources()[0].rays():
+        for wavelength in wavelengths:
+            tracer.cast_ray(reference, ray, scene.abs_refr_indx, weight, wavelength=wavelength)
+    assert len(path.segments) == len(reference.segments)
+    for segment, expected in zip(path.segments, reference.segments):
+        assert (segment.start.x, segment.start.y, segment.end.x, segment.end.y) == \
+            (expected.start.x, expected.start.y, expected.end.x, expected.end.y)
+        assert (segment.weight, segment.depth, segment.wavelength, segment.obj_id, segment.tir) == \
+            (expected.weight, expected.depth, expected.wavelength, expected.obj_id, expected.tir)
+
+    single = Stats()
+    Tracer(window_scene(wavelengths[:1]), stats=single).trace()
+    assert stats.counters['rays'] < 0.9 * len(wavelengths) * single.counters['rays']
+    assert sum(stats.bounces.values()) == 32 * len(wavelengths)
+
+
+def test_batch_wavelengths_share_segments_in_front_of_dispersion():
+    wavelengths = spectral.wavelengths(10)
+    tracer = BatchTracer(window_scene(wavelengths))
+    origins, directions, _ = tracer.scene.sources()[0].ray_arrays()
+    nearest = tracer.nearest
+    intersected = []
+    tracer.nearest = lambda o, d: intersected.append(len(o)) or nearest(o, d)
+    result = tracer.trace_spectrum(origins, directions, wavelengths)
+    shared = sum(intersected)
+    expected = tracer.trace(np.repeat(origins, len(wavelengths), axis=0),
+                            np.repeat(directions, len(wavelengths), axis=0),
+                            wavelengths=np.tile(wavelengths, len(origins)))
+    for name in ('points', 'obj_id', 'surface_id', 'refr_indx', 'normal', 'tir', 'n_segments', 'truncated',
+                 'wavelength'):
+        assert np.array_equal(getattr(result, name), getattr(expected, name), equal_nan=name != 'tir'), name
+    # at least the two segments up to the lens are intersected once per ray, not once per wavelength
+    assert shared <= sum(intersected) - shared - 2 * (len(wavelengths) - 1) * len(origins)
@@ -0,0 +1,27 @@
+from geometry import Vector2
+from scene import demo_scene
+from surfaces import SurfaceTable
+
+COLUMNS = ('seg_obj', 'seg_surface', 'seg_x0', 'seg_y0', 'seg_ex', 'seg_ey', 'seg_nx', 'seg_ny',
+           'arc_obj', 'arc_surface', 'arc_cx', 'arc_cy', 'arc_r', 'arc_y_min', 'arc_y_max', 'arc_side',
+           'arc_outward', 'arc_chord_x', 'arc_chord_y', 'arc_chord_r')
+
+
+def test_update_matches_rebuild():
+    scene = demo_scene()
+    table = SurfaceTable(scene.obj_list)
+    for obj_id in (0, 3, 5):
+        scene.obj_list[obj_id].move(Vector2(17.5, -4.25))
+        table.update(obj_id, scene.obj_list[obj_id])
+    rebuilt = SurfaceTable(scene.obj_list)
+    for column in COLUMNS:
+        assert getattr(table, column) == getattr(rebuilt, column), column
+
+
+def test_rows_per_object():
+    scene = demo_scene()
+    table = SurfaceTable(scene.obj_list)
+    assert len(table) == len(scene.obj_list)
+    for obj_id, obj in enumerate(scene.obj_list):
+        n_segments = table.seg_first[obj_id + 1] - table.seg_first[obj_id]
+        assert n_segments + table.arc_count(obj_id) == len(obj.surfaces)
@@ -0,0 +1,60 @@
+import csv
+from math import inf, radians
+from geometry import Vector2
+from scene import Detector, demo_scene
+from optimize import Evaluator, Parameter
+from sweep import Sweep, grid
+
+
+def scene_with_detector():
+    scene = demo_scene()
+    scene.tools_list.append(Detector(Vector2(1000, -1000), Vector2(1000, 1000), 'Detector'))
+    return scene
+
+
+def read(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_degenerate_configuration_goes_to_error_column(tmp_path):
+    path = str(tmp_path / 'sweep.csv')
+    configurations = list(grid({'PolygonTest.angle_l': [0.0, radians(45), radians(60)], 'Lens4.x': [0, 50]}))
+    assert Sweep(scene_with_detector(), configurations, path, workers=0).run() == 6
+    rows = read(path)
+    assert [int(row['index']) for row in rows] == list(range(6))
+    for row in rows:
+        if float(row['PolygonTest.angle_l']) == 0:
+            assert row['error'] and row['rays'] == ''
+        else:
+            assert not row['error'] and int(row['rays']) > 0
+
+
+def test_resume_skips_done_and_torn_rows(tmp_path):
+    path = str(tmp_path / 'sweep.csv')
+    configurations = list(grid({'Lens4.x': [0, 25, 50, 75]}))
+    Sweep(scene_with_detector(), configurations[:2], path, workers=0).run()
+    with open(path, 'a') as f:
+        f.write('2,50,')     # interrupted in the middle of a row
+    assert Sweep(scene_with_detector(), configurations, path, workers=0).run() == 2
+    assert sorted(int(row['index']) for row in read(path)) == [0, 1, 2, 3]
+
+
+def test_pool_matches_in_process(tmp_path):
+    configurations = list(grid({'Lens4.x': [0, 50], 'PolygonTest.angle_l': [0.0, radians(60)]}))
+    serial, pooled = str(tmp_path / 'serial.csv'), str(tmp_path / 'pooled.csv')
+    Sweep(scene_with_detector(), configurations, serial, workers=0).run()
+    Sweep(scene_with_detector(), configurations, pooled, workers=2, configurations_per_task=1).run()
+    key = lambda row: int(row['index'])
+    assert sorted(read(serial), key=key) == sorted(read(pooled), key=key)
+
+
+def test_sweep_errors_are_optimizer_penalties(tmp_path):
+    path = str(tmp_path / 'sweep.csv')
+    axes = {'PolygonTest.angle_l': [0.0, radians(60)], 'Lens4.rad_l': [1.0, 292.196*4]}
+    configurations = list(grid(axes))
+    scene = scene_with_detector()
+    Sweep(scene, configurations, path, workers=0).run()
+    evaluator = Evaluator(scene, [Parameter(*key.split('.')) for key in axes], 'Detector')
+    for configuration, row in zip(configurations, read(path)):
+        assert bool(row['error']) == (evaluator(list(configuration.values())) == inf)
@@ -0,0 +1,52 @@
+import pytest
+from geometry import Vector2
+from scene import RayCaster, demo_scene, large_lens_scene
+from sources import Fan
+from stats import Stats
+from tracer import Tracer
+from helpers import signature
+
+
+@pytest.mark.parametrize('split', [True, False])
+def test_min_energy_zero(split):
+    scene = demo_scene()
+    scene.max_recursion_depth = 8     # every Fresnel branch is followed, 2**depth of them
+    paths = Tracer(scene, split=split, min_energy=0).trace()
+    segments = [segment for path in paths for segment in path.segments]
+    assert segments
+    assert all(segment.weight > 0 for segment in segments)
+    if split:
+        assert any(segment.tir for segment in segments)
+
+
+def test_no_split_follows_one_branch():
+    for path in Tracer(demo_scene(), split=False).trace():
+        depths = [segment.depth for segment in path.segments]
+        assert depths == list(range(len(depths)))
+
+
+def test_bounces_per_primary_ray():
+    scene = demo_scene()
+    scene.tools_list.append(Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=25, wavelengths=[450, 650]))
+    stats = Stats()
+    paths = Tracer(scene, stats=stats).trace()
+    primary = sum(segment.depth == 0 for path in paths for segment in path.segments)
+    assert primary == 4 + 25*2
+    assert sum(stats.bounces.values()) == primary
+    assert sum(n * count for n, count in stats.bounces.items()) == sum(len(path.hits()) for path in paths)
+
+
+def test_circle_count_skips_arcs_rejected_by_their_chord():
+    scene = demo_scene()
+    scene.tools_list = [RayCaster(Vector2(-500, 1000), Vector2(-400, 1000), 'Above')]
+    stats = Stats()
+    Tracer(scene, use_bvh=False, stats=stats).trace()
+    assert stats.counters['intersections.Lens'] == 6
+    assert stats.counters['intersection_circle'] == 0
+
+
+@pytest.mark.parametrize('make_scene', [demo_scene, large_lens_scene])
+def test_bvh_matches_linear_search(make_scene):
+    scene = make_scene()
+    scene.tools_list.append(Fan(Vector2(-600, 0), Vector2(-500, 0), 'Fan', n_rays=32))
+    assert signature(Tracer(scene, use_bvh=True).trace(), 6) == signature(Tracer(scene, use_bvh=False).trace(), 6)
@@ -0,0 +1,297 @@
+from math import inf
+from geometry import Ray
+from bvh import BVH, union, segment_box_intersect
+from surfaces import SurfaceTable
+
+
+class Segment:
+    """
+    Part of a ray path between two points.
+    refr_indx is the index of the medium the segment travels through,
+    weight is the share of the source energy carried by it, depth is the number of bounces before it.
+    Hit info (obj_id, surface_id, normal, cos_i, tir) describes the collision at the end point
+    and is None for the last segment of a path that escaped the scene.
+    normal faces the incoming ray, cos_i is the cosine of the angle of incidence.
+    wavelength (nm) is None for monochromatic sources.
+    """
+    __slots__ = ('start', 'end', 'refr_indx', 'weight', 'depth', 'obj_id', 'surface_id', 'normal', 'cos_i', 'tir',
+                 'wavelength')
+
+    def __init__(self, start, end, refr_indx, weight=1.0, depth=0,
+                 obj_id=None, surface_id=None, normal=None, cos_i=None, tir=False, wavelength=None):
+        self.start = start
+        self.end = end
+        self.refr_indx = refr_indx
+        self.weight = weight
+        self.depth = depth
+        self.obj_id = obj_id
+        self.surface_id = surface_id
+        self.normal = normal
+        self.cos_i = cos_i
+        self.tir = tir
+        self.wavelength = wavelength
+
+    def is_hit(self):
+        return self.obj_id is not None
+
+
+class RayPath:
+    def __init__(self, source, color='red'):
+        self.source = source
+        self.color = color
+        self.segments = []
+        self.truncated = False      # max recursion depth has been reached by some branch
+        self.box = None
+
+    def hits(self):
+        return [segment for segment in self.segments if segment.is_hit()]
+
+    def bbox(self):
+        if self.box is None and self.segments:
+            box = None
+            for segment in self.segments:
+                seg_box = (min(segment.start.x, segment.end.x), min(segment.start.y, segment.end.y),
+                           max(segment.start.x, segment.end.x), max(segment.start.y, segment.end.y))
+                box = seg_box if box is None else union(box, seg_box)
+            self.box = box
+        return self.box
+
+    def crosses(self, box):
+        path_box = self.bbox()
+        if path_box is None or path_box[0] > box[2] or path_box[2] < box[0] or \
+                path_box[1] > box[3] or path_box[3] < box[1]:
+            return False
+        for segment in self.segments:
+            if segment_box_intersect(segment.start, segment.end, box):
+                return True
+        return False
+
+
+class Tracer:
+    """
+    Headless ray tracer. Works on anything that looks like a scene.Scene:
+    obj_list, tools_list, abs_refr_indx and max_recursion_depth
+
+    With split=True every hit spawns a reflected and a transmitted ray weighted by the Fresnel coefficients,
+    rays carrying less than min_energy of the source energy are dropped.
+    With split=False only the transmitted ray (or the reflected one in case of TIR) is followed.
+
+    Surfaces are tested from a SurfaceTable. With use_bvh=True objects are looked up through
+    a bounding volume hierarchy. Call refit() after moving objects of the scene.
+
+    With incremental=True trace() reuses the paths of the previous call. Report changes with
+    object_moved() and source_moved() so that only the affected paths are traced again.
+
+    Every ray of a source (RayCaster.rays()) is cast into the same RayPath with its weight, min_energy is relative
+    to that weight. Sources with wavelengths cast each ray at every wavelength, traced with the indices
+    of the object materials at that wavelength. The wavelengths share the segments up to the first object
+    whose index differs between them.
+
+    stats is an optional stats.Stats collecting counters of the hot paths.
+    """
+    def __init__(self, scene, extent=100000, split=True, min_energy=0.01, use_bvh=True, incremental=False,
+                 stats=None, dbg=False):
+        self.scene = scene
+        self.extent = extent
+        self.split = split
+        self.min_energy = min_energy
+        self.use_bvh = use_bvh
+        self.incremental = incremental
+        self.bvh = None
+        self.surfaces = None
+        self.cache = {}             # source -> RayPath
+        self.cache_objects = 0      # len(obj_list) the cache has been built for
+        self.stats = stats
+        self.dbg = dbg
+        self.eps = 0.001
+
+    def refit(self):
+        if self.bvh is not None:
+            self.bvh.refit()
+        self.surfaces = None
+
+    def invalidate(self):
+        self.cache = {}
+
+    def object_moved(self, obj, old_box):
+        """
+        Only paths crossing the old or the new bounding box of the object can change
+        """
+        if self.bvh is not None:
+            self.bvh.refit()
+        if self.surfaces is not None:
+            self.surfaces.update(self.scene.obj_list.index(obj), obj)
+        new_box = obj.bbox()
+        for source, path in list(self.cache.items()):
+            if path.crosses(old_box) or path.crosses(new_box):
+                del self.cache[source]
+
+    def source_moved(self, source):
+        self.cache.pop(source, None)
+
+    def acceleration(self):
+        if self.bvh is None or len(self.bvh) != len(self.scene.obj_list):
+            self.bvh = BVH(self.scene.obj_list)
+        return self.bvh
+
+    def surface_table(self):
+        if self.surfaces is None or len(self.surfaces) != len(self.scene.obj_list):
+            self.surfaces = SurfaceTable(self.scene.obj_list)
+        return self.surfaces
+
+    def trace(self):
+        if not self.incremental:
+            return [self.trace_source(source) for source in self.scene.sources()]
+
+        if self.cache_objects != len(self.scene.obj_list):
+            self.invalidate()
+            self.cache_objects = len(self.scene.obj_list)
+        cache = {}
+        for source in self.scene.sources():
+            path = self.cache.get(source)
+            cache[source] = path if path is not None else self.trace_source(source)
+        self.cache = cache
+        return list(cache.values())
+
+    def trace_source(self, source):
+        path = RayPath(source, color=source.ray_color)
+        for ray, weight in source.rays():
+            self.cast_ray(path, ray, self.scene.abs_refr_indx, weight, wavelengths=source.wavelengths)
+        return path
+
+    def escape_point(self, ray):
+        """
+        Point where the ray leaves the square |x|, |y| <= extent
+        """
+        t = inf
+        for o, d in ((ray.origin.x, ray.direction.x), (ray.origin.y, ray.direction.y)):
+            if d > 0:
+                t = min(t, (self.extent - o) / d)
+            elif d < 0:
+                t = min(t, (-self.extent - o) / d)
+        if t == inf or t < 0:
+            return None
+        return ray.point(t)
+
+    def candidates(self, ray):
+        """
+        (obj_id, distance) pairs, distance is a lower bound for the distance to any hit of the object
+        """
+        if self.use_bvh:
+            return self.acceleration().front_to_back(ray.origin, (ray.direction.x, ray.direction.y))
+        else:
+            return ((obj_id, 0.0) for obj_id in range(len(self.scene.obj_list)))
+
+    def nearest_collision(self, ray):
+        """
+        [t, point, normal, surface_id, obj_id] of the closest hit or None
+        """
+        table = self.surface_table()
+        ox, oy = ray.origin.x, ray.origin.y
+        dx, dy = ray.direction.x, ray.direction.y
+        hit = None
+        min_dist = inf
+        stats = self.stats
+        for obj_id, obj_dist in self.candidates(ray):
+            if obj_dist > min_dist:     # candidates go front to back, nothing closer is left
+                break
+            if stats is None:
+                obj_hit = table.intersect(obj_id, ox, oy, dx, dy, self.eps, min_dist)
+            else:
+                solves = table.circle_solves
+                obj_hit = table.intersect(obj_id, ox, oy, dx, dy, self.eps, min_dist)
+                stats.intersection_test(self.scene.obj_list[obj_id], circles=table.circle_solves - solves)
+            if obj_hit is not None:
+                min_dist = obj_hit[0]
+                hit = obj_hit
+        if hit is None:
+            return None
+        return table.collision(hit, ray)
+
+    @staticmethod
+    def fresnel(cos_i, cos_t, n1, n2):
+        """
+        Reflectance of unpolarized light
+        Rs = ((n1*cos(i) - n2*cos(t)) / (n1*cos(i) + n2*cos(t)))^2
+        Rp = ((n1*cos(t) - n2*cos(i)) / (n1*cos(t) + n2*cos(i)))^2
+        R = (Rs + Rp) / 2
+        """
+        rs = ((n1*cos_i - n2*cos_t) / (n1*cos_i + n2*cos_t))**2
+        rp = ((n1*cos_t - n2*cos_i) / (n1*cos_t + n2*cos_i))**2
+        return (rs + rp) / 2
+
+    def cast_ray(self, path, ray, refr_indx, weight=1.0, wavelength=None, wavelengths=None):
+        """
+        Casts ray at wavelength, or at each of wavelengths. The wavelengths are traced as one ray until it hits
+        an object whose index differs between them, then they go on on their own.
+        The segments of each wavelength are added to path one wavelength after the other
+        """
+        stats = self.stats
+        wavelengths = [wavelength] if wavelengths is None else list(wavelengths)
+        segments = [[] for _ in wavelengths]
+        n_hits = [0] * len(wavelengths)
+        min_weight = self.min_energy * weight
+        stack = [(ray, refr_indx, weight, 0, range(len(wavelengths)))]
+        while stack:
+            ray, refr_indx, weight, depth, members = stack.pop()
+            if depth > self.scene.max_recursion_depth:
+                path.truncated = True
+                if stats is not None:
+                    stats.counters['max_depth'] += 1
+                if self.dbg:
+                    print('Recursion gone too deep')
+                continue
+            if stats is not None:
+                stats.counters['rays'] += 1
+                stats.depths[depth] += 1
+            collision = self.nearest_collision(ray)
+
+            if collision is None:
+                point = self.escape_point(ray)
+                if point is not None:
+                    for i in members:
+                        segments[i].append(Segment(ray.origin, point, refr_indx, weight=weight, depth=depth,
+                                                   wavelength=wavelengths[i]))
+                continue
+
+            _, intr_point, normal, surface_id, obj_id = collision
+            obj = self.scene.obj_list[obj_id]
+            groups = {}     # wavelengths of the same index at this object go on together
+            for i in members:
+                groups.setdefault(obj.refr_indx(wavelengths[i]), []).append(i)
+            for obj_refr_indx, group in groups.items():
+                n1 = refr_indx
+                if obj_refr_indx == n1:
+                    n2 = self.scene.abs_refr_indx
+                else:
+                    n2 = obj_refr_indx
+
+                nrm, cos_i, cos_t, refl_dir, refr_dir = Ray.snell(ray.direction, normal, n1, n2)
+                tir = refr_dir is None
+                if tir and stats is not None:
+                    stats.counters['tir'] += 1
+                for i in group:
+                    segments[i].append(Segment(ray.origin, intr_point, refr_indx, weight=weight, depth=depth,
+                                               obj_id=obj_id, surface_id=surface_id, normal=nrm,
+                                               cos_i=cos_i, tir=tir, wavelength=wavelengths[i]))
+                    n_hits[i] += 1
+                if tir:
+                    refl_weight = weight
+                    refr_weight = 0
+                elif self.split:
+                    refl_weight = weight * self.fresnel(cos_i, cos_t, n1, n2)
+                    refr_weight = weight - refl_weight
+                else:
+                    refl_weight = 0
+                    refr_weight = weight
+
+                # reflected ray is pushed first so the transmitted one is traced first
+                if refl_weight > 0 and refl_weight >= min_weight:
+                    stack.append((Ray(intr_point, refl_dir), refr_indx, refl_weight, depth+1, group))
+                if refr_dir is not None and refr_weight > 0 and refr_weight >= min_weight:
+                    stack.append((Ray(intr_point, refr_dir), n2, refr_weight, depth+1, group))
+        for wavelength_segments in segments:
+            path.segments.extend(wavelength_segments)
+        if stats is not None:
+            for hits in n_hits:
+                stats.bounces[hits] += 1